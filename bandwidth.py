@@ -0,0 +1,173 @@
+"""
+bandwidth.py
+Shared bandwidth scheduler for concurrent downloads.
+
+Every running job gets a JobThrottle from one BandwidthScheduler and calls
+it with the number of bytes it just read. Each throttle is a token bucket
+whose rate is recomputed on every call:
+
+  * the global limit (or the time-of-day schedule entry in force) is split
+    between the jobs that are actually moving data, weighted by priority;
+  * a job's own cap, if any, bounds its share;
+  * while an interactive request (format listing, playlist enumeration) is
+    running, downloads leave INTERACTIVE_RESERVE of the global limit free.
+
+A rate of 0 means unlimited everywhere.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH = 1, 2, 4
+PRIORITY_NAMES = {'low': PRIORITY_LOW, 'normal': PRIORITY_NORMAL, 'high': PRIORITY_HIGH}
+
+BURST_SECONDS = 0.5      # bucket depth, in seconds of the job's rate
+IDLE_AFTER = 2.0         # a job that read nothing for this long gives up its share
+INTERACTIVE_RESERVE = 0.25
+SLEEP_SLICE = 0.1        # max sleep between cancellation checks
+
+_RATE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?(?:/s)?\s*$', re.I)
+_SCHEDULE_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)$')
+
+
+def parse_rate(text) -> float:
+    """'500K', '2.5M', '1G', '800000' -> bytes per second (binary units); '', '0' -> 0 (unlimited)."""
+    if text is None or str(text).strip() in ('', '0'):
+        return 0.0
+    m = _RATE_RE.match(str(text))
+    if not m:
+        raise ValueError(f"bad rate {text!r} (expected e.g. 500K, 2M)")
+    return float(m.group(1)) * {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}[m.group(2).lower()]
+
+
+def parse_schedule(text: str) -> List[Tuple[int, int, float]]:
+    """'01:00-07:00=0, 09:00-18:00=1M' -> [(start_minute, end_minute, rate), ...].
+
+    Windows may wrap past midnight (22:00-06:00). The first matching window wins.
+    """
+    schedule = []
+    for part in filter(None, (p.strip() for p in (text or '').split(','))):
+        m = _SCHEDULE_RE.match(part)
+        if not m:
+            raise ValueError(f"bad schedule entry {part!r} (expected HH:MM-HH:MM=RATE)")
+        h1, m1, h2, m2 = (int(g) for g in m.groups()[:4])
+        if h1 > 23 or h2 > 24 or m1 > 59 or m2 > 59:
+            raise ValueError(f"bad time in schedule entry {part!r}")
+        schedule.append((h1 * 60 + m1, h2 * 60 + m2, parse_rate(m.group(5))))
+    return schedule
+
+
+class JobThrottle:
+    """Token bucket for one job; call it with the byte count of every read."""
+
+    def __init__(self, scheduler: 'BandwidthScheduler', priority: int = PRIORITY_NORMAL, cap: float = 0,
+                 is_cancelled: Optional[Callable[[], bool]] = None):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.cap = cap
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.last_active = time.monotonic()
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self, n: int):
+        now = time.monotonic()
+        self.last_active = now
+        rate = self.scheduler.rate_for(self)
+        with self._lock:
+            if rate <= 0:
+                self._tokens, self._stamp = 0.0, now
+                return
+            self._tokens = min(rate * BURST_SECONDS, self._tokens + (now - self._stamp) * rate)
+            self._stamp = now
+            self._tokens -= n
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        # sleeping pays off the debt: the refill on the next call covers it
+        deadline = now + wait
+        while wait > 0 and not self.is_cancelled():
+            time.sleep(min(wait, SLEEP_SLICE))
+            wait = deadline - time.monotonic()
+
+    def close(self):
+        self.scheduler.unregister(self)
+
+
+class BandwidthScheduler:
+    def __init__(self, global_rate: float = 0, schedule: Optional[list] = None,
+                 clock: Callable[[], time.struct_time] = time.localtime):
+        self.global_rate = global_rate
+        self.schedule = schedule or []
+        self._clock = clock
+        self._throttles = []
+        self._interactive = 0
+        self._lock = threading.Lock()
+
+    def register(self, priority: int = PRIORITY_NORMAL, cap: float = 0,
+                 is_cancelled: Optional[Callable[[], bool]] = None) -> JobThrottle:
+        throttle = JobThrottle(self, priority, cap, is_cancelled)
+        with self._lock:
+            self._throttles.append(throttle)
+        return throttle
+
+    def unregister(self, throttle: JobThrottle):
+        with self._lock:
+            if throttle in self._throttles:
+                self._throttles.remove(throttle)
+
+    def set_global_rate(self, rate: float):
+        self.global_rate = max(0.0, float(rate or 0))
+
+    def set_schedule(self, schedule: list):
+        self.schedule = list(schedule or [])
+
+    @contextmanager
+    def interactive(self):
+        """Mark a latency-sensitive request as running; downloads back off while it lasts."""
+        with self._lock:
+            self._interactive += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._interactive -= 1
+
+    def current_global_rate(self) -> float:
+        """The global limit in force now: the first matching schedule window, else global_rate."""
+        if self.schedule:
+            t = self._clock()
+            minute = t.tm_hour * 60 + t.tm_min
+            for start, end, rate in self.schedule:
+                inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+                if inside:
+                    return rate
+        return self.global_rate
+
+    def rate_for(self, throttle: JobThrottle) -> float:
+        """The bytes/s `throttle` may use right now (0 = unlimited)."""
+        total = self.current_global_rate()
+        share = 0.0
+        if total > 0:
+            now = time.monotonic()
+            with self._lock:
+                weights = sum(t.priority for t in self._throttles
+                              if t is throttle or now - t.last_active < IDLE_AFTER)
+                interactive = self._interactive > 0
+            if interactive:
+                total *= 1.0 - INTERACTIVE_RESERVE
+            share = total * throttle.priority / max(weights, throttle.priority)
+        if throttle.cap > 0:
+            return min(share, throttle.cap) if share > 0 else throttle.cap
+        return share
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = len(self._throttles)
+            interactive = self._interactive
+        return {'global_rate': self.current_global_rate(), 'jobs': jobs, 'interactive': interactive}
+
+
+default_scheduler = BandwidthScheduler()
@@ -0,0 +1,79 @@
+"""
+bench_control_api.py
+Queue a batch of downloads through the control API and follow it to the end.
+
+One POST /jobs with {"urls": [...]} queues every video of a local fake
+YouTube; GET /jobs?state=queued,running,processing is then polled until
+nothing is active. Reports the submit latency, how many HTTP requests the
+whole batch took, the wall time and the outcome counts; no GUI involved.
+
+    python benchmarks/bench_control_api.py --jobs 200 --parallel 8
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_youtube import FakeYouTube  # noqa: E402
+from control_api import ControlAPI  # noqa: E402
+from job_manager import JobManager  # noqa: E402
+from postprocess import PostProcessPool  # noqa: E402
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--jobs', type=int, default=200)
+    p.add_argument('--parallel', type=int, default=8, help="concurrent downloads")
+    p.add_argument('--seconds', type=int, default=1, help="media duration")
+    p.add_argument('--poll', type=float, default=0.5, help="seconds between progress queries")
+    args = p.parse_args()
+
+    outdir = tempfile.mkdtemp(prefix='bench-api-')
+    try:
+        with FakeYouTube(videos=args.jobs, seconds=args.seconds) as yt, yt.installed():
+            manager = JobManager(args.parallel, post_pool=PostProcessPool())
+            api = ControlAPI(manager, outdir, port=0)
+            api.start()
+            conn = http.client.HTTPConnection('127.0.0.1', api.port)
+            requests = 0
+
+            def call(method, path, body=None):
+                nonlocal requests
+                requests += 1
+                headers = {'Authorization': f"Bearer {api.token}"}
+                if body is not None:
+                    headers['Content-Type'] = 'application/json'
+                conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+                response = conn.getresponse()
+                return response.status, json.loads(response.read())
+
+            t0 = time.perf_counter()
+            status, submitted = call('POST', '/jobs', {'urls': [yt.video_url(i) for i in range(args.jobs)]})
+            submit_ms = (time.perf_counter() - t0) * 1000
+            if status != 201:
+                raise RuntimeError(f"submit failed: {submitted}")
+            while True:
+                _, active = call('GET', '/jobs?state=queued,running,processing')
+                if not active['jobs']:
+                    break
+                time.sleep(args.poll)
+            wall = time.perf_counter() - t0
+            api.stop()
+            manager.shutdown()
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+    print(json.dumps({'benchmark': 'control_api', 'jobs': args.jobs, 'parallel': args.parallel,
+                      'submit_ms': round(submit_ms, 1), 'requests': requests, 'wall_s': round(wall, 2),
+                      'jobs_per_s': round(args.jobs / wall, 2), 'counts': active['counts']}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+bench_layout.py
+Find a video in a large archive: output index vs. walking the folder tree.
+
+Creates --files empty "Title [ID].mkv" files in the 'sharded' layout (and
+reports how full its biggest folder gets, next to the 'flat' layout's one
+folder), indexes them, then looks up --lookups random IDs through
+OutputIndex and, for a few of them, by walking the tree the way a rebuild
+or a manual search would. No network, no yt-dlp.
+
+    python benchmarks/bench_layout.py --files 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from output_layout import OutputIndex, id_hash  # noqa: E402
+
+
+def shard_dir(root: str, video_id: str) -> str:
+    digest = id_hash(video_id)
+    return os.path.join(root, digest[:2], digest[2:4])
+
+
+def walk_for(root: str, video_id: str):
+    tag = f"[{video_id}]"
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if tag in name:
+                return os.path.join(dirpath, name)
+    return None
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--files', type=int, default=20000)
+    p.add_argument('--lookups', type=int, default=10000)
+    p.add_argument('--walks', type=int, default=5, help="lookups done by walking the tree instead")
+    args = p.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench-layout-')
+    try:
+        ids = [f"v{i:010d}" for i in range(args.files)]
+        t0 = time.perf_counter()
+        per_dir = {}
+        for video_id in ids:
+            folder = shard_dir(root, video_id)
+            os.makedirs(folder, exist_ok=True)
+            open(os.path.join(folder, f"Video {video_id} [{video_id}].mkv"), 'wb').close()
+            per_dir[folder] = per_dir.get(folder, 0) + 1
+        create_s = time.perf_counter() - t0
+
+        index = OutputIndex(root)
+        t0 = time.perf_counter()
+        index.add_many((v, os.path.join(shard_dir(root, v), f"Video {v} [{v}].mkv"), None, None, None) for v in ids)
+        index_s = time.perf_counter() - t0
+
+        sample = random.choices(ids, k=args.lookups)
+        t0 = time.perf_counter()
+        for video_id in sample:
+            if index.lookup(video_id) is None:
+                raise RuntimeError(f"{video_id} not indexed")
+        lookup_us = (time.perf_counter() - t0) / len(sample) * 1e6
+
+        t0 = time.perf_counter()
+        for video_id in sample[:args.walks]:
+            if walk_for(root, video_id) is None:
+                raise RuntimeError(f"{video_id} not found")
+        walk_ms = (time.perf_counter() - t0) / max(1, args.walks) * 1000
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print(json.dumps({'benchmark': 'layout', 'files': args.files, 'folders': len(per_dir),
+                      'largest_folder': {'sharded': max(per_dir.values()), 'flat': args.files},
+                      'create_s': round(create_s, 2), 'index_s': round(index_s, 3),
+                      'index_lookup_us': round(lookup_us, 1), 'tree_walk_ms': round(walk_ms, 1),
+                      'speedup': round(walk_ms * 1000 / lookup_us)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
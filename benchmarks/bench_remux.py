@@ -0,0 +1,117 @@
+"""
+bench_remux.py
+File-based merge vs. streaming remux of a split video+audio download.
+
+Generates a fragmented-MP4 video and audio pair with ffmpeg (the shape of
+YouTube's DASH formats), serves both from the local range server, and
+downloads + merges them two ways:
+
+  * files:  both streams to disk concurrently, then ffmpeg_merge (what
+            ytdl_core does without stream_merge);
+  * stream: remux.StreamingRemuxer, piping both into ffmpeg as they arrive.
+
+Reports wall time and the bytes written to disk (component files plus the
+merged output, vs. the output alone).
+
+    python benchmarks/bench_remux.py --seconds 60 --per-conn-mbps 8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from range_server import RangeServer  # noqa: E402
+from postprocess import ffmpeg_merge  # noqa: E402
+from remux import StreamingRemuxer  # noqa: E402
+from segmented import SegmentedDownloader  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def make_media(tmp: str, seconds: int, bitrate: str):
+    """A DASH-like video-only and audio-only pair, as bytes."""
+    video, audio = os.path.join(tmp, 'src_v.mp4'), os.path.join(tmp, 'src_a.m4a')
+    common = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+    frag = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+    subprocess.run(common + ['-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+                             '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', bitrate] + frag + [video],
+                   check=True)
+    subprocess.run(common + ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+                             '-c:a', 'aac', '-b:a', '128k'] + frag + [audio], check=True)
+    with open(video, 'rb') as v, open(audio, 'rb') as a:
+        data = v.read(), a.read()
+    os.remove(video)
+    os.remove(audio)
+    return data
+
+
+def files_then_merge(urls: dict, tmp: str, chunk_size: int):
+    paths = [os.path.join(tmp, f'files.f{key}') for key in urls]
+    out = os.path.join(tmp, 'files.mkv')
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(len(urls)) as pool:
+        for future in [pool.submit(SegmentedDownloader(url, path, segments=1, chunk_size=chunk_size).run)
+                       for url, path in zip(urls.values(), paths)]:
+            future.result()
+    written = sum(os.path.getsize(p) for p in paths)
+    t1 = time.perf_counter()
+    ffmpeg_merge(paths, out)
+    t2 = time.perf_counter()
+    written += os.path.getsize(out)
+    return out, {'seconds': round(t2 - t0, 3), 'download_s': round(t1 - t0, 3), 'merge_s': round(t2 - t1, 3),
+                 'bytes_written': written}
+
+
+def streaming(urls: dict, tmp: str, chunk_size: int):
+    out = os.path.join(tmp, 'stream.mkv')
+    t0 = time.perf_counter()
+    StreamingRemuxer([(key, url, None) for key, url in urls.items()], out, chunk_size=chunk_size).run()
+    elapsed = time.perf_counter() - t0
+    return out, {'seconds': round(elapsed, 3), 'bytes_written': os.path.getsize(out)}
+
+
+def stream_count(path: str) -> int:
+    # `ffmpeg -i` with no output lists the streams on stderr (and exits non-zero)
+    info = subprocess.run(['ffmpeg', '-hide_banner', '-i', path], stderr=subprocess.PIPE).stderr.decode()
+    return info.count('Stream #')
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--seconds', type=int, default=60, help="media duration")
+    p.add_argument('--bitrate', default='4M', help="video bitrate")
+    p.add_argument('--per-conn-mbps', type=float, default=8.0, help="per-connection cap in MiB/s (0 = none)")
+    p.add_argument('--latency', type=float, default=0.02)
+    p.add_argument('--chunk-mb', type=int, default=4)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video, audio = make_media(tmp, args.seconds, args.bitrate)
+        results = {'benchmark': 'streaming_remux', 'video_bytes': len(video), 'audio_bytes': len(audio),
+                   'per_connection_mib_s': args.per_conn_mbps, 'runs': []}
+        with RangeServer({'/v.mp4': video, '/a.m4a': audio}, per_connection_bps=args.per_conn_mbps * MB,
+                         latency=args.latency) as server:
+            urls = {'137': server.url('/v.mp4'), '140': server.url('/a.m4a')}
+            for mode, run in (('files', files_then_merge), ('stream', streaming)):
+                out, stats = run(urls, tmp, args.chunk_mb * MB)
+                assert stream_count(out) == 2, f"{mode}: merged file lacks a stream"
+                stats['output_bytes'] = os.path.getsize(out)
+                results['runs'].append(dict(mode=mode, **stats))
+                os.remove(out)
+        files, stream = results['runs']
+        results['speedup'] = round(files['seconds'] / stream['seconds'], 2)
+        results['write_reduction'] = round(files['bytes_written'] / stream['bytes_written'], 2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+bench_segmented.py
+Single-stream vs. segmented (multi-connection) download of one large file.
+
+The local range server caps every connection at --per-conn-mbps, the way
+googlevideo throttles a single stream, so the single-stream path tops out
+there while SegmentedDownloader scales with the number of connections.
+
+    python benchmarks/bench_segmented.py --size-mb 64 --per-conn-mbps 8 --segments 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from range_server import RangeServer  # noqa: E402
+from segmented import SegmentedDownloader  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def single_stream(url: str, dest: str):
+    """What a plain HTTP downloader does: one GET, read to the end."""
+    with urllib.request.urlopen(url, timeout=30) as resp, open(dest, 'wb') as fh:
+        while True:
+            data = resp.read(256 * 1024)
+            if not data:
+                break
+            fh.write(data)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--size-mb', type=int, default=64)
+    p.add_argument('--per-conn-mbps', type=float, default=8.0, help="per-connection cap in MiB/s")
+    p.add_argument('--latency', type=float, default=0.02)
+    p.add_argument('--chunk-mb', type=int, default=4)
+    p.add_argument('--segments', type=int, nargs='+', default=[2, 4, 8])
+    args = p.parse_args()
+
+    payload = os.urandom(args.size_mb * MB)
+    results = {'benchmark': 'segmented_download', 'size_mb': args.size_mb,
+               'per_connection_mib_s': args.per_conn_mbps, 'chunk_mb': args.chunk_mb, 'runs': []}
+    with RangeServer({'/video.mp4': payload}, per_connection_bps=args.per_conn_mbps * MB,
+                     latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        url = server.url('/video.mp4')
+
+        dest = os.path.join(tmp, 'single.mp4')
+        t0 = time.perf_counter()
+        single_stream(url, dest)
+        elapsed = time.perf_counter() - t0
+        assert os.path.getsize(dest) == len(payload)
+        results['runs'].append({'mode': 'single_stream', 'connections': 1, 'seconds': round(elapsed, 3),
+                                'mib_s': round(args.size_mb / elapsed, 2)})
+
+        for n in args.segments:
+            dest = os.path.join(tmp, f'segmented_{n}.mp4')
+            t0 = time.perf_counter()
+            SegmentedDownloader(url, dest, segments=n, chunk_size=args.chunk_mb * MB).run()
+            elapsed = time.perf_counter() - t0
+            with open(dest, 'rb') as fh:
+                assert fh.read() == payload, "reassembled file differs from the source"
+            results['runs'].append({'mode': 'segmented', 'connections': n, 'seconds': round(elapsed, 3),
+                                    'mib_s': round(args.size_mb / elapsed, 2)})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+bench_startup.py
+Cold-start time of the GUI: time to an interactive window, time until yt-dlp is warm.
+
+Runs `main.py --startup-time` --runs times, each in a fresh interpreter with
+an empty data/cache folder, and reports medians of its milestones (seconds
+since main.py started: imports done, window built, first event-loop pass
+after show(), background yt-dlp warmup done) plus the wall time from
+spawning the process to the report, which includes interpreter start-up.
+Uses the offscreen Qt platform when there is no display.
+
+    python benchmarks/bench_startup.py --runs 10 --output startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_suite import _commit, _median_of, compare  # noqa: E402
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def run_once(python: str) -> dict:
+    home = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ, XDG_DATA_HOME=os.path.join(home, 'data'), XDG_CACHE_HOME=os.path.join(home, 'cache'),
+               LOCALAPPDATA=home)
+    if sys.platform.startswith('linux') and not (env.get('DISPLAY') or env.get('WAYLAND_DISPLAY')):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        t0 = time.perf_counter()
+        proc = subprocess.run([python, MAIN, '--startup-time'], env=env, capture_output=True, text=True,
+                              timeout=120)
+        wall = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith('{')]
+    if not lines:
+        raise RuntimeError(f"main.py --startup-time printed no report:\n{proc.stderr[-2000:]}")
+    return dict(json.loads(lines[-1]), process_s=round(wall, 4))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--python', default=sys.executable, help="interpreter to start main.py with")
+    p.add_argument('--output', help="also write the results to this file")
+    p.add_argument('--compare', metavar='BASELINE', help="a previous --output file to compare against")
+    args = p.parse_args()
+
+    runs = [run_once(args.python) for _ in range(args.runs)]
+    report = {'benchmark': 'startup', 'commit': _commit(), 'time': round(time.time()),
+              'params': {'runs': args.runs}, 'results': {'startup': _median_of(runs)}}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        report['compared_to'] = baseline.get('commit')
+        report['changes'] = compare(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
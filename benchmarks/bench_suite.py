@@ -0,0 +1,233 @@
+"""
+bench_suite.py
+End-to-end listing / download benchmarks against the local fake YouTube.
+
+Runs the real ytdl_core code (and yt-dlp's format selection, downloader and
+ffmpeg merge) against fake_youtube.FakeYouTube, so results can be compared
+across commits without touching the network:
+
+  single      time-to-list, time-to-thumbnail, then one download:
+              time to first byte, throughput, merge time;
+  concurrent  --jobs downloads at once: wall time, aggregate throughput;
+  playlist    enumerate a playlist and download its entries as they
+              arrive (--jobs at a time): time to first entry, wall time;
+  gui         main.ListFormatsWorker's time-to-list as seen by the GUI
+              thread, then the concurrent downloads through
+              main.DownloadQueue (Qt offscreen): queue signals delivered
+              per second and the longest stall of the GUI event loop.
+              Skipped without PyQt5.
+
+Each scenario runs --runs times and reports medians. Save a run with
+--output and compare a later one against it with --compare:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --compare before.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_youtube import MB, FakeYouTube  # noqa: E402
+import ytdl_core  # noqa: E402
+from metrics import JobTrace  # noqa: E402
+
+SCENARIOS = ('single', 'concurrent', 'playlist', 'gui')
+FORMAT = "bestvideo+bestaudio/best"
+
+
+def _download(url: str, outdir: str, args) -> JobTrace:
+    trace = JobTrace('download', url)
+    ytdl_core.download(url, FORMAT, outdir, segments=args.segments, trace=trace)
+    trace.finish('ok')
+    return trace
+
+
+def single(yt: FakeYouTube, outdir: str, args) -> dict:
+    marks = {}
+    t0 = time.perf_counter()
+    ytdl_core.list_formats(yt.video_url(0), on_formats=lambda payload: marks.setdefault('list', time.perf_counter()))
+    listed = time.perf_counter()
+    trace = _download(yt.video_url(0), outdir, args)
+    return {'time_to_list_s': marks['list'] - t0, 'time_to_thumbnail_s': listed - t0,
+            'first_byte_s': trace.first_byte, 'extract_s': trace.phases.get('extract', 0.0),
+            'download_s': trace.phases.get('download', 0.0), 'merge_s': trace.phases.get('merge', 0.0),
+            'throughput_mib_s': (trace.throughput or 0) / MB}
+
+
+def concurrent(yt: FakeYouTube, outdir: str, args) -> dict:
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.jobs) as pool:
+        traces = list(pool.map(lambda i: _download(yt.video_url(i), outdir, args), range(args.jobs)))
+    wall = time.perf_counter() - t0
+    return {'wall_s': wall, 'aggregate_mib_s': sum(t.bytes for t in traces) / MB / wall,
+            'first_byte_s': statistics.median(t.first_byte for t in traces),
+            'merge_s': statistics.median(t.phases.get('merge', 0.0) for t in traces)}
+
+
+def playlist(yt: FakeYouTube, outdir: str, args) -> dict:
+    t0 = time.perf_counter()
+    first_entry = None
+    with ThreadPoolExecutor(args.jobs) as pool:
+        futures = []
+        for entry in ytdl_core.iter_playlist(yt.playlist_url):
+            if first_entry is None:
+                first_entry = time.perf_counter() - t0
+            futures.append(pool.submit(_download, entry['url'], outdir, args))
+        enumerated = time.perf_counter() - t0
+        traces = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+    return {'time_to_first_entry_s': first_entry, 'enumerate_s': enumerated, 'wall_s': wall,
+            'entries': len(traces), 'aggregate_mib_s': sum(t.bytes for t in traces) / MB / wall}
+
+
+def gui(yt: FakeYouTube, outdir: str, args):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtCore import QElapsedTimer, QEventLoop, QTimer
+        from PyQt5.QtWidgets import QApplication
+        import main
+    except ImportError:
+        return None
+    app = QApplication.instance() or QApplication([])  # noqa: F841 (must stay alive)
+
+    marks = {}
+    loop = QEventLoop()
+    lister = main.ListFormatsWorker(yt.video_url(0))
+    lister.formats_ready.connect(lambda payload: marks.setdefault('list', time.perf_counter()))
+    lister.thumbnail_ready.connect(lambda img: (marks.setdefault('thumbnail', time.perf_counter()), loop.quit()))
+    lister.error.connect(lambda message: (marks.setdefault('error', message), loop.quit()))
+    list_t0 = time.perf_counter()
+    lister.start()
+    QTimer.singleShot(60000, loop.quit)
+    loop.exec_()
+    lister.wait()
+    if 'error' in marks or 'thumbnail' not in marks:
+        raise RuntimeError(f"GUI listing failed: {marks.get('error', 'timed out')}")
+
+    queue = main.DownloadQueue(max_concurrent=args.jobs)
+    counts = {'signals': 0, 'finished': 0}
+
+    def on_signal(*_):
+        counts['signals'] += 1
+
+    def on_finished(job, ok, message):
+        counts['finished'] += 1
+        if not ok:
+            counts['error'] = message
+        if counts['finished'] == args.jobs:
+            loop.quit()
+
+    queue.job_progress.connect(on_signal)
+    queue.job_status.connect(on_signal)
+    queue.job_finished.connect(on_finished)
+
+    # a fast timer measures how long the event loop is blocked between ticks
+    gaps = []
+    clock = QElapsedTimer()
+    ticker = QTimer()
+    ticker.setInterval(5)
+    ticker.timeout.connect(lambda: (gaps.append(clock.restart())))
+    clock.start()
+    ticker.start()
+
+    t0 = time.perf_counter()
+    for i in range(args.jobs):
+        queue.enqueue(main.DownloadJob(yt.video_url(i), FORMAT, outdir, options={'segments': args.segments}))
+    QTimer.singleShot(300000, loop.quit)
+    loop.exec_()
+    wall = time.perf_counter() - t0
+    ticker.stop()
+    queue.wait_all()
+    if 'error' in counts:
+        raise RuntimeError(f"GUI download failed: {counts['error']}")
+    gaps.sort()
+    return {'time_to_list_s': marks['list'] - list_t0, 'time_to_thumbnail_s': marks['thumbnail'] - list_t0,
+            'wall_s': wall, 'signals_per_s': counts['signals'] / wall,
+            'event_loop_p95_gap_ms': gaps[int(len(gaps) * 0.95)] if gaps else None,
+            'event_loop_max_gap_ms': gaps[-1] if gaps else None}
+
+
+def _median_of(runs: list) -> dict:
+    return {key: round(statistics.median(r[key] for r in runs), 4) if isinstance(runs[0][key], (int, float))
+            else runs[0][key] for key in runs[0]}
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """{scenario: {metric: {'baseline', 'current', 'change_pct'}}} for numbers in both runs."""
+    diff = {}
+    for scenario, metrics in current['results'].items():
+        before = (baseline.get('results') or {}).get(scenario) or {}
+        for key, value in (metrics or {}).items():
+            old = before.get(key)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)):
+                change = round((value - old) * 100 / old, 1) if old else None
+                diff.setdefault(scenario, {})[key] = {'baseline': old, 'current': value, 'change_pct': change}
+    return diff
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    p.add_argument('--runs', type=int, default=3)
+    p.add_argument('--jobs', type=int, default=4, help="parallel downloads (and playlist size)")
+    p.add_argument('--seconds', type=int, default=10, help="media duration")
+    p.add_argument('--bitrate', default='2M', help="video bitrate")
+    p.add_argument('--per-conn-mbps', type=float, default=8.0, help="per-connection cap in MiB/s (0 = none)")
+    p.add_argument('--latency', type=float, default=0.02, help="seconds before each response")
+    p.add_argument('--extract-delay', type=float, default=0.3, help="simulated extraction time")
+    p.add_argument('--segments', type=int, default=1)
+    p.add_argument('--output', help="also write the results to this file")
+    p.add_argument('--compare', metavar='BASELINE', help="a previous --output file to compare against")
+    args = p.parse_args()
+
+    report = {'benchmark': 'suite', 'commit': _commit(), 'time': round(time.time()),
+              'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')}, 'results': {}}
+    runners = {'single': single, 'concurrent': concurrent, 'playlist': playlist, 'gui': gui}
+    with FakeYouTube(videos=args.jobs, seconds=args.seconds, bitrate=args.bitrate,
+                     per_connection_bps=args.per_conn_mbps * MB, latency=args.latency,
+                     extract_delay=args.extract_delay) as yt, yt.installed():
+        for scenario in args.scenarios:
+            runs = []
+            for _ in range(args.runs):
+                outdir = tempfile.mkdtemp(prefix=f'bench-{scenario}-')
+                try:
+                    result = runners[scenario](yt, outdir, args)
+                finally:
+                    shutil.rmtree(outdir, ignore_errors=True)
+                if result is None:
+                    break
+                runs.append(result)
+            report['results'][scenario] = _median_of(runs) if runs else None
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        report['compared_to'] = baseline.get('commit')
+        report['changes'] = compare(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+bench_thumbnails.py
+Cost of showing a thumbnail again: decode + rescale every time vs. thumb_store.
+
+  rescale  what the GUI did before: decode the full JPEG and scale it
+           (SmoothTransformation) on every view;
+  cold     first view through the store: hash, write, scale, encode the
+           variant, write it, decode it;
+  disk     a later session (new store, same folder): read and decode the
+           small variant;
+  memory   a repeat view in the same session: the decoded variant from the
+           in-memory LRU.
+
+Each variant (playlist icon, 500x300 panel) is timed over `--thumbs`
+distinct 1280x720 JPEGs; no network is involved.
+
+    python benchmarks/bench_thumbnails.py --thumbs 200
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QSize, Qt  # noqa: E402
+from PyQt5.QtGui import QImage  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from fake_youtube import make_thumbnail, video_id  # noqa: E402
+from main import decode_thumbnail, scale_thumbnail  # noqa: E402
+from thumb_store import VARIANTS, ThumbnailStore  # noqa: E402
+
+
+def _timed(items, fn) -> dict:
+    times = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        times.append((time.perf_counter() - t0) * 1000)
+    return {'median_ms': round(statistics.median(times), 3), 'total_ms': round(sum(times), 1)}
+
+
+def _rescale(data: bytes, size: tuple):
+    img = QImage()
+    img.loadFromData(data)
+    return img.scaled(QSize(*size), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--thumbs', type=int, default=200)
+    args = p.parse_args()
+
+    app = QApplication([])  # noqa: F841 (image plugins need an application)
+    thumbs = [make_thumbnail(video_id(i)) for i in range(args.thumbs)]
+    root = tempfile.mkdtemp(prefix='bench-thumbs-')
+    results = {}
+    try:
+        for variant, size in VARIANTS.items():
+            path = os.path.join(root, variant)
+            r = results[variant] = {'rescale': _timed(thumbs, lambda data: _rescale(data, size))}
+            store = ThumbnailStore(path, scale=scale_thumbnail, decode=decode_thumbnail,
+                                   weigh=QImage.sizeInBytes, memory_bytes=1 << 30)
+            digests = []
+            r['cold'] = _timed(thumbs, lambda data: digests.append(store.put(data)) or store.get(digests[-1], variant))
+            r['memory'] = _timed(digests, lambda digest: store.get(digest, variant))
+            store.close()
+            store = ThumbnailStore(path, scale=scale_thumbnail, decode=decode_thumbnail,
+                                   weigh=QImage.sizeInBytes, memory_bytes=1 << 30)
+            r['disk'] = _timed(digests, lambda digest: store.get(digest, variant))
+            r['stats'] = store.stats()
+            store.close()
+            r['speedup_memory'] = round(r['rescale']['median_ms'] / max(r['memory']['median_ms'], 1e-6), 1)
+            r['speedup_disk'] = round(r['rescale']['median_ms'] / max(r['disk']['median_ms'], 1e-6), 1)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print(json.dumps({'benchmark': 'thumbnails', 'thumbs': args.thumbs, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
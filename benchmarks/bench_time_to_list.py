@@ -0,0 +1,127 @@
+"""
+bench_time_to_list.py
+Time-to-first-list: serial extract-then-thumbnail vs. the overlapped path.
+
+A local HTTP server stands in for i.ytimg.com (with a configurable delay per
+thumbnail) and yt-dlp's extraction is replaced by a sleep, so the numbers
+only measure how the two phases are scheduled, not YouTube.
+
+    python benchmarks/bench_time_to_list.py --extract-delay 0.6 --thumb-delay 0.8 --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ytdl_core  # noqa: E402
+from http_pool import HTTPPool  # noqa: E402
+
+VIDEO_ID = "dQw4w9WgXcQ"
+THUMB = b"\xff\xd8\xff" + os.urandom(60 * 1024)
+
+
+def make_server(thumb_delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(thumb_delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(THUMB)))
+            self.end_headers()
+            self.wfile.write(THUMB)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_fake_ydl(base: str, extract_delay: float):
+    class FakeYoutubeDL:
+        def __init__(self, opts):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=False):
+            time.sleep(extract_delay)
+            return {
+                'id': VIDEO_ID,
+                'title': "Benchmark video",
+                'thumbnail': f"{base}/vi/{VIDEO_ID}/maxresdefault.jpg",
+                'formats': [{'format_id': str(i), 'height': 144 * (i % 8 + 1), 'ext': 'mp4',
+                             'vcodec': 'avc1', 'acodec': 'none'} for i in range(40)],
+            }
+
+    return FakeYoutubeDL
+
+
+def serial_listing(url):
+    """The pre-overlap behaviour: extract, then urlopen the thumbnail, then show."""
+    with ytdl_core.yt_dlp.YoutubeDL({}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    with urllib.request.urlopen(info['thumbnail'], timeout=10) as resp:
+        resp.read()
+    return info
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--extract-delay', type=float, default=0.6)
+    p.add_argument('--thumb-delay', type=float, default=0.8)
+    p.add_argument('--runs', type=int, default=5)
+    args = p.parse_args()
+
+    server = make_server(args.thumb_delay)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    ytdl_core.yt_dlp.YoutubeDL = make_fake_ydl(base, args.extract_delay)
+    ytdl_core.YOUTUBE_THUMB_URL = base + "/vi/{video_id}/{name}.jpg"
+    pool = HTTPPool()
+    ytdl_core.default_pool = pool
+    url = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+
+    serial, first_list, full = [], [], []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        serial_listing(url)
+        serial.append(time.perf_counter() - t0)
+
+        marks = {}
+        t0 = time.perf_counter()
+        ytdl_core.list_formats(url, on_formats=lambda payload: marks.setdefault('list', time.perf_counter() - t0))
+        full.append(time.perf_counter() - t0)
+        first_list.append(marks['list'])
+
+    result = {
+        'benchmark': 'time_to_list',
+        'extract_delay': args.extract_delay,
+        'thumb_delay': args.thumb_delay,
+        'runs': args.runs,
+        'serial_time_to_list_s': round(statistics.median(serial), 4),
+        'overlapped_time_to_list_s': round(statistics.median(first_list), 4),
+        'overlapped_time_to_thumbnail_s': round(statistics.median(full), 4),
+        'thumbnail_requests': pool.requests,
+        'thumbnail_connections_opened': pool.connections_opened,
+    }
+    print(json.dumps(result, indent=2))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
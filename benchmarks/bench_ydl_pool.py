@@ -0,0 +1,119 @@
+"""
+bench_ydl_pool.py
+Per-call overhead of a fresh YoutubeDL per call vs. ydl_pool's reused instances.
+
+  construct  borrowing a listing instance vs. building (and closing) one,
+             with yt-dlp's full extractor list;
+  list       ytdl_core.list_formats() against the local fake YouTube;
+  download   ytdl_core.download() of a short video, each into a new folder.
+
+"fresh" runs the same code with a stand-in pool that builds and closes a
+YoutubeDL on every borrow (what ytdl_core did before the pool). The fake
+YouTube registers all of yt-dlp's extractors behind its own, so instances
+cost what real ones do; it has no extraction delay or latency, so the
+difference is the overhead itself. Connections per call count TCP
+connections the server saw: they are only reused when yt-dlp has a
+keep-alive backend (requests) installed.
+
+    python benchmarks/bench_ydl_pool.py --calls 30
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_youtube import FakeYouTube  # noqa: E402
+import ytdl_core  # noqa: E402
+from ydl_pool import YDLPool  # noqa: E402
+
+
+class FreshInstances:
+    """Same interface as YDLPool, but a new YoutubeDL for every call."""
+    created = reused = 0
+
+    @contextmanager
+    def session(self, opts: dict):
+        self.created += 1
+        with ytdl_core.yt_dlp_module().YoutubeDL(dict(opts)) as ydl:
+            yield ydl
+
+
+def _time_calls(calls: int, fn) -> list:
+    times = []
+    for i in range(calls):
+        t0 = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def _summary(times: list, **extra) -> dict:
+    return dict({'median_ms': round(statistics.median(times), 2), 'mean_ms': round(statistics.mean(times), 2)},
+                **extra)
+
+
+def construct(calls: int, pool) -> dict:
+    def borrow(_):
+        with pool.session(dict(ytdl_core.LIST_OPTS)) as ydl:
+            ydl.get_info_extractor('Youtube')
+    return _summary(_time_calls(calls, borrow))
+
+
+def listing(calls: int, pool, yt: FakeYouTube) -> dict:
+    before = yt.server.connections
+    times = _time_calls(calls, lambda i: ytdl_core.list_formats(yt.video_url(i % yt.videos)))
+    return _summary(times, connections_per_call=round((yt.server.connections - before) / calls, 2))
+
+
+def downloading(calls: int, pool, yt: FakeYouTube) -> dict:
+    before = yt.server.connections
+    root = tempfile.mkdtemp(prefix='bench-ydl-pool-')
+    for i in range(calls):
+        os.makedirs(os.path.join(root, str(i)))
+    try:
+        times = _time_calls(calls, lambda i: ytdl_core.download(
+            yt.video_url(i % yt.videos), "bestvideo+bestaudio/best", os.path.join(root, str(i))))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return _summary(times, connections_per_call=round((yt.server.connections - before) / calls, 2))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--calls', type=int, default=30)
+    p.add_argument('--download-calls', type=int, default=8)
+    p.add_argument('--seconds', type=int, default=2, help="media duration for the download test")
+    args = p.parse_args()
+
+    results = {}
+    for name, make in (('fresh', FreshInstances), ('pooled', YDLPool)):
+        pool = make()
+        results.setdefault('construct', {})[name] = construct(args.calls, pool)
+        saved_pool, ytdl_core.default_ydl_pool = ytdl_core.default_ydl_pool, pool
+        try:
+            with FakeYouTube(videos=4, seconds=args.seconds, all_extractors=True) as yt, yt.installed():
+                results.setdefault('list', {})[name] = listing(args.calls, pool, yt)
+                results.setdefault('download', {})[name] = downloading(args.download_calls, pool, yt)
+        finally:
+            ytdl_core.default_ydl_pool = saved_pool
+        results.setdefault('instances_built', {})[name] = pool.created
+        if isinstance(pool, YDLPool):
+            pool.close()
+    for test in ('construct', 'list', 'download'):
+        r = results[test]
+        r['saved_ms_per_call'] = round(r['fresh']['median_ms'] - r['pooled']['median_ms'], 2)
+    print(json.dumps({'benchmark': 'ydl_pool', 'calls': args.calls, 'download_calls': args.download_calls,
+                      'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+check_format_ranking.py
+Regression check for format_ranking against recorded format tables.
+
+format_corpus.json holds format lists in the shape list_formats() returns
+(real YouTube itags: 8K/HDR at 60 fps, an old upload with progressive 720p,
+a typical 1080p25 video, HLS-only progressive streams) and, per case, the
+rules and the pair they must select. Every case is also run on shuffled
+copies of its list to check the choice doesn't depend on format order.
+
+    python benchmarks/check_format_ranking.py
+
+Prints a JSON summary; exits non-zero if any case picks something else.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from format_ranking import RankingRules, select_formats  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'format_corpus.json')
+
+
+def check(corpus: dict, shuffles: int, seed: int) -> list:
+    rng = random.Random(seed)
+    failures = []
+    for case in corpus['cases']:
+        video = corpus['videos'][case['video']]
+        rules = RankingRules.from_spec(case['rules'])
+        formats = list(video['formats'])
+        for attempt in range(shuffles + 1):
+            choice = select_formats(formats, rules, video['duration'])
+            got = choice.spec if choice is not None else None
+            if got != case['expect']:
+                failures.append(dict(case, got=got, shuffled=attempt > 0))
+                break
+            rng.shuffle(formats)
+    return failures
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--corpus', default=CORPUS)
+    p.add_argument('--shuffles', type=int, default=20, help="shuffled re-runs per case")
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+
+    with open(args.corpus, encoding='utf-8') as fh:
+        corpus = json.load(fh)
+    failures = check(corpus, args.shuffles, args.seed)
+    print(json.dumps({'check': 'format_ranking', 'videos': len(corpus['videos']), 'cases': len(corpus['cases']),
+                      'failed': len(failures), 'failures': failures}, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+check_retry.py
+Downloads against a misbehaving local server must still come out right.
+
+  drops      ranges cut off part-way are fetched again from the last byte;
+             the file is byte-identical to the source;
+  stalls     a response that stops sending is abandoned after the read
+             timeout and retried;
+  503s       the first requests answered 503 are retried with backoff; with
+             the default breaker, enough of them in a row open the host's
+             circuit (30s), and the download waits that out and finishes;
+  breaker    a host that keeps failing opens its circuit, and the next
+             request of a caller with somewhere else to go (fail_fast)
+             fails at once with CircuitOpen;
+  download   ytdl_core.download() with drops on every stream still gets
+             byte-identical streams (checked before the merge, whose
+             output differs from run to run anyway) and merges them;
+  fallback   a video format whose URL answers 403 for good is replaced by
+             the next-best one and the download still completes.
+
+Prints JSON; exits non-zero if any check fails.
+
+    python benchmarks/check_retry.py --seed 1
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_youtube import FakeYouTube, media_path  # noqa: E402
+from range_server import Faults, RangeServer  # noqa: E402
+import ytdl_core  # noqa: E402
+from retry import CircuitBreaker, CircuitOpen, RetryPolicy, default_breaker  # noqa: E402
+from segmented import SegmentedDownloader  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(MB), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _segmented(payload: bytes, faults: Faults, tmp: str, name: str, **kwargs) -> dict:
+    retries = []
+    default_breaker.reset()
+    with RangeServer({'/file.bin': payload}, faults={'/file.bin': faults}) as server:
+        dest = os.path.join(tmp, name)
+        t0 = time.perf_counter()
+        d = SegmentedDownloader(server.url('/file.bin'), dest, segments=4, chunk_size=256 * 1024,
+                                retry=RetryPolicy(attempts=8, base_delay=0.05, max_delay=0.5),
+                                on_retry=retries.append, **kwargs)
+        d.run()
+        ok = _sha256(dest) == hashlib.sha256(payload).hexdigest()
+        return {'ok': ok, 'seconds': round(time.perf_counter() - t0, 2), 'retries': len(retries),
+                'injected': dict(server.injected)}
+
+
+def check_breaker(payload: bytes) -> dict:
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    policy = RetryPolicy(attempts=4, base_delay=0.01, max_delay=0.05)
+    with RangeServer({'/file.bin': payload}, faults={'/file.bin': Faults(always_status=503)}) as server:
+        first = SegmentedDownloader(server.url('/file.bin'), os.devnull, retry=policy, breaker=breaker,
+                                    fail_fast=True)
+        try:
+            first.probe()
+            return {'ok': False, 'error': "probe of a failing host succeeded"}
+        except CircuitOpen as e:
+            opened_after = str(e)
+        except Exception as e:
+            return {'ok': False, 'error': f"expected CircuitOpen, got {e!r}"}
+        requests = server.requests
+        t0 = time.perf_counter()
+        try:
+            SegmentedDownloader(server.url('/file.bin'), os.devnull, retry=policy, breaker=breaker,
+                                fail_fast=True).probe()
+            return {'ok': False, 'error': "second probe went through an open circuit"}
+        except CircuitOpen:
+            pass
+        return {'ok': server.requests == requests, 'requests_before_open': requests,
+                'fail_fast_ms': round((time.perf_counter() - t0) * 1000, 2), 'message': opened_after}
+
+
+def _download(yt: FakeYouTube, root: str, name: str) -> tuple:
+    """(result, whether every downloaded stream equals its source) for a merged download of video 0."""
+    outdir = os.path.join(root, name)
+    os.makedirs(outdir)
+    default_breaker.reset()
+    result = ytdl_core.download(yt.video_url(0), "bestvideo+bestaudio/best", outdir, segments=4,
+                                chunk_size=256 * 1024, defer_postprocess=True)
+    sources = {hashlib.sha256(yt.video_bytes).hexdigest(), hashlib.sha256(yt.audio_bytes).hexdigest()}
+    intact = {_sha256(path) for path in result.postprocess.inputs} == sources
+    result.postprocess.run()
+    return result, intact and os.path.exists(result.path)
+
+
+def check_downloads(seed: int, seconds: int, tmp: str) -> dict:
+    results = {}
+    with FakeYouTube(seconds=seconds) as yt, yt.installed():
+        vid = yt.ids[0]
+        clean, _ = _download(yt, tmp, 'clean')
+        chosen = clean.format_id.split('+')
+        for i, fid in enumerate(chosen):
+            yt.server.faults[media_path(vid, fid)] = Faults(drop=0.15, seed=seed + i)
+        faulty, intact = _download(yt, tmp, 'drops')
+        results['download'] = {'ok': intact, 'format_id': faulty.format_id, 'injected': dict(yt.server.injected)}
+
+        yt.server.faults.clear()
+        yt.server.faults[media_path(vid, chosen[0])] = Faults(always_status=403)
+        try:
+            fallback, intact = _download(yt, tmp, 'fallback')
+            results['fallback'] = {'ok': intact and fallback.format_id.split('+')[0] != chosen[0],
+                                   'broken': chosen[0], 'format_id': fallback.format_id}
+        except Exception as e:
+            results['fallback'] = {'ok': False, 'error': str(e)}
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--size-mb', type=int, default=8)
+    p.add_argument('--seconds', type=int, default=3, help="media duration for the download checks")
+    args = p.parse_args()
+
+    payload = os.urandom(args.size_mb * MB)
+    tmp = tempfile.mkdtemp(prefix='check-retry-')
+    try:
+        results = {
+            'drops': _segmented(payload, Faults(drop=0.3, seed=args.seed), tmp, 'drops.bin'),
+            'stalls': _segmented(payload, Faults(stall=0.1, stall_seconds=30, seed=args.seed), tmp, 'stalls.bin',
+                                 timeout=1),
+            '503s': _segmented(payload, Faults(fail_first=default_breaker.threshold, seed=args.seed), tmp,
+                               '503s.bin'),
+            'breaker': check_breaker(payload),
+        }
+        results.update(check_downloads(args.seed, args.seconds, tmp))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    ok = all(r.get('ok') for r in results.values())
+    print(json.dumps({'check': 'retry', 'seed': args.seed, 'ok': ok, 'results': results}, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
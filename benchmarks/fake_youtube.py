@@ -0,0 +1,203 @@
+"""
+fake_youtube.py
+Local stand-in for YouTube: format manifests, thumbnails and media files on
+one RangeServer, and a yt-dlp extractor that reads them.
+
+Every video ('bench000000', 'bench000001', ...) gets a JSON manifest with
+a realistic format list, a 1280x720 JPEG thumbnail (the same picture, but
+different bytes per video) and a DASH-like video-only + audio-only
+pair (fragmented MP4, generated once with ffmpeg and shared by all videos),
+so yt-dlp's real format selection, HTTP downloader and ffmpeg merge all run.
+Every format has its own URL (media_path()) so `faults` (RangeServer
+Faults by path) can break one format and leave the others working.
+A playlist lists every video. Per-connection bandwidth and request latency
+are the RangeServer's; `extract_delay` adds the time YouTube's extraction
+would take on top of the manifest request.
+
+    with FakeYouTube(videos=4, per_connection_bps=8 * MB) as yt, yt.installed():
+        ytdl_core.list_formats(yt.video_url(0))
+
+installed() swaps yt_dlp.YoutubeDL for a subclass that only knows the fake
+extractor (it matches youtube.com / youtu.be URLs) and points ytdl_core's
+speculative thumbnail URL at the server; both are restored afterwards. With
+all_extractors=True the subclass also registers yt-dlp's own extractors
+(behind the fake one), so building an instance costs what it does for real.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yt_dlp  # noqa: E402
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+
+import ytdl_core  # noqa: E402
+from range_server import RangeServer  # noqa: E402
+
+MB = 1024 * 1024
+PLAYLIST_ID = 'PLbenchmark'
+
+# (format_id, height, fps, vcodec, tbr) of the advertised video formats; all serve the same media
+VIDEO_FORMATS = (
+    ('160', 144, 30, 'avc1.4d400c', 110.0), ('278', 144, 30, 'vp9', 95.0),
+    ('133', 240, 30, 'avc1.4d4015', 250.0), ('242', 240, 30, 'vp9', 220.0),
+    ('134', 360, 30, 'avc1.4d401e', 600.0), ('243', 360, 30, 'vp9', 400.0),
+    ('135', 480, 30, 'avc1.4d401f', 1100.0), ('244', 480, 30, 'vp9', 750.0),
+    ('136', 720, 30, 'avc1.4d401f', 2200.0), ('247', 720, 30, 'vp9', 1500.0),
+)
+AUDIO_FORMATS = (('139', 'mp4a.40.5', 48.0), ('140', 'mp4a.40.2', 129.0))
+
+_media_cache = {}
+_thumb_cache = []
+
+
+def video_id(index: int) -> str:
+    return f"bench{index:06d}"
+
+
+def media_path(vid: str, format_id: str) -> str:
+    ext = 'm4a' if format_id in {fid for fid, *_ in AUDIO_FORMATS} else 'mp4'
+    return f'/media/{vid}/{format_id}.{ext}'
+
+
+def make_thumbnail(tag: str) -> bytes:
+    """A 1280x720 JPEG (generated once with ffmpeg) with `tag` in a comment segment, so its bytes are unique."""
+    if not _thumb_cache:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 't.jpg')
+            subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'lavfi', '-i',
+                            'testsrc2=size=1280x720', '-frames:v', '1', '-q:v', '3', path], check=True)
+            with open(path, 'rb') as fh:
+                _thumb_cache.append(fh.read())
+    comment = tag.encode()
+    # SOI, then a COM segment (marker, 2-byte length including itself), then the rest of the file
+    return _thumb_cache[0][:2] + b'\xff\xfe' + (len(comment) + 2).to_bytes(2, 'big') + comment + _thumb_cache[0][2:]
+
+
+def make_media(seconds: int = 10, bitrate: str = '2M', height: int = 720) -> tuple:
+    """(video-only fMP4 bytes, audio-only fMP4 bytes), generated with ffmpeg and cached per process."""
+    key = (seconds, bitrate, height)
+    if key not in _media_cache:
+        with tempfile.TemporaryDirectory() as tmp:
+            video, audio = os.path.join(tmp, 'v.mp4'), os.path.join(tmp, 'a.m4a')
+            common = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+            frag = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+            subprocess.run(common + ['-f', 'lavfi', '-i',
+                                     f'testsrc2=size={height * 16 // 9}x{height}:rate=30:duration={seconds}',
+                                     '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', bitrate] + frag + [video],
+                           check=True)
+            subprocess.run(common + ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+                                     '-c:a', 'aac', '-b:a', '128k'] + frag + [audio], check=True)
+            with open(video, 'rb') as v, open(audio, 'rb') as a:
+                _media_cache[key] = v.read(), a.read()
+    return _media_cache[key]
+
+
+class FakeYouTube:
+    def __init__(self, videos: int = 1, seconds: int = 10, bitrate: str = '2M', height: int = 720,
+                 per_connection_bps: float = 0, latency: float = 0.0, extract_delay: float = 0.0,
+                 all_extractors: bool = False, faults: dict = None):
+        self.videos = videos
+        self.all_extractors = all_extractors
+        self.seconds = seconds
+        self.extract_delay = extract_delay
+        self.video_bytes, self.audio_bytes = make_media(seconds, bitrate, height)
+        self.server = RangeServer({}, per_connection_bps=per_connection_bps, latency=latency, faults=faults)
+        self.ids = [video_id(i) for i in range(videos)]
+        files = self.server.files
+        for vid in self.ids:
+            for fid, *_ in VIDEO_FORMATS:
+                files[media_path(vid, fid)] = self.video_bytes
+            for fid, *_ in AUDIO_FORMATS:
+                files[media_path(vid, fid)] = self.audio_bytes
+            files[f'/vi/{vid}/maxresdefault.jpg'] = make_thumbnail(vid)
+            files[f'/manifest/{vid}.json'] = json.dumps(self._manifest(vid)).encode()
+        files[f'/playlist/{PLAYLIST_ID}.json'] = json.dumps({
+            'id': PLAYLIST_ID, 'title': "Benchmark playlist",
+            'entries': [{'id': vid, 'title': f"Benchmark video {vid}", 'duration': seconds} for vid in self.ids],
+        }).encode()
+
+    def _manifest(self, vid: str) -> dict:
+        """Format URLs are paths; the extractor makes them absolute (the port isn't known yet)."""
+        formats = [{'format_id': fid, 'url': media_path(vid, fid), 'ext': 'mp4', 'container': 'mp4_dash',
+                    'protocol': 'http', 'height': height, 'width': height * 16 // 9, 'fps': fps, 'vcodec': vcodec,
+                    'acodec': 'none', 'tbr': tbr, 'filesize': len(self.video_bytes), 'dynamic_range': 'SDR'}
+                   for fid, height, fps, vcodec, tbr in VIDEO_FORMATS]
+        formats += [{'format_id': fid, 'url': media_path(vid, fid), 'ext': 'm4a', 'container': 'm4a_dash',
+                     'protocol': 'http', 'vcodec': 'none', 'acodec': acodec, 'abr': abr, 'tbr': abr,
+                     'filesize': len(self.audio_bytes)}
+                    for fid, acodec, abr in AUDIO_FORMATS]
+        return {'id': vid, 'title': f"Benchmark video {vid}", 'duration': self.seconds, 'channel': "Benchmarks",
+                'thumbnail': f'/vi/{vid}/maxresdefault.jpg', 'formats': formats}
+
+    def video_url(self, index: int) -> str:
+        return f"https://www.youtube.com/watch?v={self.ids[index]}"
+
+    @property
+    def playlist_url(self) -> str:
+        return f"https://www.youtube.com/playlist?list={PLAYLIST_ID}"
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def youtube_dl_class(self):
+        """A yt_dlp.YoutubeDL whose only extractor is this server's."""
+        fake = self
+
+        class FakeYoutubeIE(InfoExtractor):
+            IE_NAME = 'fakeyoutube'
+            _VALID_URL = (r'https?://(?:www\.)?(?:youtube\.com/(?:watch\?v=|playlist\?list=)|youtu\.be/)'
+                          r'(?P<id>[\w-]+)')
+
+            def _real_extract(self, url):
+                item_id = self._match_id(url)
+                base = fake.server.base_url
+                if 'list=' in url:
+                    data = self._download_json(f'{base}/playlist/{item_id}.json', item_id)
+                    return self.playlist_result(
+                        [self.url_result(f"https://www.youtube.com/watch?v={e['id']}", FakeYoutubeIE.ie_key(),
+                                         e['id'], e['title'], duration=e['duration'])
+                         for e in data['entries']], data['id'], data['title'])
+                if fake.extract_delay:
+                    time.sleep(fake.extract_delay)
+                info = self._download_json(f'{base}/manifest/{item_id}.json', item_id)
+                info['thumbnail'] = base + info['thumbnail']
+                for f in info['formats']:
+                    f['url'] = base + f['url']
+                return info
+
+        class FakeYoutubeDL(yt_dlp.YoutubeDL):
+            def __init__(self, params=None, auto_init=True):
+                super().__init__(params, auto_init=False)
+                self.add_info_extractor(FakeYoutubeIE())
+                if fake.all_extractors:
+                    self.add_default_info_extractors()
+
+        return FakeYoutubeDL
+
+    @contextmanager
+    def installed(self):
+        saved = yt_dlp.YoutubeDL, ytdl_core.YOUTUBE_THUMB_URL
+        yt_dlp.YoutubeDL = self.youtube_dl_class()
+        ytdl_core.YOUTUBE_THUMB_URL = self.server.base_url + "/vi/{video_id}/{name}.jpg"
+        try:
+            yield self
+        finally:
+            yt_dlp.YoutubeDL, ytdl_core.YOUTUBE_THUMB_URL = saved
@@ -0,0 +1,183 @@
+"""
+range_server.py
+Local HTTP server serving in-memory files with Range support, for benchmarks.
+
+Each connection is throttled to `per_connection_bps` (like a CDN capping a
+single TCP stream) and every request waits `latency` seconds before the
+first byte, so single- and multi-connection strategies can be compared
+without touching the network.
+
+`faults` maps paths to Faults, which make the server misbehave the way
+real CDNs do now and then: cut a response off part-way (drop), stop
+sending in the middle of one (stall), answer the first few requests with a
+503, or answer every request with some error status. The random choices
+come from a seeded generator, so a run can be repeated exactly.
+"""
+
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)')
+
+
+class Faults:
+    def __init__(self, drop: float = 0.0, stall: float = 0.0, stall_seconds: float = 30.0, fail_first: int = 0,
+                 fail_status: int = 503, always_status: int = None, seed: int = 0):
+        """`drop` / `stall`: chance that a response is cut off / stops for `stall_seconds` part-way
+        through its body; the first `fail_first` requests get `fail_status`; with `always_status`
+        every request gets that status."""
+        self.drop = drop
+        self.stall = stall
+        self.stall_seconds = stall_seconds
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.always_status = always_status
+        self.seen = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def plan(self):
+        """(error status or None, 'drop' / 'stall' / None, fraction of the body sent first) for one request."""
+        with self._lock:
+            self.seen += 1
+            if self.always_status:
+                return self.always_status, None, 0
+            if self.seen <= self.fail_first:
+                return self.fail_status, None, 0
+            roll = self._random.random()
+            cut = self._random.random()
+        if roll < self.drop:
+            return None, 'drop', cut
+        if roll < self.drop + self.stall:
+            return None, 'stall', cut
+        return None, None, 0
+
+
+class RangeServer:
+    def __init__(self, files: dict, per_connection_bps: float = 0, latency: float = 0.0, faults: dict = None):
+        """`files` maps URL paths ('/video.mp4') to bytes, `faults` paths to Faults."""
+        self.files = files
+        self.per_connection_bps = per_connection_bps
+        self.latency = latency
+        self.faults = faults if faults is not None else {}
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.injected = {'status': 0, 'drop': 0, 'stall': 0}
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()  # ends stalls early
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                path = self.path.split('?', 1)[0]
+                data = server.files.get(path)
+                if data is None:
+                    self.send_error(404)
+                    return
+                faults = server.faults.get(path)
+                status, fault, cut = faults.plan() if faults is not None else (None, None, 0)
+                if status:
+                    with server._lock:
+                        server.injected['status'] += 1
+                    self.send_error(status)
+                    return
+                size = len(data)
+                m = _RANGE_RE.match(self.headers.get('Range') or '')
+                if m:
+                    start = int(m.group(1))
+                    end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    start, end = 0, size - 1
+                    self.send_response(200)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if fault is None:
+                    self._send_throttled(data, start, end)
+                    return
+                with server._lock:
+                    server.injected[fault] += 1
+                self.close_connection = True
+                stop = start + int((end - start + 1) * cut)
+                if stop > start:
+                    self._send_throttled(data, start, stop - 1)
+                if fault == 'stall':
+                    server._stopped.wait(faults.stall_seconds)
+                # a drop just closes the connection with the rest of the body unsent
+
+            def _send_throttled(self, data, start, end):
+                block = 64 * 1024
+                began = time.monotonic()
+                sent = 0
+                pos = start
+                try:
+                    while pos <= end:
+                        chunk = data[pos:min(pos + block, end + 1)]
+                        self.wfile.write(chunk)
+                        pos += len(chunk)
+                        sent += len(chunk)
+                        with server._lock:
+                            server.bytes_sent += len(chunk)
+                        if server.per_connection_bps:
+                            ahead = sent / server.per_connection_bps - (time.monotonic() - began)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,377 @@
+"""
+control_api.py
+Local HTTP/JSON control API over a job_manager.JobManager. Does not import PyQt5.
+
+Lets scripts list formats, queue downloads, follow them and cancel them,
+in the same queue the GUI shows (YTDL_API_PORT) or a headless one
+(ytdl_cli.py --serve). An asyncio server runs in a daemon thread; requests
+are handled in a small thread pool, so a slow listing never holds up the
+others, and connections are kept alive between requests.
+
+    GET    /formats?url=URL         formats and metadata, as ytdl_cli.py --list-formats
+    GET    /jobs[?state=a,b]        jobs (optionally only those states) and counts per state
+    POST   /jobs                    queue {"url": ...}, {"jobs": [{...}, ...]} or {"urls": [...], ...}
+    GET    /jobs/ID                 one job
+    DELETE /jobs/ID                 cancel it
+    POST   /jobs/cancel             cancel {"ids": [...]} or {"all": true}
+
+A job is a url plus, optionally: format (a yt-dlp spec or auto[...] rules;
+default DEFAULT_FORMAT), audio ("opus", "mp3:320"), outdir (default: the
+server's; only folders inside it), template (relative, staying inside the
+output folder) or layout (output_layout.LAYOUTS: "sharded", ...),
+catalog (write sidecars and the output folder's index), title, priority
+(low / normal / high), rate_limit ("2M"), segments, chunk_size (MiB),
+stream_merge and no_archive. With
+"urls", the other keys apply to every URL, so one request can queue a
+whole list. Errors come back as {"error": message} with a 4xx status.
+
+The server binds to 127.0.0.1 unless told otherwise, and every request
+must carry "Authorization: Bearer <token>". Without a configured token a
+random one is made and written to token_file (readable by the user only).
+So that web pages in the user's browser can't drive it (cross-site
+requests, DNS rebinding), requests with an Origin header, a Host other
+than the server's own address or a body that isn't application/json are
+refused before the token is even looked at.
+"""
+
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from ytdl_core import app_data_dir, audio_format_spec, audio_opts, format_sort_key, list_formats
+from bandwidth import PRIORITY_NAMES, parse_rate
+from format_ranking import RankingRules, select_formats
+from output_layout import template_for
+from job_manager import STATES, DownloadJob, JobManager
+from postprocess import parse_audio
+
+DEFAULT_FORMAT = "bestvideo+bestaudio/best"
+DEFAULT_PORT = 8765
+MAX_BODY = 16 * 1024 * 1024
+IDLE_TIMEOUT = 60.0  # seconds a kept-alive connection may sit idle
+HANDLER_THREADS = 8
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+_REASONS = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+            403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            415: "Unsupported Media Type", 500: "Internal Server Error"}
+
+
+def default_token_file() -> str:
+    return os.path.join(app_data_dir('data'), 'api-token')
+
+
+class APIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ControlAPI:
+    def __init__(self, manager: JobManager, outdir: Optional[str] = None, host: str = '127.0.0.1',
+                 port: int = DEFAULT_PORT, token: Optional[str] = None, format_cache=None,
+                 token_file: Optional[str] = None):
+        """`outdir`: where jobs without one go, and the folder no job may leave (the GUI keeps it in
+        step with its folder field). Without a `token`, a random one is made and start() writes it to
+        `token_file` if given."""
+        self.manager = manager
+        self.outdir = outdir or os.getcwd()
+        self.host = host
+        self.port = port
+        self.token = token or secrets.token_urlsafe(32)
+        self.token_file = None if token else token_file
+        self.format_cache = format_cache
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._executor = ThreadPoolExecutor(HANDLER_THREADS, thread_name_prefix="control-api")
+
+    def start(self) -> int:
+        """Serve from a daemon thread; returns the bound port (useful with port 0)."""
+        ready = threading.Event()
+        failure = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(
+                    asyncio.start_server(self._serve_connection, self.host, self.port))
+            except OSError as e:
+                failure.append(e)
+                ready.set()
+                return
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            # stopped: drop the connections still open (kept alive or mid-request)
+            connections = asyncio.all_tasks(self._loop)
+            for task in connections:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+            self._loop.close()
+
+        threading.Thread(target=run, daemon=True, name="control-api").start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+        if self.token_file:
+            self._write_token()
+        return self.port
+
+    def _write_token(self):
+        tmp = self.token_file + '.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(self.token + "\n")
+        os.replace(tmp, self.token_file)
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            def close():
+                self._server.close()
+                self._loop.stop()
+            self._loop.call_soon_threadsafe(close)
+        self._executor.shutdown(wait=False)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # ---------- HTTP ----------
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version.upper() != 'HTTP/1.0')
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY:
+                    await self._respond(writer, 413 if length > 0 else 400,
+                                        {'error': "bad or too large Content-Length"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                loop = asyncio.get_running_loop()
+                status, payload = await loop.run_in_executor(self._executor, self._dispatch,
+                                                             method.upper(), target, headers, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            pass  # stop(); ending quietly keeps asyncio from logging the cancelled handler
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    def _dispatch(self, method: str, target: str, headers: dict, body: bytes) -> tuple:
+        """(status, JSON payload) for one request; runs on a handler thread."""
+        try:
+            self._check_origin(headers, body)
+            if not hmac.compare_digest(headers.get('authorization', '').encode('utf-8'),
+                                       f"Bearer {self.token}".encode('utf-8')):
+                raise APIError(401, "missing or wrong API token")
+            parts = urlsplit(target)
+            path = parts.path.rstrip('/') or '/'
+            query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+            data = self._json(body) if body else {}
+            return self._route(method, path, query, data)
+        except APIError as e:
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    def _check_origin(self, headers: dict, body: bytes):
+        """Refuse what a browser sends on a web page's behalf: a browser always names the page's
+        Origin on cross-site requests, and a rebound DNS name shows up in Host."""
+        if 'origin' in headers:
+            raise APIError(403, "cross-origin requests aren't allowed")
+        host = headers.get('host')
+        if host is not None:
+            name = urlsplit(f"//{host}").hostname or ''
+            if name not in LOCAL_HOSTS and name != self.host.strip('[]'):
+                raise APIError(403, f"unexpected Host header: {host}")
+        content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+        if (body or content_type) and content_type != 'application/json':
+            raise APIError(415, "send the request body as application/json")
+
+    @staticmethod
+    def _json(body: bytes):
+        try:
+            return json.loads(body.decode('utf-8'))
+        except ValueError as e:
+            raise APIError(400, f"body isn't valid JSON: {e}")
+
+    def _route(self, method: str, path: str, query: dict, data) -> tuple:
+        segments = path.strip('/').split('/')
+        if path == '/formats':
+            self._allow(method, 'GET')
+            return 200, self.formats(query.get('url', ''), refresh=query.get('refresh') in ('1', 'true'))
+        if path == '/jobs':
+            if method == 'POST':
+                return 201, {'jobs': [job.to_dict() for job in self.submit(data)]}
+            self._allow(method, 'GET')
+            states = set(filter(None, query.get('state', '').split(',')))
+            if not states <= set(STATES):
+                raise APIError(400, f"unknown state in {query['state']!r} (choose from {', '.join(STATES)})")
+            return 200, {'jobs': [job.to_dict() for job in list(self.manager.jobs)
+                                  if not states or job.state in states],
+                         'counts': self.manager.counts()}
+        if path == '/jobs/cancel':
+            self._allow(method, 'POST')
+            return 202, {'jobs': [job.to_dict() for job in self.cancel(data)]}
+        if len(segments) == 2 and segments[0] == 'jobs':
+            job = self._job(segments[1])
+            if method == 'DELETE':
+                self.manager.cancel(job)
+                return 202, job.to_dict()
+            self._allow(method, 'GET')
+            return 200, job.to_dict()
+        raise APIError(404, f"no such endpoint: {path}")
+
+    @staticmethod
+    def _allow(method: str, allowed: str):
+        if method != allowed:
+            raise APIError(405, f"use {allowed}")
+
+    def _job(self, job_id) -> DownloadJob:
+        try:
+            job = self.manager.get(int(job_id))
+        except (TypeError, ValueError):
+            job = None
+        if job is None:
+            raise APIError(404, f"no such job: {job_id}")
+        return job
+
+    # ---------- operations ----------
+    def formats(self, url: str, refresh: bool = False) -> dict:
+        if not url:
+            raise APIError(400, "url is required")
+        metrics = self.manager.metrics
+        trace = metrics.start('list', url) if metrics is not None else None
+        try:
+            payload = list_formats(url, cache=self.format_cache, refresh=refresh, trace=trace)
+        except Exception as e:
+            if trace is not None:
+                metrics.finish(trace, 'failed', e)
+            raise APIError(400, str(e))
+        if trace is not None:
+            metrics.finish(trace, 'ok')
+        payload.pop('thumbnail_bytes', None)
+        payload['formats'] = sorted(payload['formats'], key=format_sort_key)
+        choice = select_formats(payload['formats'], RankingRules(), payload.get('duration'))
+        if choice is not None:
+            payload['selected'] = {'spec': choice.spec, 'description': choice.describe(), 'size': choice.size}
+        return payload
+
+    def submit(self, data) -> list:
+        """Queue the jobs in a POST /jobs body; all of them are checked before any is queued."""
+        if not isinstance(data, dict):
+            raise APIError(400, "expected a JSON object")
+        if 'jobs' in data:
+            specs = data['jobs']
+            if not isinstance(specs, list) or not all(isinstance(s, dict) for s in specs):
+                raise APIError(400, "jobs must be a list of objects")
+        elif 'urls' in data:
+            urls = data['urls']
+            if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+                raise APIError(400, "urls must be a list of strings")
+            shared = {k: v for k, v in data.items() if k != 'urls'}
+            specs = [dict(shared, url=url) for url in urls if url.strip() and not url.strip().startswith('#')]
+        else:
+            specs = [data]
+        jobs = [self._make_job(spec) for spec in specs]
+        return [self.manager.enqueue(job) for job in jobs]
+
+    def _make_job(self, spec: dict) -> DownloadJob:
+        url = spec.get('url')
+        if not isinstance(url, str) or not url.strip():
+            raise APIError(400, "every job needs a url")
+        try:
+            format_spec = str(spec.get('format') or DEFAULT_FORMAT)
+            RankingRules.from_spec(format_spec)  # a malformed auto[...] fails here, not in the queue
+            extra_opts = None
+            if spec.get('audio'):
+                codec, quality = parse_audio(str(spec['audio']))
+                format_spec, extra_opts = audio_format_spec(codec), audio_opts(codec, quality)
+            options = {}
+            if spec.get('segments') and int(spec['segments']) > 1:
+                options.update(segments=int(spec['segments']),
+                               chunk_size=int(spec.get('chunk_size') or 10) * 1024 * 1024)
+            if spec.get('stream_merge'):
+                options['stream_merge'] = True
+            if spec.get('priority') is not None:
+                priority = spec['priority']
+                options['priority'] = PRIORITY_NAMES[priority] if isinstance(priority, str) else int(priority)
+            if spec.get('rate_limit'):
+                options['rate_limit'] = parse_rate(str(spec['rate_limit']))
+            if spec.get('no_archive'):
+                options['no_archive'] = True
+            if spec.get('catalog'):
+                options['catalog'] = True
+            template = str(spec.get('template') or template_for(str(spec.get('layout') or 'flat')))
+        except KeyError as e:
+            raise APIError(400, f"unknown priority {e} (choose from {', '.join(PRIORITY_NAMES)})")
+        except (TypeError, ValueError) as e:
+            raise APIError(400, f"{url}: {e}")
+        root = os.path.realpath(self.outdir)
+        outdir = os.path.realpath(os.path.join(root, os.path.expanduser(str(spec.get('outdir') or root))))
+        if not _inside(outdir, root):
+            raise APIError(400, f"Output folder must be inside {root}: {spec.get('outdir')}")
+        if not os.path.isdir(outdir):
+            raise APIError(400, f"Output folder doesn't exist: {outdir}")
+        if os.path.isabs(template) or not _inside(os.path.realpath(os.path.join(outdir, template)), outdir):
+            raise APIError(400, f"template must stay inside the output folder: {template}")
+        return DownloadJob(url, format_spec, outdir, template, extra_opts, title=spec.get('title'), options=options)
+
+    def cancel(self, data) -> list:
+        if not isinstance(data, dict):
+            raise APIError(400, "expected a JSON object")
+        if data.get('all'):
+            jobs = [job for job in list(self.manager.jobs) if job.is_active]
+        else:
+            ids = data.get('ids')
+            if not isinstance(ids, list):
+                raise APIError(400, "give ids (a list) or all: true")
+            jobs = [self._job(job_id) for job_id in ids]
+        for job in jobs:
+            self.manager.cancel(job)
+        return jobs
+
+
+def _inside(path: str, root: str) -> bool:
+    return os.path.commonpath([path, root]) == root
@@ -0,0 +1,133 @@
+"""
+disk_space.py
+Disk-space admission control: does a download (and its merge) fit?
+
+A split download needs room for its streams and then, while ffmpeg merges
+them, for the merged file as well: about twice the stream size at the
+peak (audio extraction is the same: source plus converted file). With
+stream merging only the output is ever written. estimate_peak() works
+that out from the format sizes, with some slack for approximate sizes.
+
+One DiskBudget is shared by all jobs. It keeps, per file system, the bytes
+every admitted job may still write (its peak minus what it has written so
+far) and admits a new job only if the free space, minus those reservations
+and a safety margin, covers its peak. A job that doesn't fit gets NoSpace
+(saying how much is missing) before it downloads anything, so the caller
+can hold it back until space frees up instead of having it fail on a full
+disk hours later.
+"""
+
+import errno
+import os
+import shutil
+import threading
+from typing import Callable, Optional
+
+from progress import human_readable_size
+
+DEFAULT_MARGIN = 512 * 1024 * 1024  # left free for everything else on the disk
+SIZE_SLACK = 1.05                   # filesize_approx (and tbr * duration) are estimates
+WAIT_SLICE = 0.5                    # a waiting admit() looks at the free space (and for a cancel) this often
+
+
+class NoSpace(Exception):
+    """Not enough free disk space for a job, counting the other jobs' reservations."""
+
+    def __init__(self, needed: int, available: int, path: str):
+        super().__init__(f"Not enough disk space in {path}: needs {human_readable_size(needed)}, "
+                         f"{human_readable_size(max(0, available))} available")
+        self.needed = needed
+        self.available = available
+        self.path = path
+
+
+def is_disk_full(exc: BaseException) -> bool:
+    return isinstance(exc, NoSpace) or (isinstance(exc, OSError) and exc.errno in (errno.ENOSPC, errno.EDQUOT))
+
+
+def estimate_peak(sizes, merge: bool = False, stream_merge: bool = False) -> Optional[int]:
+    """Most disk space a job needs at once, from its streams' sizes; None if any is unknown.
+    `merge`: the streams are merged (or converted) into a new file afterwards."""
+    sizes = list(sizes)
+    if not sizes or any(not s for s in sizes):
+        return None
+    total = int(sum(sizes) * SIZE_SLACK)
+    if stream_merge:
+        return total  # the streams only pass through a pipe
+    return 2 * total if merge else total
+
+
+class DiskBudget:
+    def __init__(self, margin: int = DEFAULT_MARGIN, free_space: Optional[Callable[[str], int]] = None):
+        """`free_space(path)` returns the free bytes of path's file system (shutil.disk_usage by default)."""
+        self.margin = margin
+        self.free_space = free_space or (lambda path: shutil.disk_usage(path).free)
+        self._jobs = {}  # key -> [volume, peak, written]
+        self._changed = threading.Condition()
+
+    @staticmethod
+    def volume_of(path: str):
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            return os.path.abspath(path)
+
+    def available(self, path: str, exclude=None) -> int:
+        """Free bytes at `path` that no admitted job (other than `exclude`) has claimed, less the margin."""
+        volume = self.volume_of(path)
+        with self._changed:
+            return self._available(path, volume, exclude)
+
+    def _available(self, path, volume, exclude) -> int:
+        reserved = sum(max(0, peak - written) for key, (vol, peak, written) in self._jobs.items()
+                       if vol == volume and key != exclude)
+        return self.free_space(path) - reserved - self.margin
+
+    def admit(self, key, path: str, peak: int, is_cancelled: Optional[Callable[[], bool]] = None,
+              on_wait: Optional[Callable[[NoSpace], None]] = None):
+        """Reserve `peak` bytes at `path` for job `key` (replacing its earlier reservation).
+
+        Raises NoSpace if it doesn't fit; with `is_cancelled`, waits instead
+        (calling on_wait once) for other jobs on the same file system to
+        finish until it fits, or raises InterruptedError once is_cancelled()
+        turns true. With no other job there to wait for, it raises NoSpace.
+        A waiting job gives up its earlier reservation meanwhile, so two jobs
+        re-admitting on one file system can't end up waiting for each other.
+        """
+        volume = self.volume_of(path)
+        waited = False
+        while True:
+            with self._changed:  # checked and reserved in one go, so two jobs can't claim the same space
+                available = self._available(path, volume, key)
+                if peak <= available:
+                    self._jobs[key] = [volume, peak, 0]
+                    return
+                others = any(vol == volume and k != key for k, (vol, _, _) in self._jobs.items())
+                if is_cancelled is not None and others and self._jobs.pop(key, None) is not None:
+                    self._changed.notify_all()
+            error = NoSpace(peak, available, path)
+            if is_cancelled is None or not others:
+                raise error
+            if not waited and on_wait is not None:
+                on_wait(error)
+            waited = True
+            if is_cancelled():
+                raise InterruptedError("Cancelled by user")
+            with self._changed:
+                self._changed.wait(WAIT_SLICE)  # woken early when a job releases its space
+
+    def update(self, key, written: int):
+        """Job `key` has written `written` bytes of its peak so far."""
+        with self._changed:
+            job = self._jobs.get(key)
+            if job is not None:
+                job[2] = max(0, written or 0)
+
+    def release(self, key):
+        with self._changed:
+            if self._jobs.pop(key, None) is not None:
+                self._changed.notify_all()
+
+    def reserved(self) -> int:
+        with self._changed:
+            return sum(max(0, peak - written) for _, peak, written in self._jobs.values())
@@ -0,0 +1,220 @@
+"""
+download_archive.py
+Persistent record of finished downloads, keyed by (video ID, format).
+
+download() looks a job up here before calling extract_info, using the video
+ID parsed from the URL, so re-running a whole channel skips everything that
+was already fetched without a single network request. Only a file that is
+still there, in the job's output folder, counts. A download is stored
+under its resolved format ID ('137+140') and under the format spec it was
+requested with ('bestvideo+bestaudio/best'), since only the latter is known
+before extraction. Audio jobs append the target codec ('140>mp3').
+
+rebuild() recovers the archive from an existing output folder: files named
+with the video ID ("Title [dQw4w9WgXcQ].mkv", the default template) and
+yt-dlp .info.json files. Those entries match any video (or any audio) format
+of that ID, since the exact format is not recorded in the file.
+
+All keys are also kept in memory, so has() is a set lookup; misses fall
+through to SQLite, which picks up entries another process (GUI / CLI) added.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from ytdl_core import app_data_dir
+
+ANY_VIDEO = '*'
+ANY_AUDIO = '*>audio'
+AUDIO_EXTS = ('mp3', 'opus', 'm4a', 'ogg', 'flac', 'wav', 'aac')
+MEDIA_EXTS = AUDIO_EXTS + ('mkv', 'mp4', 'webm', 'mov', 'avi', 'flv')
+
+_ID_IN_NAME_RE = re.compile(r'\[([A-Za-z0-9_-]{11})\]')
+_PARTIAL_RE = re.compile(r'\.(part|ytdl|temp\.\w+)$|\.f\d[\w-]*\.\w+$')  # leftovers, component streams
+
+
+def wildcard_for(format_key: str) -> str:
+    return ANY_AUDIO if '>' in (format_key or '') else ANY_VIDEO
+
+
+class DownloadArchive:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(app_data_dir('data'), 'archive.sqlite')
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                video_id    TEXT NOT NULL,
+                format_id   TEXT NOT NULL,
+                format_spec TEXT,
+                path        TEXT,
+                size        INTEGER,
+                created     REAL NOT NULL,
+                PRIMARY KEY (video_id, format_id)
+            ) WITHOUT ROWID""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS downloads_spec ON downloads (video_id, format_spec)")
+        self._db.commit()
+        self._keys = set()
+        for video_id, format_id, format_spec in self._db.execute(
+                "SELECT video_id, format_id, format_spec FROM downloads"):
+            self._keys.add((video_id, format_id))
+            if format_spec:
+                self._keys.add((video_id, format_spec))
+
+    def has(self, video_id: str, format_key: str) -> bool:
+        """True if `video_id` was downloaded with this format ID or spec (or is a rebuilt wildcard entry)."""
+        if not video_id:
+            return False
+        wildcard = wildcard_for(format_key)
+        keys = self._keys
+        if (video_id, format_key) in keys or (video_id, wildcard) in keys:
+            return True
+        with self._lock:
+            row = self._db.execute(
+                "SELECT format_id, format_spec FROM downloads WHERE video_id = ?"
+                " AND (format_id IN (?, ?) OR format_spec = ?) LIMIT 1",
+                (video_id, format_key, wildcard, format_key)).fetchone()
+        if row is None:
+            return False
+        keys.add((video_id, row[0]))
+        if row[1]:
+            keys.add((video_id, row[1]))
+        return True
+
+    def find(self, video_id: str, format_key: str, outdir: Optional[str] = None) -> Optional[str]:
+        """Where `video_id` was saved in this format, if that file still exists (and is under `outdir`);
+        None otherwise. Entries whose file is gone are dropped, so the video is downloaded again."""
+        if not self.has(video_id, format_key):
+            return None
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT format_id, format_spec, path FROM downloads WHERE video_id = ?"
+                " AND (format_id IN (?, ?) OR format_spec = ?)",
+                (video_id, format_key, wildcard_for(format_key), format_key)).fetchall()
+        found = None
+        for format_id, format_spec, path in rows:
+            if path and not os.path.exists(path):
+                self._forget(video_id, format_id, format_spec)
+            elif path and found is None and (outdir is None or _inside(path, outdir)):
+                found = path
+        return found
+
+    def _forget(self, video_id: str, format_id: str, format_spec: Optional[str]):
+        with self._lock:
+            self._db.execute("DELETE FROM downloads WHERE video_id = ? AND format_id = ?", (video_id, format_id))
+            self._db.commit()
+        # has() falls through to SQLite for a key another entry still holds
+        self._keys.discard((video_id, format_id))
+        if format_spec:
+            self._keys.discard((video_id, format_spec))
+
+    def add(self, video_id: str, format_id: str, format_spec: Optional[str] = None, path: Optional[str] = None):
+        if not video_id or not format_id:
+            return
+        size = None
+        if path:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO downloads (video_id, format_id, format_spec, path, size, created)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (video_id, format_id, format_spec, path, size, time.time()))
+            self._db.commit()
+        self._keys.add((video_id, format_id))
+        if format_spec:
+            self._keys.add((video_id, format_spec))
+
+    def record(self, result):
+        """Add a finished ytdl_core.DownloadResult (no-op if it lacks a video ID)."""
+        if result is not None and not result.skipped:
+            self.add(result.video_id, result.format_id, result.format_spec, result.path)
+
+    def remove(self, video_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM downloads WHERE video_id = ?", (video_id,))
+            self._db.commit()
+        self._keys = {k for k in self._keys if k[0] != video_id}
+
+    def rebuild(self, outdir: str, recursive: bool = True) -> int:
+        """Add every finished download found under `outdir`; returns the number of entries added."""
+        found = {}
+        for path in _walk(outdir, recursive):
+            name = os.path.basename(path)
+            if name.endswith('.info.json'):
+                entry = _from_info_json(path)
+                if entry:
+                    found.setdefault(entry[:2], entry)
+                continue
+            ext = name.rsplit('.', 1)[-1].lower()
+            if ext not in MEDIA_EXTS or _PARTIAL_RE.search(name):
+                continue
+            m = _ID_IN_NAME_RE.search(name)
+            if m:
+                wildcard = ANY_AUDIO if ext in AUDIO_EXTS else ANY_VIDEO
+                found.setdefault((m.group(1), wildcard), (m.group(1), wildcard, None, path))
+        with self._lock:
+            known = {tuple(r) for r in self._db.execute("SELECT video_id, format_id FROM downloads")}
+        added = 0
+        for key, (video_id, format_id, format_spec, path) in found.items():
+            if key not in known:
+                self.add(video_id, format_id, format_spec, path)
+                added += 1
+        return added
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, videos = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT video_id) FROM downloads").fetchone()
+        return {'entries': count, 'videos': videos}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _inside(path: str, root: str) -> bool:
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:  # different drives
+        return False
+
+
+def _walk(outdir: str, recursive: bool):
+    try:
+        entries = list(os.scandir(outdir))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from _walk(entry.path, recursive)
+        elif entry.is_file():
+            yield entry.path
+
+
+def _from_info_json(path: str):
+    """(video_id, format_id, None, media_path) from a yt-dlp .info.json, if its media file exists."""
+    try:
+        with open(path, encoding='utf-8') as fh:
+            info = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    media = info.get('filepath') or info.get('_filename')
+    if not info.get('id') or not info.get('format_id'):
+        return None
+    if media and not os.path.isabs(media):
+        media = os.path.join(os.path.dirname(path), media)
+    if not media or not os.path.exists(media):
+        return None
+    if media.rsplit('.', 1)[-1].lower() in AUDIO_EXTS:
+        # extracted audio: the codec it was converted to isn't in the info
+        return info['id'], ANY_AUDIO, None, media
+    return info['id'], info['format_id'], None, media
@@ -0,0 +1,114 @@
+"""
+format_cache.py
+On-disk cache of list_formats() payloads keyed by video ID.
+
+Entries expire after `ttl` seconds and the least-recently-used ones are
+evicted once the cache grows past `max_entries` or `max_bytes`. A single
+SQLite file holds everything, so it is safe to share between threads and
+between the GUI and the CLI.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from ytdl_core import app_data_dir
+
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class FormatCache:
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(app_data_dir('cache'), 'formats.sqlite')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                video_id   TEXT PRIMARY KEY,
+                payload    TEXT NOT NULL,
+                thumbnail  BLOB,
+                size       INTEGER NOT NULL,
+                created    REAL NOT NULL,
+                accessed   REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._db.commit()
+
+    def get(self, video_id: str) -> Optional[dict]:
+        """Return the cached payload for `video_id`, or None on a miss/expiry."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, thumbnail, created FROM entries WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM entries WHERE video_id = ?", (video_id,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET accessed = ? WHERE video_id = ?", (now, video_id))
+            self._db.commit()
+            self.hits += 1
+        payload = json.loads(row[0])
+        payload['thumbnail_bytes'] = row[1]
+        return payload
+
+    def put(self, video_id: str, payload: dict):
+        data = {k: v for k, v in payload.items() if k != 'thumbnail_bytes'}
+        text = json.dumps(data, ensure_ascii=False)
+        thumb = payload.get('thumbnail_bytes')
+        size = len(text) + (len(thumb) if thumb else 0)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (video_id, payload, thumbnail, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (video_id, text, thumb, size, now, now))
+            self._evict(now)
+            self._db.commit()
+
+    def invalidate(self, video_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE video_id = ?", (video_id,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': count, 'bytes': size}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self, now: float):
+        # expired first, then least recently used until both limits hold
+        self._db.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT video_id, size FROM entries ORDER BY accessed ASC").fetchall()
+        doomed = []
+        for video_id, entry_size in rows:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            doomed.append((video_id,))
+            count -= 1
+            size -= entry_size
+        self._db.executemany("DELETE FROM entries WHERE video_id = ?", doomed)
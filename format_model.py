@@ -0,0 +1,198 @@
+"""
+format_model.py
+Qt list model for format listings, backed by a compact column table.
+
+FormatTable keeps one array/list per field instead of one dict per format,
+so a few hundred rows (multi-video listings) stay small. FormatListModel
+exposes it to a QListView: display strings are built only for rows the view
+actually paints and cached per row, and sorting/filtering just reorders an
+array of row numbers instead of rebuilding widgets or dicts.
+"""
+
+from array import array
+from typing import Optional
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from format_ranking import codec_family
+from ytdl_core import format_entry_display
+
+KIND_AV, KIND_VIDEO, KIND_AUDIO = 0, 1, 2
+KIND_NAMES = {KIND_AV: "video+audio", KIND_VIDEO: "video-only", KIND_AUDIO: "audio-only"}
+
+SORT_KEYS = ('resolution', 'size', 'bitrate')
+
+
+def _kind(vcodec, acodec) -> int:
+    has_video = bool(vcodec) and vcodec != 'none'
+    has_audio = bool(acodec) and acodec != 'none'
+    if has_video and not has_audio:
+        return KIND_VIDEO
+    if has_audio and not has_video:
+        return KIND_AUDIO
+    return KIND_AV
+
+
+class FormatTable:
+    """Column-oriented store of format metadata; missing numbers are stored as 0."""
+    __slots__ = ('format_id', 'ext', 'vcodec', 'acodec', 'dynamic_range', 'height', 'fps', 'filesize', 'tbr', 'abr',
+                 'kind')
+
+    def __init__(self, formats=()):
+        self.format_id = []
+        self.ext = []
+        self.vcodec = []
+        self.acodec = []
+        self.dynamic_range = []
+        self.height = array('H')
+        self.fps = array('f')
+        self.filesize = array('q')
+        self.tbr = array('f')
+        self.abr = array('f')
+        self.kind = array('b')
+        self.extend(formats)
+
+    def __len__(self):
+        return len(self.format_id)
+
+    def extend(self, formats):
+        intern = {}  # share the many repeated ext/codec strings
+        for f in formats:
+            self.format_id.append(f.get('format_id'))
+            ext, vcodec, acodec = f.get('ext') or '', f.get('vcodec'), f.get('acodec')
+            self.ext.append(intern.setdefault(ext, ext))
+            self.vcodec.append(intern.setdefault(vcodec, vcodec))
+            self.acodec.append(intern.setdefault(acodec, acodec))
+            dynamic_range = f.get('dynamic_range')
+            self.dynamic_range.append(intern.setdefault(dynamic_range, dynamic_range))
+            self.height.append(min(int(f.get('height') or 0), 65535))
+            self.fps.append(float(f.get('fps') or 0))
+            self.filesize.append(int(f.get('filesize') or f.get('filesize_approx') or 0))
+            self.tbr.append(float(f.get('tbr') or 0))
+            self.abr.append(float(f.get('abr') or 0))
+            self.kind.append(_kind(vcodec, acodec))
+
+    def row(self, i: int) -> dict:
+        """The format as the dict shape list_formats() produces."""
+        fps = self.fps[i]
+        return {
+            'format_id': self.format_id[i],
+            'ext': self.ext[i],
+            'height': self.height[i] or None,
+            'fps': (int(fps) if fps.is_integer() else fps) if fps else None,
+            'vcodec': self.vcodec[i],
+            'acodec': self.acodec[i],
+            'dynamic_range': self.dynamic_range[i],
+            'filesize': self.filesize[i] or None,
+            'tbr': self.tbr[i] or None,
+            'abr': self.abr[i] or None,
+        }
+
+
+class FormatListModel(QAbstractListModel):
+    FormatRole = Qt.UserRole
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.table = FormatTable()
+        self._rows = array('i')  # visible table rows, in display order
+        self._display = {}       # table row -> cached display string
+        self._sort_key = 'resolution'
+        self._filter = {}
+
+    # --- Qt model interface ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            text = self._display.get(row)
+            if text is None:
+                text = self._display[row] = format_entry_display(self.table.row(row))
+            return text
+        if role == self.FormatRole:
+            return self.table.row(row)
+        return None
+
+    def sort(self, column=0, order=Qt.AscendingOrder):
+        """Qt's sort entry point; the column is ignored, see set_sort_key()."""
+        self.layoutAboutToBeChanged.emit()
+        self._rows = self._ordered(self._rows)
+        if order == Qt.DescendingOrder:
+            self._rows.reverse()
+        self.layoutChanged.emit()
+
+    # --- contents ---
+    def set_formats(self, formats):
+        self.beginResetModel()
+        self.table = FormatTable(formats)
+        self._display.clear()
+        self._rows = self._ordered(self._matching(range(len(self.table))))
+        self.endResetModel()
+
+    def clear(self):
+        self.set_formats(())
+
+    def format_at(self, row: int) -> Optional[dict]:
+        if 0 <= row < len(self._rows):
+            return self.table.row(self._rows[row])
+        return None
+
+    def total_count(self) -> int:
+        return len(self.table)
+
+    def values(self, column: str) -> list:
+        """Distinct values of 'ext' or codec families of 'vcodec'/'acodec', for filter choices."""
+        if column == 'ext':
+            return sorted(set(self.table.ext) - {''})
+        return sorted({codec_family(c) for c in getattr(self.table, column)} - {None})
+
+    # --- sort / filter ---
+    def set_sort_key(self, key: str):
+        """'resolution' (highest first, audio last), 'size' or 'bitrate' (largest first)."""
+        if key not in SORT_KEYS:
+            raise ValueError(f"unknown sort key {key!r}")
+        self._sort_key = key
+        self.sort()
+
+    def set_filter(self, kind: Optional[int] = None, ext: Optional[str] = None, codec: Optional[str] = None,
+                   min_height: int = 0, max_height: int = 0):
+        """Show only formats matching every given criterion; codec is a codec_family() name."""
+        self._filter = {'kind': kind, 'ext': ext, 'codec': codec, 'min_height': min_height, 'max_height': max_height}
+        self.beginResetModel()
+        self._rows = self._ordered(self._matching(range(len(self.table))))
+        self.endResetModel()
+
+    def _matching(self, rows):
+        f = self._filter
+        if not any(f.values()):
+            return array('i', rows)
+        t = self.table
+        kind, ext, codec = f.get('kind'), f.get('ext'), f.get('codec')
+        min_h, max_h = f.get('min_height') or 0, f.get('max_height') or 0
+        out = array('i')
+        for r in rows:
+            if kind is not None and t.kind[r] != kind:
+                continue
+            if ext and t.ext[r] != ext:
+                continue
+            if codec and codec not in (codec_family(t.vcodec[r]), codec_family(t.acodec[r])):
+                continue
+            h = t.height[r]
+            if (min_h and h < min_h) or (max_h and h > max_h):
+                continue
+            out.append(r)
+        return out
+
+    def _ordered(self, rows):
+        t = self.table
+        if self._sort_key == 'size':
+            key = lambda r: -t.filesize[r]  # noqa: E731
+        elif self._sort_key == 'bitrate':
+            key = lambda r: -(t.tbr[r] or t.abr[r])  # noqa: E731
+        else:
+            key = lambda r: (-t.height[r], t.kind[r] == KIND_AUDIO)  # noqa: E731
+        return array('i', sorted(rows, key=key))
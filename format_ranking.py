@@ -0,0 +1,241 @@
+"""
+format_ranking.py
+Offline, deterministic choice of the best video+audio pair from a format list.
+
+Works on the simplified dicts list_formats() returns as well as on yt-dlp's
+own format dicts, so the same RankingRules pick the formats whether the user
+listed them first (the GUI's buttons) or not (playlist entries, the CLI):
+an "auto[...]" format spec is turned into a yt-dlp format selector that runs
+select_formats() on the real list at download time.
+
+Ranking, best first:
+
+  video  usable (within max height/fps; HDR only if allowed), height, fps,
+         HDR (if preferred), codec preference, bitrate;
+  audio  codec preference, not a "-drc" variant, bitrate.
+
+Ties are broken by format ID, so the same list always gives the same pair.
+With a size budget, the best pair whose (estimated) size fits is taken.
+"""
+
+from typing import Optional
+
+from bandwidth import parse_rate
+
+DEFAULT_VIDEO_CODECS = ('av1', 'vp9', 'h264')
+DEFAULT_AUDIO_CODECS = ('opus', 'aac')
+HDR_MODES = ('avoid', 'allow', 'prefer')
+AUTO_SPEC = 'auto'
+
+_CODEC_FAMILIES = (
+    ('avc', 'h264'), ('h264', 'h264'), ('vp09', 'vp9'), ('vp9', 'vp9'), ('vp8', 'vp8'),
+    ('av01', 'av1'), ('hev', 'h265'), ('hvc', 'h265'), ('mp4a', 'aac'), ('aac', 'aac'),
+    ('opus', 'opus'), ('vorbis', 'vorbis'), ('mp3', 'mp3'), ('ac-3', 'ac3'), ('ec-3', 'eac3'),
+)
+
+
+def codec_family(codec: Optional[str]) -> Optional[str]:
+    """'avc1.640028' -> 'h264', 'vp09.00.51.08' -> 'vp9', 'none'/None -> None."""
+    if not codec or codec == 'none':
+        return None
+    codec = codec.lower()
+    for prefix, family in _CODEC_FAMILIES:
+        if codec.startswith(prefix):
+            return family
+    return codec.split('.', 1)[0]
+
+
+def is_hdr(fmt: dict) -> bool:
+    return (fmt.get('dynamic_range') or 'SDR').upper() != 'SDR'
+
+
+class RankingRules:
+    """What "best" means: codec preference, limits, HDR handling and a size budget (0 = none)."""
+
+    def __init__(self, codecs=DEFAULT_VIDEO_CODECS, audio_codecs=DEFAULT_AUDIO_CODECS, max_height: int = 0,
+                 max_fps: float = 0, hdr: str = 'avoid', size_budget: int = 0):
+        if hdr not in HDR_MODES:
+            raise ValueError(f"hdr must be one of {', '.join(HDR_MODES)}")
+        self.codecs = tuple(codecs)
+        self.audio_codecs = tuple(audio_codecs)
+        self.max_height = int(max_height or 0)
+        self.max_fps = float(max_fps or 0)
+        self.hdr = hdr
+        self.size_budget = int(size_budget or 0)
+
+    def replace(self, **changes) -> 'RankingRules':
+        """A copy with some rules changed, e.g. rules.replace(max_height=0)."""
+        kwargs = {'codecs': self.codecs, 'audio_codecs': self.audio_codecs, 'max_height': self.max_height,
+                  'max_fps': self.max_fps, 'hdr': self.hdr, 'size_budget': self.size_budget}
+        kwargs.update(changes)
+        return RankingRules(**kwargs)
+
+    def to_spec(self) -> str:
+        """The "auto[...]" format spec for these rules (defaults left out)."""
+        parts = []
+        if self.codecs != DEFAULT_VIDEO_CODECS:
+            parts.append('codecs=' + '/'.join(self.codecs))
+        if self.audio_codecs != DEFAULT_AUDIO_CODECS:
+            parts.append('audio=' + '/'.join(self.audio_codecs))
+        if self.max_height:
+            parts.append(f'height={self.max_height}')
+        if self.max_fps:
+            parts.append(f'fps={self.max_fps:g}')
+        if self.hdr != 'avoid':
+            parts.append(f'hdr={self.hdr}')
+        if self.size_budget:
+            parts.append(f'size={self.size_budget}')
+        return AUTO_SPEC + (f"[{','.join(parts)}]" if parts else '')
+
+    @classmethod
+    def from_spec(cls, spec: str) -> Optional['RankingRules']:
+        """Rules from 'auto' / 'auto[height=2160,codecs=vp9/h264,hdr=allow,size=4G]'; None for other specs."""
+        spec = (spec or '').strip()
+        if spec != AUTO_SPEC and not (spec.startswith(AUTO_SPEC + '[') and spec.endswith(']')):
+            return None
+        kwargs = {}
+        for part in filter(None, spec[len(AUTO_SPEC) + 1:-1].split(',')):
+            key, _, value = part.partition('=')
+            key, value = key.strip(), value.strip()
+            if key == 'codecs':
+                kwargs['codecs'] = tuple(filter(None, value.lower().split('/')))
+            elif key == 'audio':
+                kwargs['audio_codecs'] = tuple(filter(None, value.lower().split('/')))
+            elif key == 'height':
+                kwargs['max_height'] = int(value)
+            elif key == 'fps':
+                kwargs['max_fps'] = float(value)
+            elif key == 'hdr':
+                kwargs['hdr'] = value
+            elif key == 'size':
+                kwargs['size_budget'] = int(parse_rate(value))  # same K/M/G units
+            else:
+                raise ValueError(f"unknown key {key!r} in format spec {spec!r}")
+        return cls(**kwargs)
+
+    def __repr__(self):
+        return f"RankingRules({self.to_spec()!r})"
+
+
+class FormatChoice:
+    """The selected video (possibly with audio) and audio format, and the yt-dlp spec for them."""
+    __slots__ = ('video', 'audio', 'size')
+
+    def __init__(self, video: dict, audio: Optional[dict], size: Optional[int]):
+        self.video = video
+        self.audio = audio
+        self.size = size
+
+    @property
+    def spec(self) -> str:
+        if self.audio is None:
+            return str(self.video.get('format_id'))
+        return f"{self.video.get('format_id')}+{self.audio.get('format_id')}"
+
+    def describe(self) -> str:
+        """'2160p60 vp9 HDR10 + opus 160k'."""
+        v = self.video
+        text = f"{v.get('height') or '?'}p"
+        if v.get('fps'):
+            text += f"{v['fps']:g}"
+        text += f" {codec_family(v.get('vcodec')) or '?'}"
+        if is_hdr(v):
+            text += f" {v.get('dynamic_range')}"
+        if self.audio is not None:
+            a = self.audio
+            text += f" + {codec_family(a.get('acodec')) or '?'}"
+            if a.get('abr'):
+                text += f" {int(a['abr'])}k"
+        return text
+
+    def __repr__(self):
+        return f"FormatChoice({self.spec!r})"
+
+
+def _has(codec) -> bool:
+    return bool(codec) and codec != 'none'
+
+
+def _rank(codec, preference) -> int:
+    family = codec_family(codec)
+    return preference.index(family) if family in preference else len(preference)
+
+
+def _video_key(fmt: dict, rules: RankingRules):
+    height = fmt.get('height') or 0
+    fps = fmt.get('fps') or 0
+    hdr = is_hdr(fmt)
+    usable = ((not rules.max_height or height <= rules.max_height)
+              and (not rules.max_fps or fps <= rules.max_fps)
+              and not (hdr and rules.hdr == 'avoid'))
+    return (usable, height, fps, hdr and rules.hdr == 'prefer',
+            -_rank(fmt.get('vcodec'), rules.codecs), fmt.get('tbr') or 0, str(fmt.get('format_id')))
+
+
+def _audio_key(fmt: dict, rules: RankingRules):
+    drc = str(fmt.get('format_id') or '').endswith('-drc')
+    return (-_rank(fmt.get('acodec'), rules.audio_codecs), not drc, fmt.get('abr') or fmt.get('tbr') or 0,
+            str(fmt.get('format_id')))
+
+
+def rank_video(formats, rules: Optional[RankingRules] = None) -> list:
+    """Formats with video, best first."""
+    rules = rules or RankingRules()
+    return sorted((f for f in formats if _has(f.get('vcodec'))), key=lambda f: _video_key(f, rules), reverse=True)
+
+
+def rank_audio(formats, rules: Optional[RankingRules] = None) -> list:
+    """Audio-only formats, best first."""
+    rules = rules or RankingRules()
+    return sorted((f for f in formats if _has(f.get('acodec')) and not _has(f.get('vcodec'))),
+                  key=lambda f: _audio_key(f, rules), reverse=True)
+
+
+def estimated_size(fmt: Optional[dict], duration: Optional[float] = None) -> Optional[int]:
+    if fmt is None:
+        return 0
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and fmt.get('tbr') and duration:
+        size = int(fmt['tbr'] * 125 * duration)  # kbit/s -> bytes
+    return size or None
+
+
+def select_formats(formats, rules: Optional[RankingRules] = None,
+                   duration: Optional[float] = None) -> Optional[FormatChoice]:
+    """The best video+audio pair (or a single progressive format) under `rules`; None if nothing has video."""
+    rules = rules or RankingRules()
+    formats = list(formats)
+    videos = rank_video(formats, rules)
+    if not videos:
+        return None
+    audios = rank_audio(formats, rules)
+    best_audio = audios[0] if audios else None
+    choices = []
+    for video in videos:
+        audio = None if _has(video.get('acodec')) else best_audio
+        v_size, a_size = estimated_size(video, duration), estimated_size(audio, duration)
+        size = v_size + a_size if v_size is not None and a_size is not None else None
+        choice = FormatChoice(video, audio, size)
+        if not rules.size_budget or (size is not None and size <= rules.size_budget):
+            return choice
+        choices.append(choice)
+    # nothing fits the budget: the smallest pair with a known size, else the best one
+    sized = [c for c in choices if c.size is not None]
+    return min(sized, key=lambda c: (c.size, c.spec)) if sized else choices[0]
+
+
+def fallback_format(formats, failed: dict, rules: Optional[RankingRules] = None, exclude=()) -> Optional[dict]:
+    """The next format below `failed` in the ranking, of the same kind (video-only, audio-only or
+    progressive), skipping format IDs in `exclude`; None if there is none."""
+    rules = rules or RankingRules()
+    if _has(failed.get('vcodec')):
+        ranked, key = rank_video(formats, rules), _video_key
+    else:
+        ranked, key = rank_audio(formats, rules), _audio_key
+    limit = key(failed, rules)
+    skip = set(exclude) | {failed.get('format_id')}
+    for fmt in ranked:
+        if (fmt.get('format_id') not in skip and _has(fmt.get('acodec')) == _has(failed.get('acodec'))
+                and key(fmt, rules) < limit):
+            return fmt
+    return None
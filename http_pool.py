@@ -0,0 +1,127 @@
+"""
+http_pool.py
+Small keep-alive HTTP(S) connection pool built on http.client.
+
+urllib.request opens a fresh TCP+TLS connection for every request; for
+lots of small fetches (thumbnails, manifests) the handshake dominates.
+HTTPPool keeps idle connections per host and hands them back out.
+"""
+
+import http.client
+import threading
+import urllib.parse
+from typing import Optional
+
+USER_AGENT = "Mozilla/5.0 (yt-8k-downloader)"
+
+_REDIRECTS = (301, 302, 303, 307, 308)
+
+
+class HTTPStatusError(OSError):
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+
+class HTTPPool:
+    def __init__(self, max_idle_per_host: int = 4, timeout: float = 10):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self.connections_opened = 0
+        self.requests = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _key(self, url: str):
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme: {scheme!r}")
+        port = parts.port or (443 if scheme == 'https' else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        return (scheme, parts.hostname, port), path
+
+    def _acquire(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key, timeout), False
+
+    def _connect(self, key, timeout):
+        with self._lock:
+            self.connections_opened += 1
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(host, port, timeout=timeout)
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, url: str, headers: Optional[dict] = None,
+                timeout: Optional[float] = None, max_redirects: int = 3):
+        """Send a request and read the whole body. Returns (status, headers, body)."""
+        timeout = timeout or self.timeout
+        hdrs = {'User-Agent': USER_AGENT}
+        hdrs.update(headers or {})
+        for _ in range(max_redirects + 1):
+            key, path = self._key(url)
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.timeout = timeout
+                conn.request(method, path, headers=hdrs)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.BadStatusLine):
+                conn.close()
+                if not reused:
+                    raise
+                # the server dropped an idle keep-alive connection; retry once on a fresh one
+                conn = self._connect(key, timeout)
+                try:
+                    conn.request(method, path, headers=hdrs)
+                    resp = conn.getresponse()
+                    body = resp.read()
+                except Exception:
+                    conn.close()
+                    raise
+            except Exception:
+                conn.close()
+                raise
+            with self._lock:
+                self.requests += 1
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            if resp.status in _REDIRECTS and resp.getheader('Location'):
+                url = urllib.parse.urljoin(url, resp.getheader('Location'))
+                continue
+            return resp.status, resp.headers, body
+        raise HTTPStatusError(resp.status, url)
+
+    def get(self, url: str, timeout: Optional[float] = None, headers: Optional[dict] = None) -> bytes:
+        """GET `url` and return the body; raises HTTPStatusError unless the status is 200."""
+        status, _, body = self.request('GET', url, headers=headers, timeout=timeout)
+        if status != 200:
+            raise HTTPStatusError(status, url)
+        return body
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+# shared by everything that fetches small resources
+default_pool = HTTPPool()
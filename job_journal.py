@@ -0,0 +1,120 @@
+"""
+job_journal.py
+Crash-safe on-disk record of queued downloads.
+
+Every job is written to a small SQLite database (WAL mode) when it is
+queued, its bytes/phase are updated while it runs (at most once a second
+per job, plus every phase change), and it is marked done/failed/cancelled
+when it ends. Anything not in a terminal state on startup was interrupted
+by a close or crash and can be queued again; yt-dlp then continues from
+the .part files left on disk.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from ytdl_core import app_data_dir
+
+ACTIVE_PHASES = ('queued', 'downloading', 'merging', 'postprocessing')
+FINAL_STATES = ('done', 'failed', 'cancelled')
+
+WRITE_INTERVAL = 1.0
+
+
+class JobJournal:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(app_data_dir('data'), 'jobs.sqlite')
+        self._lock = threading.Lock()
+        self._last_write = {}
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                url          TEXT NOT NULL,
+                format_spec  TEXT NOT NULL,
+                outdir       TEXT NOT NULL,
+                out_template TEXT NOT NULL,
+                extra_opts   TEXT NOT NULL,
+                options      TEXT NOT NULL DEFAULT '{}',
+                title        TEXT,
+                phase        TEXT NOT NULL,
+                bytes_done   INTEGER NOT NULL DEFAULT 0,
+                bytes_total  INTEGER,
+                message      TEXT,
+                created      REAL NOT NULL,
+                updated      REAL NOT NULL
+            )""")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if 'options' not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN options TEXT NOT NULL DEFAULT '{}'")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_phase ON jobs (phase)")
+        self._db.commit()
+
+    def add(self, url, format_spec, outdir, out_template, extra_opts=None, title=None, options=None) -> int:
+        """Record a new job. `options` holds our own pipeline settings (segments, ...)."""
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO jobs (url, format_spec, outdir, out_template, extra_opts, options, title, phase,"
+                " created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (url, format_spec, outdir, out_template, json.dumps(extra_opts or {}), json.dumps(options or {}),
+                 title, now, now))
+            self._db.commit()
+            return cur.lastrowid
+
+    def update(self, job_id: int, phase: str, bytes_done: Optional[int] = None, bytes_total: Optional[int] = None):
+        """Record progress; byte-only updates are dropped if the last write was under a second ago."""
+        now = time.time()
+        with self._lock:
+            last_time, last_phase = self._last_write.get(job_id, (0.0, None))
+            if phase == last_phase and now - last_time < WRITE_INTERVAL:
+                return
+            self._last_write[job_id] = (now, phase)
+            self._db.execute(
+                "UPDATE jobs SET phase = ?, bytes_done = COALESCE(?, bytes_done),"
+                " bytes_total = COALESCE(?, bytes_total), updated = ? WHERE id = ?",
+                (phase, bytes_done, bytes_total, now, job_id))
+            self._db.commit()
+
+    def finish(self, job_id: int, state: str, message: str = ""):
+        with self._lock:
+            self._last_write.pop(job_id, None)
+            self._db.execute("UPDATE jobs SET phase = ?, message = ?, updated = ? WHERE id = ?",
+                             (state, message, time.time(), job_id))
+            self._db.commit()
+
+    def unfinished(self) -> list:
+        """Jobs left in an active phase, oldest first."""
+        marks = ",".join("?" for _ in ACTIVE_PHASES)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, url, format_spec, outdir, out_template, extra_opts, title, phase, bytes_done, bytes_total,"
+                " options"
+                f" FROM jobs WHERE phase IN ({marks}) ORDER BY id", ACTIVE_PHASES).fetchall()
+        jobs = []
+        for row in rows:
+            jobs.append({
+                'id': row[0], 'url': row[1], 'format_spec': row[2], 'outdir': row[3],
+                'out_template': row[4], 'extra_opts': json.loads(row[5] or '{}'), 'title': row[6],
+                'phase': row[7], 'bytes_done': row[8], 'bytes_total': row[9],
+                'options': json.loads(row[10] or '{}'),
+            })
+        return jobs
+
+    def prune(self, older_than: float = 30 * 86400):
+        """Forget finished jobs older than `older_than` seconds."""
+        marks = ",".join("?" for _ in FINAL_STATES)
+        with self._lock:
+            self._db.execute(f"DELETE FROM jobs WHERE phase IN ({marks}) AND updated < ?",
+                             FINAL_STATES + (time.time() - older_than,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
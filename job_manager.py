@@ -0,0 +1,487 @@
+"""
+job_manager.py
+Qt-free download queue, shared by the GUI and the control API. Does not import PyQt5.
+
+JobManager runs queued DownloadJobs on worker threads, at most
+`max_concurrent` downloads at a time. With a PostProcessPool, a job's
+merge / audio conversion runs in the pool after its download finishes,
+and its download slot goes to the next job. Jobs are journaled (and
+resumed next start), throttled by a BandwidthScheduler, recorded in the
+download archive and traced in the metrics, each if given.
+
+With a DiskBudget, a job starts only once its peak disk use (the
+'peak_bytes' option, estimated from the listing, or else worked out by
+download() from the chosen formats) fits in the free space the other jobs
+haven't claimed; until then it waits in the queue, and jobs behind it that
+do fit go first. A job stopped by a full disk goes back to waiting too.
+
+Listeners registered with listen() are called as fn(event, job, *args)
+on whichever thread the change happened:
+
+    'added'     job                     queued
+    'started'   job                     its download started
+    'progress'  job, ProgressStats      coalesced by ytdl_core.download
+    'status'    job, text
+    'finished'  job, success, message   done, failed or cancelled
+
+They must return quickly and never wait for another thread; the GUI
+re-emits them as Qt signals, which carries them over to its own thread.
+"""
+
+import threading
+import time
+from contextlib import nullcontext
+from functools import partial
+from typing import Optional
+
+from ytdl_core import DEFAULT_TEMPLATE, download, format_timings
+from progress import ProgressStats
+from bandwidth import BandwidthScheduler, PRIORITY_NORMAL
+from disk_space import DiskBudget, NoSpace, is_disk_full
+from download_archive import DownloadArchive
+from job_journal import JobJournal
+from metrics import MetricsRecorder, describe_error
+from postprocess import PostProcessPool
+
+STATES = ('queued', 'running', 'processing', 'done', 'failed', 'cancelled')
+
+
+class DownloadJob:
+    """One queued download: its parameters, state and progress."""
+    _next_id = 1
+    _ids = threading.Lock()
+
+    def __init__(self, url, format_spec, outdir, out_template=DEFAULT_TEMPLATE, extra_opts=None, title=None,
+                 options=None):
+        with DownloadJob._ids:
+            self.job_id = DownloadJob._next_id
+            DownloadJob._next_id += 1
+        self.url = url.strip()
+        self.format_spec = format_spec
+        self.outdir = outdir
+        self.out_template = out_template
+        self.extra_opts = extra_opts or {}
+        # ytdl_core.download keyword options (segments, chunk_size, stream_merge, catalog) plus the
+        # queue's own options (priority, rate_limit, no_archive, peak_bytes); all journaled
+        self.options = options or {}
+        self.title = title or self.url
+        self.state = 'queued'  # one of STATES
+        self.stats: Optional[ProgressStats] = None
+        self.status = ""   # the last status line
+        self.message = ""  # how it finished
+        self.result = None  # ytdl_core.DownloadResult once the download succeeded
+        self.error: Optional[Exception] = None
+        self.trace = None  # metrics.JobTrace; finished after any post-processing
+        self.archive = None
+        self.throttle = None
+        self.post_future = None
+        self.thread: Optional[threading.Thread] = None
+        self.timings = {}
+        self.journal_id: Optional[int] = None
+        self.resumed = False
+        self.waiting_for_space = False
+        self.queued_at = time.time()
+        self._cancel = threading.Event()
+
+    @property
+    def speed(self) -> float:
+        return self.stats.speed if self.stats is not None else 0.0
+
+    @property
+    def is_active(self):
+        return self.state in ('queued', 'running', 'processing')
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def to_dict(self) -> dict:
+        """JSON-ready summary, for the control API."""
+        stats = self.stats
+        record = {'id': self.job_id, 'url': self.url, 'title': self.title, 'format': self.format_spec,
+                  'outdir': self.outdir, 'state': self.state, 'status': self.status, 'message': self.message,
+                  'waiting_for_space': self.waiting_for_space, 'resumed': self.resumed,
+                  'queued_at': round(self.queued_at, 3)}
+        if stats is not None:
+            record.update(stats.as_dict())
+        if self.state == 'done':
+            record['percent'] = 100
+        if self.result is not None:
+            record['path'] = self.result.path
+        if self.error is not None and self.state == 'failed':
+            record['error'] = describe_error(self.error)
+        if self.timings:
+            record['timings'] = {stage: round(seconds, 3) for stage, seconds in self.timings.items()}
+        return record
+
+
+class JobManager:
+    QUEUE_OPTIONS = ('priority', 'rate_limit', 'no_archive', 'peak_bytes')
+    DISK_RECHECK = 15.0  # seconds; free space can also grow outside the app
+
+    def __init__(self, max_concurrent=3, journal: Optional[JobJournal] = None,
+                 bandwidth: Optional[BandwidthScheduler] = None, post_pool: Optional[PostProcessPool] = None,
+                 archive: Optional[DownloadArchive] = None, metrics: Optional[MetricsRecorder] = None,
+                 disk: Optional[DiskBudget] = None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.journal = journal
+        self.bandwidth = bandwidth
+        self.post_pool = post_pool
+        self.archive = archive
+        self.metrics = metrics
+        self.disk = disk
+        self.jobs = []
+        self._by_id = {}
+        self._pending = []
+        self._running = []
+        self._processing = []
+        self._shutting_down = False
+        self._listeners = []
+        self._disk_timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()  # listeners run under it: a job's events arrive in order
+
+    def listen(self, fn):
+        self._listeners.append(fn)
+
+    def _emit(self, event: str, job: DownloadJob, *args):
+        if event == 'status':
+            job.status = args[0]
+        for fn in list(self._listeners):
+            try:
+                fn(event, job, *args)
+            except Exception:
+                pass  # a broken listener must not take the queue down with it
+
+    def set_max_concurrent(self, n: int):
+        with self._lock:
+            self.max_concurrent = max(1, int(n))
+            self._pump()
+
+    def enqueue(self, job: DownloadJob) -> DownloadJob:
+        if self.journal is not None and job.journal_id is None:
+            job.journal_id = self._journal_call(self.journal.add, job.url, job.format_spec, job.outdir,
+                                                job.out_template, job.extra_opts, job.title, job.options)
+        with self._lock:
+            self.jobs.append(job)
+            self._by_id[job.job_id] = job
+            self._pending.append(job)
+            self._emit('added', job)
+            self._pump()
+        return job
+
+    def get(self, job_id: int) -> Optional[DownloadJob]:
+        return self._by_id.get(job_id)
+
+    def cancel(self, job: DownloadJob):
+        with self._lock:
+            if job.state == 'queued' and job in self._pending:
+                self._pending.remove(job)
+                self._release_disk(job)
+                job.state = 'cancelled'
+                job.message = "Download cancelled."
+                self._journal_finish(job, job.message)
+                self._emit('finished', job, False, job.message)
+            elif job.state == 'running':
+                job._cancel.set()
+                self._emit('status', job, "Cancelling…")
+            elif job.state == 'processing' and job.post_future is not None:
+                # only a task still waiting for a pool process can be withdrawn
+                if not job.post_future.cancel():
+                    self._emit('status', job, "Already post-processing; can't cancel.")
+
+    def cancel_all(self):
+        with self._lock:
+            for job in list(self._pending) + list(self._running) + list(self._processing):
+                self.cancel(job)
+
+    def resume_unfinished(self) -> int:
+        """Queue again every job the journal says was interrupted last session."""
+        if self.journal is None:
+            return 0
+        entries = self._journal_call(self.journal.unfinished) or []
+        for entry in entries:
+            job = DownloadJob(entry['url'], entry['format_spec'], entry['outdir'], entry['out_template'],
+                              entry['extra_opts'], title=entry['title'], options=entry['options'])
+            job.journal_id = entry['id']
+            job.resumed = True
+            self.enqueue(job)
+        return len(entries)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop running jobs for an app exit, leaving them unfinished in the journal."""
+        with self._lock:
+            self._shutting_down = True
+            self._pending.clear()
+            if self._disk_timer is not None:
+                self._disk_timer.cancel()
+            for job in self._running:
+                job._cancel.set()
+            for job in self._processing:
+                job.post_future.cancel()
+        self.wait_all(timeout)
+        if self.post_pool is not None:
+            # let merges already running finish; cancelled ones rerun from the journal next start
+            self.post_pool.shutdown()
+
+    def clear_finished(self):
+        with self._lock:
+            finished = [j for j in self.jobs if not j.is_active]
+            self.jobs = [j for j in self.jobs if j.is_active]
+            for job in finished:
+                self._by_id.pop(job.job_id, None)
+        return finished
+
+    def running_count(self):
+        return len(self._running)
+
+    def processing_count(self):
+        return len(self._processing)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def waiting_for_space_count(self):
+        return sum(1 for j in list(self._pending) if j.waiting_for_space)
+
+    def counts(self) -> dict:
+        """Jobs per state (of those not cleared yet)."""
+        counts = dict.fromkeys(STATES, 0)
+        for job in list(self.jobs):
+            counts[job.state] += 1
+        return counts
+
+    def total_speed(self):
+        return sum(j.speed for j in list(self._running))
+
+    def disk_shortfall(self, outdir: str) -> int:
+        """Bytes missing in outdir's file system for the queued jobs with a known peak (0: they all fit)."""
+        if self.disk is None:
+            return 0
+        try:
+            available = self.disk.available(outdir)
+        except OSError:
+            return 0
+        volume = DiskBudget.volume_of(outdir)
+        needed = sum(j.options.get('peak_bytes') or 0 for j in list(self._pending)
+                     if DiskBudget.volume_of(j.outdir) == volume)
+        return max(0, needed - available)
+
+    def wait_all(self, timeout: float = 5.0):
+        for job in list(self._running):
+            if job.thread is not None:
+                job.thread.join(timeout)
+
+    def _pump(self):
+        with self._lock:
+            if self._shutting_down:
+                return
+            for job in list(self._pending):
+                if len(self._running) >= self.max_concurrent:
+                    break
+                if self._reserve_disk(job):
+                    self._pending.remove(job)
+                    self._start(job)
+            if self.disk is not None:
+                waiting = any(j.waiting_for_space for j in self._pending)
+                if waiting and self._disk_timer is None:
+                    self._disk_timer = threading.Timer(self.DISK_RECHECK, self._recheck_disk)
+                    self._disk_timer.daemon = True
+                    self._disk_timer.start()
+                elif not waiting and self._disk_timer is not None:
+                    self._disk_timer.cancel()
+                    self._disk_timer = None
+
+    def _recheck_disk(self):
+        with self._lock:
+            self._disk_timer = None
+            self._pump()
+
+    def _reserve_disk(self, job: DownloadJob) -> bool:
+        """Reserve the job's known peak; False (and a status, once) while it doesn't fit.
+        A job without an estimate is admitted by download() once its formats are known."""
+        peak = job.options.get('peak_bytes')
+        if self.disk is None or not peak:
+            return True
+        try:
+            self.disk.admit(job.job_id, job.outdir, peak)
+        except NoSpace as e:
+            if not job.waiting_for_space:
+                job.waiting_for_space = True
+                self._emit('status', job, f"Waiting for disk space. {e}")
+            return False
+        except OSError:
+            return True  # outdir not there yet: download() reports that
+        job.waiting_for_space = False
+        return True
+
+    def _release_disk(self, job: DownloadJob):
+        if self.disk is not None:
+            self.disk.release(job.job_id)
+
+    def _start(self, job: DownloadJob):
+        options = {k: v for k, v in job.options.items() if k not in self.QUEUE_OPTIONS}
+        job._cancel = threading.Event()
+        job.result = job.error = job.trace = None
+        job.archive = None if job.options.get('no_archive') else self.archive
+        if self.bandwidth is not None:
+            job.throttle = self.bandwidth.register(job.options.get('priority', PRIORITY_NORMAL),
+                                                   job.options.get('rate_limit', 0),
+                                                   is_cancelled=job.is_cancelled)
+        job.state = 'running'
+        self._running.append(job)
+        job.thread = threading.Thread(target=self._run, args=(job, options), daemon=True,
+                                      name=f"download-{job.job_id}")
+        self._emit('started', job)
+        job.thread.start()
+
+    def _run(self, job: DownloadJob, options: dict):
+        if self.metrics is not None:
+            job.trace = self.metrics.start('download', job.url)
+        try:
+            with self.metrics.profile('download') if self.metrics else nullcontext():
+                job.result = download(job.url, job.format_spec, job.outdir, job.out_template, job.extra_opts,
+                                      on_progress=partial(self._on_progress, job),
+                                      on_status=partial(self._on_status, job),
+                                      is_cancelled=job.is_cancelled,
+                                      throttle=job.throttle,
+                                      defer_postprocess=self.post_pool is not None,
+                                      archive=job.archive,
+                                      trace=job.trace,
+                                      admit=partial(self.disk.admit, job.job_id, job.outdir) if self.disk else None,
+                                      **options)
+            success = True
+            message = "Already downloaded (in the download archive)." if job.result.skipped else "Download completed."
+        except Exception as e:
+            job.error = e
+            success = False
+            message = "Download cancelled." if job.is_cancelled() else str(e)
+        self._on_download_finished(job, success, message)
+
+    def _on_download_finished(self, job: DownloadJob, success: bool, message: str):
+        with self._lock:
+            if job in self._running:
+                self._running.remove(job)
+            if job.throttle is not None:
+                job.throttle.close()
+                job.throttle = None
+            if self._shutting_down:
+                return
+            result = job.result
+            if result is not None:
+                job.timings.update(result.timings)
+            if success and result is not None and result.postprocess is not None:
+                self._start_postprocess(job, result.postprocess)  # keeps its reservation for the merge
+            elif success or not self._defer_for_space(job):
+                self._release_disk(job)
+                if success:
+                    job.state = 'done'
+                    if job.timings:
+                        message += f" ({format_timings(job.timings)})"
+                elif job.is_cancelled():
+                    job.state = 'cancelled'
+                else:
+                    job.state = 'failed'
+                self._finish_trace(job, 'skipped' if success and result.skipped else
+                                   'ok' if success else job.state)
+                self._journal_finish(job, message)
+                job.message = message
+                self._emit('finished', job, success, message)
+            self._pump()
+
+    def _defer_for_space(self, job: DownloadJob) -> bool:
+        """Put a job that ran out of disk space back in the queue, to wait until its peak fits."""
+        error = job.error
+        if self.disk is None or job.is_cancelled() or error is None or not is_disk_full(error):
+            return False
+        if isinstance(error, NoSpace):
+            job.options['peak_bytes'] = error.needed
+        else:
+            # a full disk mid-download: it needs more than was free, whatever its estimate said
+            try:
+                job.options['peak_bytes'] = max(job.options.get('peak_bytes') or 0, self.disk.available(job.outdir) + 1)
+            except OSError:
+                return False
+        self._release_disk(job)
+        self._finish_trace(job, 'deferred')
+        job.state = 'queued'
+        job.waiting_for_space = True
+        self._pending.insert(0, job)
+        self._emit('status', job, f"Waiting for disk space. {error}")
+        return True
+
+    def _start_postprocess(self, job: DownloadJob, task):
+        job.state = 'processing'
+        self._processing.append(job)
+        self._emit('status', job, task.label)
+        if self.journal is not None and job.journal_id is not None:
+            self._journal_call(self.journal.update, job.journal_id, task.phase)
+        submitted = time.perf_counter()
+        job.post_future = self.post_pool.submit(task)
+        job.post_future.add_done_callback(
+            lambda f, j=job: self._on_post_done(j, f, time.perf_counter() - submitted))
+
+    def _on_post_done(self, job: DownloadJob, future, elapsed: float):
+        with self._lock:
+            if job in self._processing:
+                self._processing.remove(job)
+            if self._shutting_down:
+                return
+            self._release_disk(job)
+            if self._pending:
+                self._pump()  # the merge's space may be what a waiting job needed
+            success = False
+            error = None
+            if future.cancelled():
+                job.state = 'cancelled'
+                message = "Download cancelled."
+            else:
+                try:
+                    stage_times = future.result()
+                    success = True
+                except Exception as e:
+                    job.state = 'failed'
+                    message = f"Post-processing failed: {e}"
+                    error = job.error = e
+            if success:
+                job.state = 'done'
+                # time spent queued for a pool process, besides the run itself
+                waited = elapsed - sum(stage_times.values())
+                if waited > 0.05:
+                    stage_times = dict(stage_times, **{'postprocess wait': waited})
+                job.timings.update(stage_times)
+                if job.trace is not None:
+                    job.trace.add_timings(stage_times)
+                message = f"Download completed. ({format_timings(job.timings)})"
+                if job.archive is not None:
+                    self._journal_call(job.archive.record, job.result)
+            self._finish_trace(job, 'ok' if success else job.state, error)
+            self._journal_finish(job, message)
+            job.message = message
+            self._emit('finished', job, success, message)
+
+    # journal/archive failures (disk full, locked file) are not worth failing a download over
+    def _journal_call(self, fn, *args):
+        try:
+            return fn(*args)
+        except Exception:
+            return None
+
+    def _on_progress(self, job: DownloadJob, stats: ProgressStats):
+        job.stats = stats
+        if self.disk is not None and stats.phase == 'downloading':
+            self.disk.update(job.job_id, stats.downloaded)
+        if self.journal is not None and job.journal_id is not None and stats.phase in ('downloading', 'merging', 'postprocessing'):
+            self._journal_call(self.journal.update, job.journal_id, stats.phase, stats.downloaded, stats.total)
+        with self._lock:
+            self._emit('progress', job, stats)
+
+    def _on_status(self, job: DownloadJob, text: str):
+        with self._lock:
+            self._emit('status', job, text)
+
+    def _finish_trace(self, job: DownloadJob, outcome: str, error: Optional[Exception] = None):
+        if self.metrics is not None and job.trace is not None:
+            self._journal_call(self.metrics.finish, job.trace, outcome, error or job.error)
+
+    def _journal_finish(self, job: DownloadJob, message: str):
+        if self.journal is not None and job.journal_id is not None:
+            self._journal_call(self.journal.finish, job.journal_id, job.state, message)
@@ -8,234 +8,330 @@ Place spinner.gif (64x64 transparent) in the same folder for the loader.
 LEGALISE PIRACY BABY!!!!!!!
 """
 
+import time
+_STARTED = time.perf_counter()  # for --startup-time
+
 import sys
 import os
-import urllib.request
+import json
+import multiprocessing
+import queue
+from contextlib import nullcontext
+from functools import partial
 from typing import Optional
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QLineEdit, QPushButton, QListWidget, QListWidgetItem,
-    QFileDialog, QProgressBar, QMessageBox, QFrame
+    QLabel, QLineEdit, QPushButton, QListWidget, QListWidgetItem, QListView,
+    QFileDialog, QProgressBar, QMessageBox, QFrame, QSpinBox, QTabWidget,
+    QComboBox, QCheckBox, QInputDialog
 )
-from PyQt5.QtGui import QPixmap, QMovie, QFont
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-import yt_dlp
-
-
-# ---------- Helpers ----------
-def human_readable_size(num):
-    if not num:
-        return "Unknown"
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if num < 1024.0:
-            return f"{num:.2f} {unit}"
-        num /= 1024.0
-    return f"{num:.2f} PB"
-
-
-def format_entry_display(fmt_meta: dict) -> str:
-    """Compact, friendly format string (no format_id prefix)."""
-    parts = []
-    height = fmt_meta.get('height')
-    fps = fmt_meta.get('fps')
-    ext = fmt_meta.get('ext') or ''
-    filesize = fmt_meta.get('filesize') or fmt_meta.get('filesize_approx')
-    tbr = fmt_meta.get('tbr')
-    abr = fmt_meta.get('abr')
-
-    if height:
-        parts.append(f"{height}p")
-        if fps:
-            parts.append(f"{fps}fps")
-    else:
-        if fmt_meta.get('acodec') and (not fmt_meta.get('vcodec') or fmt_meta.get('vcodec') in (None, 'none')):
-            parts.append("Audio")
-        else:
-            parts.append("Unknown")
-
-    if filesize:
-        parts.append(f"~{human_readable_size(filesize)}")
+from PyQt5.QtGui import QPixmap, QImage, QMovie, QFont, QIcon
+from PyQt5.QtCore import QThread, QObject, QTimer, QSize, QBuffer, QIODevice, pyqtSignal, Qt
+
+from ytdl_core import (human_readable_size, list_formats, iter_playlist, audio_opts, audio_format_spec,
+                       app_data_dir, warmup, video_thumbnail)
+from format_cache import FormatCache
+from format_model import FormatListModel, KIND_AV, KIND_VIDEO, KIND_AUDIO
+from format_ranking import RankingRules, estimated_size, rank_audio, select_formats
+from job_journal import JobJournal
+from download_archive import DownloadArchive
+from disk_space import DiskBudget, estimate_peak
+from job_manager import DownloadJob, JobManager
+from control_api import ControlAPI, default_token_file
+from metrics import MetricsRecorder
+from output_layout import LAYOUT_CHOICES, template_for
+from bandwidth import BandwidthScheduler, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
+from postprocess import AUDIO_PRESETS, PostProcessPool
+from segmented import DEFAULT_CHUNK_SIZE
+from thumb_store import ThumbnailStore, VARIANTS as THUMB_VARIANTS, digest_of
+from ydl_pool import default_ydl_pool
+
+SPINNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spinner.gif")
+
+
+# ---------- WarmupWorker ----------
+class WarmupWorker(QThread):
+    """Imports yt-dlp once the window is up, so the first listing doesn't pay for it."""
 
-    if ext:
-        parts.append(ext)
-
-    if tbr:
-        try:
-            parts.append(f"{int(tbr)}kbps")
-        except Exception:
-            parts.append(f"{tbr}kbps")
-    elif abr:
+    def run(self):
         try:
-            parts.append(f"{int(abr)}kbps")
+            warmup()
         except Exception:
-            parts.append(f"{abr}kbps")
+            pass  # the first real use imports it again and reports the error
+
+
+# ---------- Thumbnails ----------
+def scale_thumbnail(data: bytes, size: tuple) -> Optional[bytes]:
+    """ThumbnailStore `scale`: decode, fit into `size` and encode as JPEG (safe off the GUI thread)."""
+    img = QImage()
+    if not img.loadFromData(data):
+        return None
+    img = img.scaled(QSize(*size), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    buf = QBuffer()
+    buf.open(QIODevice.WriteOnly)
+    img.save(buf, 'JPG', 90)
+    return bytes(buf.data())
 
-    vcodec = fmt_meta.get('vcodec')
-    acodec = fmt_meta.get('acodec')
-    if vcodec and vcodec != 'none' and (not acodec or acodec in (None, 'none')):
-        parts.append("(video-only)")
-    elif acodec and (not vcodec or vcodec in (None, 'none')):
-        parts.append("(audio-only)")
-    else:
-        parts.append("(video+audio)")
 
-    return " • ".join(parts)
+def decode_thumbnail(data: bytes) -> QImage:
+    img = QImage()
+    img.loadFromData(data)
+    return img
+
+
+class IconWorker(QThread):
+    """Fetches the thumbnails of playlist entries one by one and emits their list icons."""
+    icon_ready = pyqtSignal(str, QImage)
+
+    def __init__(self, store: ThumbnailStore):
+        super().__init__()
+        self.store = store
+        self._pending = queue.Queue()
+
+    def add(self, video_id: str):
+        self._pending.put(video_id)
+
+    def clear(self):
+        while True:
+            try:
+                self._pending.get_nowait()
+            except queue.Empty:
+                return
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            try:
+                video_id = self._pending.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                data = video_thumbnail(video_id, self.store)
+                img = self.store.get(digest_of(data), 'icon') if data else None
+            except Exception:
+                continue  # an entry without an icon is fine
+            if img is not None and not img.isNull() and not self.isInterruptionRequested():
+                self.icon_ready.emit(video_id, img)
 
 
 # ---------- ListFormatsWorker ----------
 class ListFormatsWorker(QThread):
     formats_ready = pyqtSignal(dict)
+    thumbnail_ready = pyqtSignal(QImage)
     error = pyqtSignal(str)
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, cache: Optional[FormatCache] = None, refresh: bool = False,
+                 thumb_size: QSize = QSize(500, 300), bandwidth: Optional[BandwidthScheduler] = None,
+                 metrics: Optional[MetricsRecorder] = None, thumbs: Optional[ThumbnailStore] = None):
         super().__init__()
         self.url = url.strip()
+        self.cache = cache
+        self.refresh = refresh
+        self.thumb_size = thumb_size
+        self.bandwidth = bandwidth
+        self.metrics = metrics
+        self.thumbs = thumbs
+
+    def _on_formats(self, payload: dict):
+        if not self.isInterruptionRequested():
+            self.formats_ready.emit(payload)
 
     def run(self):
+        trace = self.metrics.start('list', self.url) if self.metrics else None
+        with self.metrics.profile('list') if self.metrics else nullcontext():
+            error = self._list(trace)
+        if trace is not None:
+            outcome = 'cancelled' if self.isInterruptionRequested() else 'failed' if error else 'ok'
+            self.metrics.finish(trace, outcome, error)
+
+    def _list(self, trace) -> Optional[Exception]:
         try:
+            # downloads back off while the user waits for a listing
+            with self.bandwidth.interactive() if self.bandwidth else nullcontext():
+                payload = list_formats(self.url, is_cancelled=self.isInterruptionRequested,
+                                       cache=self.cache, refresh=self.refresh,
+                                       on_formats=self._on_formats, trace=trace, thumbnails=self.thumbs)
             if self.isInterruptionRequested():
-                return
-            ydl_opts = {'quiet': True, 'no_warnings': True}
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(self.url, download=False)
-                if self.isInterruptionRequested():
-                    return
-                formats = info.get('formats', [info])
-                simple = []
-                for f in formats:
-                    if self.isInterruptionRequested():
-                        return
-                    meta = {
-                        'format_id': f.get('format_id'),
-                        'ext': f.get('ext', ''),
-                        'height': f.get('height'),
-                        'fps': f.get('fps'),
-                        'vcodec': f.get('vcodec'),
-                        'acodec': f.get('acodec'),
-                        'filesize': f.get('filesize') or f.get('filesize_approx'),
-                        'tbr': f.get('tbr'),
-                        'abr': f.get('abr'),
-                    }
-                    simple.append(meta)
-
-                def sort_key(x):
-                    h = x.get('height') or 0
-                    is_audio_only = 1 if (x.get('acodec') and (not x.get('vcodec') or x.get('vcodec') in (None, 'none'))) else 0
-                    return (-h, is_audio_only)
-                simple.sort(key=sort_key)
-
-                title = info.get('title') or ""
-                thumb_url = info.get('thumbnail')
-                thumb_bytes = None
-                duration = info.get('duration')
-                channel = info.get('channel') or info.get('uploader')
-
-                if self.isInterruptionRequested():
-                    return
-
-                if thumb_url:
-                    try:
-                        with urllib.request.urlopen(thumb_url, timeout=10) as resp:
-                            if self.isInterruptionRequested():
-                                return
-                            thumb_bytes = resp.read()
-                    except Exception:
-                        thumb_bytes = None
-
-                payload = {
-                    'formats': simple,
-                    'title': title,
-                    'thumbnail_bytes': thumb_bytes,
-                    'duration': duration,
-                    'channel': channel,
-                }
-                if self.isInterruptionRequested():
-                    return
-                self.formats_ready.emit(payload)
+                return None
+            # decode + scale here (or take the stored panel variant) so the GUI thread only converts to a pixmap
+            thumb_bytes = payload.get('thumbnail_bytes')
+            img = self._stored_thumbnail(thumb_bytes) if self.thumbs is not None and thumb_bytes else None
+            if img is None:
+                img = QImage()
+                if thumb_bytes and img.loadFromData(thumb_bytes):
+                    img = img.scaled(self.thumb_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            self.thumbnail_ready.emit(img)
         except Exception as e:
             # if interrupted, we may want to quietly return
-            if self.isInterruptionRequested():
-                return
-            self.error.emit(str(e))
+            if not self.isInterruptionRequested():
+                self.error.emit(str(e))
+            return e
+        return None
 
+    def _stored_thumbnail(self, data: bytes) -> Optional[QImage]:
+        try:
+            return self.thumbs.get(self.thumbs.put(data), 'panel')
+        except Exception:
+            return None  # a broken store must never break listing
 
-# ---------- DownloadWorker ----------
-class DownloadWorker(QThread):
-    progress = pyqtSignal(int)
-    status = pyqtSignal(str)
-    finished = pyqtSignal(bool, str)
 
-    def __init__(self, url, format_spec, outdir, out_template="%(title)s.%(ext)s", extra_opts=None):
+# ---------- PlaylistWorker ----------
+class PlaylistWorker(QThread):
+    entry_found = pyqtSignal(dict)
+    done = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, url: str, bandwidth: Optional[BandwidthScheduler] = None):
         super().__init__()
         self.url = url.strip()
-        self.format_spec = format_spec
-        self.outdir = outdir or os.getcwd()
-        self.out_template = out_template
-        self.extra_opts = extra_opts or {}
+        self.bandwidth = bandwidth
 
     def run(self):
+        count = 0
         try:
+            with self.bandwidth.interactive() if self.bandwidth else nullcontext():
+                for entry in iter_playlist(self.url, is_cancelled=self.isInterruptionRequested):
+                    count += 1
+                    self.entry_found.emit(entry)
+            self.done.emit(count)
+        except Exception as e:
             if self.isInterruptionRequested():
-                self.finished.emit(False, "Download cancelled.")
+                self.done.emit(count)
                 return
+            self.error.emit(str(e))
 
-            def progress_hook(d):
-                if self.isInterruptionRequested():
-                    # raising will cause yt-dlp to abort
-                    raise Exception("Cancelled by user")
-                status = d.get('status')
-                if status == 'downloading':
-                    downloaded = d.get('downloaded_bytes', 0) or 0
-                    total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
-                    speed = d.get('speed') or 0
-                    eta = d.get('eta')
-                    if total:
-                        try:
-                            percent = int(downloaded * 100 / total)
-                        except Exception:
-                            percent = 0
-                        percent = max(0, min(100, percent))
-                        self.progress.emit(percent)
-                        speed_str = human_readable_size(speed) + "/s" if speed else ""
-                        eta_str = f"ETA: {eta}s" if eta else ""
-                        self.status.emit(f"Downloading: {percent}% — {human_readable_size(downloaded)} / {human_readable_size(total)} {speed_str} {eta_str}")
-                    else:
-                        speed_str = human_readable_size(speed) + "/s" if speed else ""
-                        self.status.emit(f"Downloading: {human_readable_size(downloaded)} {speed_str}")
-                elif status == 'finished':
-                    self.status.emit("Download finished — merging/processing (if necessary)...")
-                    self.progress.emit(99)
-                elif status == 'error':
-                    self.status.emit("Error during download.")
-
-            outpath = os.path.join(self.outdir, self.out_template)
-            ydl_opts = {
-                'format': self.format_spec,
-                'outtmpl': outpath,
-                'merge_output_format': 'mkv',
-                'noplaylist': True,
-                'progress_hooks': [progress_hook],
-                'quiet': True,
-                'no_warnings': True,
-            }
-            ydl_opts.update(self.extra_opts)
-
-            self.status.emit("Starting download...")
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                if self.isInterruptionRequested():
-                    self.finished.emit(False, "Download cancelled.")
-                    return
-                ydl.download([self.url])
-
-            self.progress.emit(100)
-            self.status.emit("Completed.")
-            self.finished.emit(True, "Download completed.")
-        except Exception as e:
-            if self.isInterruptionRequested():
-                self.finished.emit(False, "Download cancelled.")
-            else:
-                self.finished.emit(False, str(e))
+
+# ---------- presets ----------
+# (label, format_spec or f(RankingRules) -> spec, extra_opts factory) for jobs queued without a format list
+DOWNLOAD_PRESETS = [
+    ("Highest resolution (8K if available)", lambda rules: rules.replace(max_height=0).to_spec(), None),
+    ("Best (auto)", RankingRules.to_spec, None),
+] + [(f"{label} (audio only)", audio_format_spec(codec), partial(audio_opts, codec, quality))
+     for label, codec, quality in AUDIO_PRESETS]
+
+
+# ---------- DownloadQueue ----------
+class DownloadQueue(QObject):
+    """The GUI's side of a job_manager.JobManager: its events as Qt signals.
+
+    Events from download and pool threads reach the window's slots on the
+    GUI thread. The control API drives the same manager, so jobs submitted
+    over HTTP show up in the queue panel like any other.
+    """
+    job_added = pyqtSignal(object)
+    job_started = pyqtSignal(object)
+    job_progress = pyqtSignal(object, int)
+    job_status = pyqtSignal(object, str)
+    job_finished = pyqtSignal(object, bool, str)
+
+    def __init__(self, max_concurrent=3, journal: Optional[JobJournal] = None,
+                 bandwidth: Optional[BandwidthScheduler] = None, post_pool: Optional[PostProcessPool] = None,
+                 archive: Optional[DownloadArchive] = None, metrics: Optional[MetricsRecorder] = None,
+                 disk: Optional[DiskBudget] = None, manager: Optional[JobManager] = None, parent=None):
+        super().__init__(parent)
+        self.manager = manager or JobManager(max_concurrent, journal, bandwidth, post_pool, archive, metrics, disk)
+        self.manager.listen(self._relay)
+
+    def _relay(self, event: str, job: DownloadJob, *args):
+        if event == 'added':
+            self.job_added.emit(job)
+        elif event == 'started':
+            self.job_started.emit(job)
+        elif event == 'progress':
+            if args[0].percent is not None:
+                self.job_progress.emit(job, args[0].percent)
+        elif event == 'status':
+            self.job_status.emit(job, args[0])
+        elif event == 'finished':
+            self.job_finished.emit(job, *args)
+
+    @property
+    def max_concurrent(self):
+        return self.manager.max_concurrent
+
+    @property
+    def jobs(self):
+        return self.manager.jobs
+
+    def set_max_concurrent(self, n: int):
+        self.manager.set_max_concurrent(n)
+
+    def enqueue(self, job: DownloadJob):
+        return self.manager.enqueue(job)
+
+    def cancel(self, job: DownloadJob):
+        self.manager.cancel(job)
+
+    def cancel_all(self):
+        self.manager.cancel_all()
+
+    def resume_unfinished(self) -> int:
+        return self.manager.resume_unfinished()
+
+    def shutdown(self, msecs=5000):
+        self.manager.shutdown(msecs / 1000)
+
+    def clear_finished(self):
+        return self.manager.clear_finished()
+
+    def running_count(self):
+        return self.manager.running_count()
+
+    def processing_count(self):
+        return self.manager.processing_count()
+
+    def pending_count(self):
+        return self.manager.pending_count()
+
+    def waiting_for_space_count(self):
+        return self.manager.waiting_for_space_count()
+
+    def total_speed(self):
+        return self.manager.total_speed()
+
+    def disk_shortfall(self, outdir: str) -> int:
+        return self.manager.disk_shortfall(outdir)
+
+    def wait_all(self, msecs=5000):
+        self.manager.wait_all(msecs / 1000)
+
+
+class QueueRow(QWidget):
+    """Row widget for one job in the queue panel: title, progress, status, cancel."""
+    def __init__(self, job: DownloadJob, parent=None):
+        super().__init__(parent)
+        self.job = job
+        layout = QVBoxLayout()
+        layout.setContentsMargins(4, 4, 4, 4)
+        self.setLayout(layout)
+
+        top = QHBoxLayout()
+        self.title_label = QLabel(job.title)
+        self.title_label.setToolTip(f"{job.url}\n{job.format_spec}")
+        top.addWidget(self.title_label, 1)
+        self.cancel_btn = QPushButton("Cancel")
+        top.addWidget(self.cancel_btn)
+        layout.addLayout(top)
+
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        layout.addWidget(self.progress)
+
+        self.status_label = QLabel("Queued")
+        self.status_label.setStyleSheet("color: #aaaaaa; font-size: 11px;")
+        layout.addWidget(self.status_label)
+
+    def set_finished(self, success: bool, message: str):
+        self.cancel_btn.setEnabled(False)
+        if success:
+            self.progress.setValue(100)
+            self.status_label.setText("Completed.")
+        elif self.job.state == 'cancelled':
+            self.status_label.setText("Cancelled.")
+        else:
+            self.status_label.setText(f"Failed: {message}")
+        self.status_label.setToolTip(message)
 
 
 # ---------- Main Window ----------
@@ -245,8 +341,82 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("YouTube Downloader — dark")
         self.setFixedSize(2000, 1250)  # Option A
         self.current_list_worker: Optional[ListFormatsWorker] = None
-        self.current_download_worker: Optional[DownloadWorker] = None
+        self.current_playlist_worker: Optional[PlaylistWorker] = None
+        self._retired_list_workers = []
+        self.warmup_worker: Optional[WarmupWorker] = None
+        try:
+            self.format_cache: Optional[FormatCache] = FormatCache()
+        except Exception:
+            self.format_cache = None
+        try:
+            self.thumb_store: Optional[ThumbnailStore] = ThumbnailStore(
+                scale=scale_thumbnail, decode=decode_thumbnail, weigh=QImage.sizeInBytes)
+        except Exception:
+            self.thumb_store = None
+        self.icon_worker: Optional[IconWorker] = None
+        self._icon_items = {}  # video ID -> playlist items waiting for its icon
+        self.current_title: Optional[str] = None
+        self.current_title_url: Optional[str] = None
+        self.current_duration: Optional[float] = None
+        try:
+            self.job_journal: Optional[JobJournal] = JobJournal()
+            self.job_journal.prune()
+        except Exception:
+            self.job_journal = None
+        try:
+            self.download_archive: Optional[DownloadArchive] = DownloadArchive()
+        except Exception:
+            self.download_archive = None
+        self.metrics = self._create_metrics()
+        self.bandwidth = BandwidthScheduler()
+        self.post_pool = PostProcessPool()
+        self.job_manager = JobManager(max_concurrent=3, journal=self.job_journal, bandwidth=self.bandwidth,
+                                      post_pool=self.post_pool, archive=self.download_archive, metrics=self.metrics,
+                                      disk=DiskBudget())
+        self.download_queue = DownloadQueue(manager=self.job_manager, parent=self)
+        self.queue_rows = {}
         self._init_ui()
+        self.control_api = self._start_control_api()
+        resumed = self.download_queue.resume_unfinished()
+        if resumed:
+            self.status_label.setText(f"Resuming {resumed} unfinished download(s) from last session.")
+        # fires on the first event-loop pass, i.e. once the window is showing
+        QTimer.singleShot(0, self._start_warmup)
+
+    def _start_warmup(self):
+        self.warmup_worker = WarmupWorker(self)
+        self.warmup_worker.start()
+
+    @staticmethod
+    def _create_metrics() -> Optional[MetricsRecorder]:
+        """Job metrics in the data folder; YTDL_METRICS_PORT serves them, YTDL_PROFILE_DIR profiles workers."""
+        try:
+            data = app_data_dir('data')
+            metrics = MetricsRecorder(os.path.join(data, 'metrics.jsonl'), os.path.join(data, 'metrics.prom'),
+                                      os.environ.get('YTDL_PROFILE_DIR') or None)
+            port = os.environ.get('YTDL_METRICS_PORT')
+            if port:
+                metrics.serve(int(port))
+            return metrics
+        except Exception:
+            return None
+
+    def _start_control_api(self) -> Optional[ControlAPI]:
+        """YTDL_API_PORT serves the control API on this window's queue; its token is YTDL_API_TOKEN,
+        or a random one written to control_api.default_token_file()."""
+        port = os.environ.get('YTDL_API_PORT')
+        if not port:
+            return None
+        api = ControlAPI(self.job_manager, self.outdir_edit.text().strip() or os.getcwd(), port=int(port),
+                         token=os.environ.get('YTDL_API_TOKEN') or None, format_cache=self.format_cache,
+                         token_file=default_token_file())
+        try:
+            api.start()
+        except OSError:
+            return None
+        # jobs sent without an outdir go where the GUI's would
+        self.outdir_edit.textChanged.connect(lambda text: setattr(api, 'outdir', text.strip() or os.getcwd()))
+        return api
 
     def _init_ui(self):
         w = QWidget()
@@ -263,6 +433,11 @@ class MainWindow(QMainWindow):
         row.addWidget(self.url_edit)
         self.list_btn = QPushButton("List formats")
         row.addWidget(self.list_btn)
+        self.refresh_btn = QPushButton("Refresh")
+        self.refresh_btn.setToolTip("List formats again, bypassing the cache")
+        row.addWidget(self.refresh_btn)
+        self.playlist_btn = QPushButton("Load playlist / channel")
+        row.addWidget(self.playlist_btn)
         layout.addLayout(row)
 
         # Output folder
@@ -272,8 +447,33 @@ class MainWindow(QMainWindow):
         row2.addWidget(self.outdir_edit)
         self.browse_btn = QPushButton("Browse")
         row2.addWidget(self.browse_btn)
+        self.archive_check = QCheckBox("Skip already downloaded")
+        self.archive_check.setChecked(self.download_archive is not None)
+        self.archive_check.setEnabled(self.download_archive is not None)
+        self.archive_check.setToolTip("Look new jobs up in the download archive (video ID + format) "
+                                      "before contacting YouTube, and record finished ones")
+        row2.addWidget(self.archive_check)
+        self.rebuild_archive_btn = QPushButton("Rebuild archive")
+        self.rebuild_archive_btn.setEnabled(self.download_archive is not None)
+        self.rebuild_archive_btn.setToolTip("Add the downloads found in the output folder to the archive")
+        row2.addWidget(self.rebuild_archive_btn)
         layout.addLayout(row2)
 
+        # where files go inside the output folder, and whether they are catalogued there
+        layout_row = QHBoxLayout()
+        layout_row.addWidget(QLabel("Layout:"))
+        self.layout_combo = QComboBox()
+        for label, name in LAYOUT_CHOICES:
+            self.layout_combo.addItem(label, name)
+        self.layout_combo.setToolTip("Subfolders for large archives; file names always keep the video ID")
+        layout_row.addWidget(self.layout_combo)
+        self.catalog_check = QCheckBox("Write metadata sidecars + index")
+        self.catalog_check.setToolTip("A .meta.json (format, codecs, SHA-256) next to every finished file, and "
+                                      "an index of where each video ID went in the output folder")
+        layout_row.addWidget(self.catalog_check)
+        layout_row.addStretch()
+        layout.addLayout(layout_row)
+
         # Middle area (left: title+thumb+list, right: actions)
         mid = QHBoxLayout()
 
@@ -322,29 +522,188 @@ class MainWindow(QMainWindow):
         left_col.addSpacing(12)
         left_col.addStretch(1)
 
-        # format list
-        self.formats_list = QListWidget()
-        self.formats_list.setSelectionMode(QListWidget.SingleSelection)
-        self.formats_list.setFixedSize(1200,500)
-        left_col.addWidget(self.formats_list)
+        # format list / playlist entries
+        self.left_tabs = QTabWidget()
+        self.left_tabs.setFixedSize(1200, 560)
+        formats_tab = QWidget()
+        formats_layout = QVBoxLayout()
+        formats_tab.setLayout(formats_layout)
+        formats_head = QHBoxLayout()
+        formats_head.addWidget(QLabel("Show:"))
+        self.kind_filter_combo = QComboBox()
+        for label, kind in (("All", None), ("Video+audio", KIND_AV), ("Video only", KIND_VIDEO), ("Audio only", KIND_AUDIO)):
+            self.kind_filter_combo.addItem(label, kind)
+        formats_head.addWidget(self.kind_filter_combo)
+        formats_head.addWidget(QLabel("Container:"))
+        self.ext_filter_combo = QComboBox()
+        formats_head.addWidget(self.ext_filter_combo)
+        formats_head.addWidget(QLabel("Codec:"))
+        self.codec_filter_combo = QComboBox()
+        formats_head.addWidget(self.codec_filter_combo)
+        formats_head.addWidget(QLabel("Sort:"))
+        self.sort_combo = QComboBox()
+        for label, key in (("Resolution", 'resolution'), ("Size", 'size'), ("Bitrate", 'bitrate')):
+            self.sort_combo.addItem(label, key)
+        formats_head.addWidget(self.sort_combo)
+        formats_head.addStretch()
+        formats_layout.addLayout(formats_head)
+        self.format_model = FormatListModel(self)
+        self._reset_format_filters()
+        self.formats_list = QListView()
+        self.formats_list.setModel(self.format_model)
+        self.formats_list.setSelectionMode(QListView.SingleSelection)
+        self.formats_list.setUniformItemSizes(True)  # lets the view skip measuring every row
+        formats_layout.addWidget(self.formats_list)
+        self.left_tabs.addTab(formats_tab, "Formats")
+
+        playlist_tab = QWidget()
+        playlist_layout = QVBoxLayout()
+        playlist_tab.setLayout(playlist_layout)
+        playlist_head = QHBoxLayout()
+        playlist_head.addWidget(QLabel("Format:"))
+        self.playlist_preset_combo = QComboBox()
+        for label, _, _ in DOWNLOAD_PRESETS:
+            self.playlist_preset_combo.addItem(label)
+        self.playlist_preset_combo.setCurrentIndex(1)
+        playlist_head.addWidget(self.playlist_preset_combo)
+        self.playlist_auto_check = QCheckBox("Queue entries as they arrive")
+        self.playlist_auto_check.setChecked(True)
+        playlist_head.addWidget(self.playlist_auto_check)
+        playlist_head.addStretch()
+        self.playlist_count_label = QLabel("")
+        playlist_head.addWidget(self.playlist_count_label)
+        self.playlist_queue_btn = QPushButton("Queue all")
+        playlist_head.addWidget(self.playlist_queue_btn)
+        playlist_layout.addLayout(playlist_head)
+        self.playlist_list = QListWidget()
+        self.playlist_list.setIconSize(QSize(*THUMB_VARIANTS['icon']))
+        playlist_layout.addWidget(self.playlist_list)
+        self.left_tabs.addTab(playlist_tab, "Playlist")
+        left_col.addWidget(self.left_tabs)
 
         # ----- right column (actions) -----
         right_col = QVBoxLayout()
         right_col.addWidget(QLabel("Actions"))
         self.download_btn = QPushButton("Download selected format")
-        self.download_8k_btn = QPushButton("Download best 8K (if available)")
-        self.download_best_btn = QPushButton("Download best (auto)")
-        self.download_mp3_btn = QPushButton("Download as MP3 (audio only)")
+        self.download_8k_btn = QPushButton("Download highest resolution (8K if available)")
+        self.download_best_btn = QPushButton("Download best (auto-select)")
+        self.download_audio_btn = QPushButton("Download audio only")
         right_col.addWidget(self.download_btn)
         right_col.addWidget(self.download_8k_btn)
         right_col.addWidget(self.download_best_btn)
-        right_col.addWidget(self.download_mp3_btn)
 
-        # Cancel button
+        # rules for the auto-select buttons / presets (format_ranking)
+        rank_row = QHBoxLayout()
+        rank_row.addWidget(QLabel("Auto-select:"))
+        self.rank_height_combo = QComboBox()
+        for label, height in (("Any resolution", 0), ("≤ 4320p", 4320), ("≤ 2160p", 2160), ("≤ 1440p", 1440),
+                              ("≤ 1080p", 1080), ("≤ 720p", 720), ("≤ 480p", 480)):
+            self.rank_height_combo.addItem(label, height)
+        rank_row.addWidget(self.rank_height_combo)
+        self.rank_codec_combo = QComboBox()
+        for label, codecs in (("AV1 > VP9 > H.264", ('av1', 'vp9', 'h264')),
+                              ("VP9 > H.264 > AV1", ('vp9', 'h264', 'av1')),
+                              ("H.264 > VP9 > AV1", ('h264', 'vp9', 'av1'))):
+            self.rank_codec_combo.addItem(label, codecs)
+        self.rank_codec_combo.setToolTip("Preferred video codecs, for what your player can decode")
+        rank_row.addWidget(self.rank_codec_combo)
+        self.rank_hdr_combo = QComboBox()
+        for label, mode in (("No HDR", 'avoid'), ("HDR allowed", 'allow'), ("Prefer HDR", 'prefer')):
+            self.rank_hdr_combo.addItem(label, mode)
+        rank_row.addWidget(self.rank_hdr_combo)
+        self.rank_budget_spin = QSpinBox()
+        self.rank_budget_spin.setRange(0, 100000)
+        self.rank_budget_spin.setSingleStep(100)
+        self.rank_budget_spin.setSuffix(" MiB")
+        self.rank_budget_spin.setSpecialValueText("No size limit")
+        self.rank_budget_spin.setToolTip("Take the best video+audio pair whose size fits")
+        rank_row.addWidget(self.rank_budget_spin)
+        right_col.addLayout(rank_row)
+
+        # audio-only jobs: one preset for the single and the batch button
+        audio_row = QHBoxLayout()
+        self.audio_preset_combo = QComboBox()
+        for label, codec, quality in AUDIO_PRESETS:
+            self.audio_preset_combo.addItem(label, (codec, quality))
+        self.audio_preset_combo.setCurrentIndex(1)
+        self.audio_preset_combo.setToolTip("Streams that already have the chosen codec are copied, not re-encoded")
+        audio_row.addWidget(self.audio_preset_combo)
+        audio_row.addWidget(self.download_audio_btn)
+        right_col.addLayout(audio_row)
+        self.batch_audio_btn = QPushButton("Batch audio from URL list...")
+        right_col.addWidget(self.batch_audio_btn)
+
+        # Cancel button (format listing; queued downloads cancel per row)
         self.cancel_btn = QPushButton("Cancel")
         self.cancel_btn.setEnabled(False)
         right_col.addWidget(self.cancel_btn)
-        right_col.addStretch()
+
+        # download queue
+        right_col.addSpacing(16)
+        queue_head = QHBoxLayout()
+        queue_head.addWidget(QLabel("Download queue"))
+        queue_head.addStretch()
+        queue_head.addWidget(QLabel("Parallel:"))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 16)
+        self.concurrency_spin.setValue(self.download_queue.max_concurrent)
+        queue_head.addWidget(self.concurrency_spin)
+        right_col.addLayout(queue_head)
+
+        # segmented fetching for newly queued jobs (1 connection = plain yt-dlp download)
+        segment_row = QHBoxLayout()
+        segment_row.addWidget(QLabel("Connections per job:"))
+        self.segments_spin = QSpinBox()
+        self.segments_spin.setRange(1, 16)
+        self.segments_spin.setValue(1)
+        self.segments_spin.setToolTip("Fetch large single-format streams over several byte-range connections")
+        segment_row.addWidget(self.segments_spin)
+        segment_row.addWidget(QLabel("Chunk (MiB):"))
+        self.chunk_spin = QSpinBox()
+        self.chunk_spin.setRange(1, 256)
+        self.chunk_spin.setValue(DEFAULT_CHUNK_SIZE // (1024 * 1024))
+        segment_row.addWidget(self.chunk_spin)
+        self.stream_merge_check = QCheckBox("Merge while downloading")
+        self.stream_merge_check.setToolTip("Pipe video+audio straight into ffmpeg: no temporary stream files, "
+                                           "but an interrupted download starts over")
+        segment_row.addWidget(self.stream_merge_check)
+        segment_row.addStretch()
+        right_col.addLayout(segment_row)
+
+        # bandwidth: shared limit across running jobs, plus cap/priority for newly queued ones
+        rate_row = QHBoxLayout()
+        rate_row.addWidget(QLabel("Total limit:"))
+        self.global_rate_spin = QSpinBox()
+        self.global_rate_spin.setRange(0, 10000)
+        self.global_rate_spin.setSuffix(" MiB/s")
+        self.global_rate_spin.setSpecialValueText("Unlimited")
+        self.global_rate_spin.setToolTip("Shared by all running downloads, split by priority")
+        rate_row.addWidget(self.global_rate_spin)
+        rate_row.addWidget(QLabel("Per job:"))
+        self.job_rate_spin = QSpinBox()
+        self.job_rate_spin.setRange(0, 10000)
+        self.job_rate_spin.setSuffix(" MiB/s")
+        self.job_rate_spin.setSpecialValueText("Unlimited")
+        rate_row.addWidget(self.job_rate_spin)
+        rate_row.addWidget(QLabel("Priority:"))
+        self.priority_combo = QComboBox()
+        for label, priority in (("Low", PRIORITY_LOW), ("Normal", PRIORITY_NORMAL), ("High", PRIORITY_HIGH)):
+            self.priority_combo.addItem(label, priority)
+        self.priority_combo.setCurrentIndex(1)
+        rate_row.addWidget(self.priority_combo)
+        rate_row.addStretch()
+        right_col.addLayout(rate_row)
+
+        self.queue_list = QListWidget()
+        self.queue_list.setSelectionMode(QListWidget.NoSelection)
+        right_col.addWidget(self.queue_list, 1)
+
+        queue_foot = QHBoxLayout()
+        self.throughput_label = QLabel("Total: idle")
+        queue_foot.addWidget(self.throughput_label, 1)
+        self.clear_finished_btn = QPushButton("Clear finished")
+        queue_foot.addWidget(self.clear_finished_btn)
+        right_col.addLayout(queue_foot)
 
         # Add to mid layout (centered)
         mid.addStretch(1)
@@ -366,15 +725,8 @@ class MainWindow(QMainWindow):
         self.spinner_label = QLabel()
         self.spinner_label.setFixedSize(48, 48)
         self.spinner_label.setVisible(False)
-        spinner_path = os.path.join(os.path.dirname(__file__), "spinner.gif")
-        if os.path.exists(spinner_path):
-            try:
-                self.spinner_movie = QMovie(spinner_path)
-                self.spinner_label.setMovie(self.spinner_movie)
-            except Exception:
-                self.spinner_movie = None
-        else:
-            self.spinner_movie = None
+        self.spinner_movie = None  # loaded on first use, see _show_spinner()
+        self._spinner_loaded = False
         bottom.addWidget(self.spinner_label)
 
         self.progress = QProgressBar()
@@ -388,19 +740,45 @@ class MainWindow(QMainWindow):
 
         layout.addLayout(bottom)
 
-        footer = QLabel("Tip: double-click a format to download. MP3 requires ffmpeg.")
+        footer = QLabel("Tip: double-click a format to add it to the download queue. Audio conversion requires ffmpeg.")
         footer.setStyleSheet("color: #aaaaaa; font-size: 11px;")
         layout.addWidget(footer)
 
         # signals
-        self.list_btn.clicked.connect(self.on_list_formats)
+        self.list_btn.clicked.connect(lambda: self.on_list_formats())
+        self.refresh_btn.clicked.connect(lambda: self.on_list_formats(refresh=True))
+        self.playlist_btn.clicked.connect(self.on_load_playlist)
+        self.playlist_queue_btn.clicked.connect(self.on_queue_playlist)
+        self.playlist_list.itemDoubleClicked.connect(self.on_playlist_item_double)
         self.browse_btn.clicked.connect(self.on_browse)
+        self.rebuild_archive_btn.clicked.connect(self.on_rebuild_archive)
         self.download_btn.clicked.connect(self.on_download_selected)
         self.download_8k_btn.clicked.connect(self.on_download_8k)
         self.download_best_btn.clicked.connect(self.on_download_best)
-        self.download_mp3_btn.clicked.connect(self.on_download_mp3)
-        self.formats_list.itemDoubleClicked.connect(self.on_item_double)
+        self.download_audio_btn.clicked.connect(self.on_download_audio)
+        self.batch_audio_btn.clicked.connect(self.on_batch_audio)
+        self.formats_list.doubleClicked.connect(self.on_item_double)
+        self.kind_filter_combo.currentIndexChanged.connect(self.on_format_filter_changed)
+        self.ext_filter_combo.currentIndexChanged.connect(self.on_format_filter_changed)
+        self.codec_filter_combo.currentIndexChanged.connect(self.on_format_filter_changed)
+        self.sort_combo.currentIndexChanged.connect(
+            lambda: self.format_model.set_sort_key(self.sort_combo.currentData()))
         self.cancel_btn.clicked.connect(self.on_cancel)
+        self.concurrency_spin.valueChanged.connect(self.download_queue.set_max_concurrent)
+        self.global_rate_spin.valueChanged.connect(lambda v: self.bandwidth.set_global_rate(v * 1024 * 1024))
+        self.clear_finished_btn.clicked.connect(self.on_clear_finished)
+
+        self.download_queue.job_added.connect(self.on_job_added)
+        self.download_queue.job_started.connect(self.on_job_started)
+        self.download_queue.job_progress.connect(self.on_job_progress)
+        self.download_queue.job_status.connect(self.on_job_status)
+        self.download_queue.job_finished.connect(self.on_job_finished)
+
+        # total throughput readout
+        self.throughput_timer = QTimer(self)
+        self.throughput_timer.setInterval(500)
+        self.throughput_timer.timeout.connect(self.update_throughput)
+        self.throughput_timer.start()
 
     def apply_dark_style(self):
         self.setStyleSheet("""
@@ -417,10 +795,11 @@ class MainWindow(QMainWindow):
 
     def set_ui_enabled(self, enabled: bool):
         self.list_btn.setEnabled(enabled)
+        self.refresh_btn.setEnabled(enabled)
         self.download_btn.setEnabled(enabled)
         self.download_8k_btn.setEnabled(enabled)
         self.download_best_btn.setEnabled(enabled)
-        self.download_mp3_btn.setEnabled(enabled)
+        self.download_audio_btn.setEnabled(enabled)
         self.browse_btn.setEnabled(enabled)
         self.formats_list.setEnabled(enabled)
         self.url_edit.setEnabled(enabled)
@@ -432,8 +811,32 @@ class MainWindow(QMainWindow):
         if d:
             self.outdir_edit.setText(d)
 
+    def on_rebuild_archive(self):
+        outdir = self._outdir_or_warn()
+        if not outdir or self.download_archive is None:
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            added = self.download_archive.rebuild(outdir)
+        except Exception as e:
+            QMessageBox.warning(self, "Archive", f"Couldn't scan the folder: {e}")
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        stats = self.download_archive.stats()
+        self.status_label.setText(f"Archive: added {added} download(s) from {outdir} "
+                                  f"({stats['videos']} video(s) archived).")
+
     def _show_spinner(self, show: bool):
-        if not getattr(self, "spinner_movie", None):
+        if show and not self._spinner_loaded:
+            self._spinner_loaded = True
+            if os.path.exists(SPINNER_PATH):
+                try:
+                    self.spinner_movie = QMovie(SPINNER_PATH)
+                    self.spinner_label.setMovie(self.spinner_movie)
+                except Exception:
+                    self.spinner_movie = None
+        if not self.spinner_movie:
             return
         if show:
             self.spinner_label.setVisible(True)
@@ -449,13 +852,14 @@ class MainWindow(QMainWindow):
             self.spinner_label.setVisible(False)
 
     # ---------- listing formats ----------
-    def on_list_formats(self):
+    def on_list_formats(self, refresh: bool = False):
         url = self.url_edit.text().strip()
         if not url:
             QMessageBox.warning(self, "No URL", "Please paste a YouTube URL first.")
             return
 
-        self.formats_list.clear()
+        self.format_model.clear()
+        self._reset_format_filters()
         self.title_label.setText("Fetching...")
         self._show_spinner(True)
         self.progress.setRange(0, 0)  # indeterminate
@@ -463,39 +867,47 @@ class MainWindow(QMainWindow):
         self.cancel_btn.setEnabled(True)
         self.status_label.setText("Fetching formats...")
 
-        self.current_list_worker = ListFormatsWorker(url)
+        self.current_title = None
+        self.current_title_url = url
+        self.current_duration = None
+        self.thumb_label.clear()
+        self._retire_list_worker()
+        self.current_list_worker = ListFormatsWorker(url, self.format_cache, refresh, self.thumb_label.size(),
+                                                    self.bandwidth, self.metrics, self.thumb_store)
         self.current_list_worker.formats_ready.connect(self.on_formats_ready)
+        self.current_list_worker.thumbnail_ready.connect(self.on_thumbnail_ready)
         self.current_list_worker.error.connect(self.on_list_error)
         self.current_list_worker.start()
 
+    def _retire_list_worker(self):
+        # a previous listing may still be fetching its thumbnail; stop it but
+        # keep a reference until the thread has actually exited
+        old = self.current_list_worker
+        if old and old.isRunning():
+            old.requestInterruption()
+            self._retired_list_workers.append(old)
+            old.finished.connect(lambda w=old: self._retired_list_workers.remove(w))
+
     def on_formats_ready(self, payload: dict):
         self.set_ui_enabled(True)
-        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(self._playlist_loading())
         self._show_spinner(False)
         self.progress.setRange(0, 100)
         self.progress.setValue(0)
 
         formats = payload.get('formats', [])
         title = payload.get('title') or ""
-        thumb_bytes = payload.get('thumbnail_bytes')
         duration = payload.get('duration')
         channel = payload.get('channel')
+        self.current_duration = duration
 
         if title:
             self.title_label.setText(title)
+            self.current_title = title
         else:
             self.title_label.setText("No title")
 
-        if thumb_bytes:
-            try:
-                pix = QPixmap()
-                pix.loadFromData(thumb_bytes)
-                pix = pix.scaled(self.thumb_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.thumb_label.setPixmap(pix)
-            except Exception:
-                self.thumb_label.setText("No thumbnail")
-        else:
-            self.thumb_label.setText("No thumbnail")
+        self.thumb_label.setText("Loading thumbnail…")
 
         # channel + duration
         if channel:
@@ -512,19 +924,28 @@ class MainWindow(QMainWindow):
         else:
             self.duration_label.setText("Duration: Unknown")
 
-        # populate formats list
-        self.formats_list.clear()
-        for fm in formats:
-            desc = format_entry_display(fm)
-            item = QListWidgetItem(desc)
-            item.setData(Qt.UserRole, fm)
-            self.formats_list.addItem(item)
-
-        self.status_label.setText(f"Found {len(formats)} formats.")
+        # populate formats list; filter choices follow what this listing offers
+        self.format_model.set_formats(formats)
+        self._reset_format_filters()
+
+        status = f"Found {len(formats)} formats"
+        if payload.get('cached'):
+            status += " (cached)"
+        if self.format_cache is not None:
+            status += f" — cache: {self.format_cache.hits} hits / {self.format_cache.misses} misses"
+        self.status_label.setText(status + ".")
+
+    def on_thumbnail_ready(self, img: QImage):
+        if self.sender() is not self.current_list_worker:
+            return  # a previous listing finished late
+        if img.isNull():
+            self.thumb_label.setText("No thumbnail")
+        else:
+            self.thumb_label.setPixmap(QPixmap.fromImage(img))
 
     def on_list_error(self, msg: str):
         self.set_ui_enabled(True)
-        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(self._playlist_loading())
         self._show_spinner(False)
         self.progress.setRange(0, 100)
         self.progress.setValue(0)
@@ -533,99 +954,397 @@ class MainWindow(QMainWindow):
         self.thumb_label.clear()
         QMessageBox.critical(self, "Error listing formats", msg)
 
-    def on_item_double(self, item):
-        self.formats_list.setCurrentItem(item)
+    def on_item_double(self, index):
+        self.formats_list.setCurrentIndex(index)
         self.on_download_selected()
 
+    def _reset_format_filters(self):
+        """Refill the container/codec choices from the model and show everything."""
+        for combo, values in ((self.ext_filter_combo, self.format_model.values('ext')),
+                              (self.codec_filter_combo, self.format_model.values('vcodec')
+                               + self.format_model.values('acodec'))):
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem("Any", None)
+            for value in values:
+                combo.addItem(value, value)
+            combo.blockSignals(False)
+        self.kind_filter_combo.blockSignals(True)
+        self.kind_filter_combo.setCurrentIndex(0)
+        self.kind_filter_combo.blockSignals(False)
+        self.format_model.set_filter()
+
+    def on_format_filter_changed(self):
+        self.format_model.set_filter(kind=self.kind_filter_combo.currentData(),
+                                     ext=self.ext_filter_combo.currentData(),
+                                     codec=self.codec_filter_combo.currentData())
+        shown, total = self.format_model.rowCount(), self.format_model.total_count()
+        if total:
+            self.status_label.setText(f"Showing {shown} of {total} formats.")
+
     # ---------- downloads ----------
-    def _start_download(self, format_spec, extra_opts=None, out_template="%(title)s.%(ext)s"):
-        url = self.url_edit.text().strip()
+    def _outdir_or_warn(self) -> Optional[str]:
         outdir = self.outdir_edit.text().strip() or os.getcwd()
+        if not os.path.isdir(outdir):
+            QMessageBox.warning(self, "Bad folder", "Output folder doesn't exist.")
+            return None
+        return outdir
+
+    def _job_options(self) -> dict:
+        options = {}
+        segments = self.segments_spin.value()
+        if segments > 1:
+            options.update(segments=segments, chunk_size=self.chunk_spin.value() * 1024 * 1024)
+        if self.stream_merge_check.isChecked():
+            options.update(stream_merge=True, chunk_size=self.chunk_spin.value() * 1024 * 1024)
+        if self.priority_combo.currentData() != PRIORITY_NORMAL:
+            options['priority'] = self.priority_combo.currentData()
+        if self.job_rate_spin.value():
+            options['rate_limit'] = self.job_rate_spin.value() * 1024 * 1024
+        if not self.archive_check.isChecked():
+            options['no_archive'] = True
+        if self.catalog_check.isChecked():
+            options['catalog'] = True
+        return options
+
+    def _out_template(self) -> str:
+        return template_for(self.layout_combo.currentData())
+
+    def _listed_audio(self) -> Optional[dict]:
+        """The best audio-only format of the listed video (what 'bestaudio' picks), if it is listed."""
+        if self.url_edit.text().strip() != self.current_title_url:
+            return None
+        table = self.format_model.table
+        audios = rank_audio(table.row(i) for i in range(len(table)))
+        return audios[0] if audios else None
+
+    def _start_download(self, format_spec, extra_opts=None, out_template=None, note: str = "",
+                        sizes=None, merge: bool = False):
+        """`sizes`: the listed sizes of the formats to download, for the queue's disk-space check;
+        `merge`: they get merged (or converted) into a new file."""
+        url = self.url_edit.text().strip()
         if not url:
             QMessageBox.warning(self, "No URL", "Please paste a YouTube URL first.")
             return
-        if not os.path.isdir(outdir):
-            QMessageBox.warning(self, "Bad folder", "Output folder doesn't exist.")
+        outdir = self._outdir_or_warn()
+        if not outdir:
             return
 
-        self.set_ui_enabled(False)
-        self.cancel_btn.setEnabled(True)
-        self.progress.setRange(0, 100)
-        self.progress.setValue(0)
-        self.status_label.setText("Preparing download...")
-
-        self.current_download_worker = DownloadWorker(url, format_spec, outdir, out_template, extra_opts)
-        self.current_download_worker.progress.connect(self.progress.setValue)
-        self.current_download_worker.status.connect(self.status_label.setText)
-        self.current_download_worker.finished.connect(self.on_download_finished)
-        self.current_download_worker.start()
+        title = self.current_title if url == self.current_title_url else None
+        options = self._job_options()
+        peak = estimate_peak(sizes or (), merge, options.get('stream_merge'))
+        if peak:
+            options['peak_bytes'] = peak
+        job = DownloadJob(url, format_spec, outdir, out_template or self._out_template(), extra_opts, title=title,
+                          options=options)
+        self.download_queue.enqueue(job)
+        shortfall = self.download_queue.disk_shortfall(outdir)
+        if shortfall:
+            note = ((note + "; ") if note else "") + \
+                f"{human_readable_size(shortfall)} more disk space needed, some jobs wait until it frees up"
+        self.status_label.setText(f"Queued: {job.title}" + (f" — {note}" if note else ""))
 
     def on_download_selected(self):
-        item = self.formats_list.currentItem()
-        if not item:
+        fmt = self.format_model.format_at(self.formats_list.currentIndex().row())
+        if not fmt:
             QMessageBox.information(self, "Select format", "Please select a format from the list first.")
             return
-        fmt = item.data(Qt.UserRole)
         fmt_id = fmt.get('format_id')
         vcodec = fmt.get('vcodec')
         acodec = fmt.get('acodec')
+        sizes = [estimated_size(fmt, self.current_duration)]
         if vcodec and vcodec != 'none' and (not acodec or acodec in (None, 'none')):
             format_spec = f"{fmt_id}+bestaudio/best"
+            audio = self._listed_audio()
+            sizes.append(estimated_size(audio, self.current_duration) if audio else None)
         else:
             format_spec = fmt_id
-        self._start_download(format_spec)
+        self._start_download(format_spec, sizes=sizes, merge=len(sizes) > 1)
+
+    def _ranking_rules(self) -> RankingRules:
+        return RankingRules(codecs=self.rank_codec_combo.currentData(), max_height=self.rank_height_combo.currentData(),
+                            hdr=self.rank_hdr_combo.currentData(),
+                            size_budget=self.rank_budget_spin.value() * 1024 * 1024)
+
+    def _start_auto_download(self, rules: RankingRules):
+        """Queue the exact pair ranked from this URL's listing, or an auto spec ranked at download time."""
+        url = self.url_edit.text().strip()
+        choice = None
+        if url == self.current_title_url and self.format_model.total_count():
+            table = self.format_model.table
+            choice = select_formats((table.row(i) for i in range(len(table))), rules, self.current_duration)
+        if choice is None:
+            self._start_download(rules.to_spec(), note="formats chosen when the download starts")
+        else:
+            self._start_download(choice.spec, note=f"{choice.describe()} ({choice.spec})", sizes=[choice.size],
+                                 merge=choice.audio is not None)
 
     def on_download_8k(self):
-        fmt = "bestvideo[height=4320]+bestaudio/best/best"
-        self._start_download(fmt)
+        self._start_auto_download(self._ranking_rules().replace(max_height=0))
 
     def on_download_best(self):
-        fmt = "best"
-        self._start_download(fmt)
-
-    def on_download_mp3(self):
-        postprocessors = [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }]
-        extra_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': postprocessors,
-            'quiet': True,
-            'no_warnings': True,
-        }
-        self._start_download("bestaudio/best", extra_opts=extra_opts, out_template="%(title)s.%(ext)s")
-
-    def on_download_finished(self, success: bool, message: str):
-        self.set_ui_enabled(True)
-        self.cancel_btn.setEnabled(False)
+        self._start_auto_download(self._ranking_rules())
+
+    def on_download_audio(self):
+        codec, quality = self.audio_preset_combo.currentData()
+        audio = self._listed_audio()
+        self._start_download(audio_format_spec(codec), extra_opts=audio_opts(codec, quality),
+                             sizes=[estimated_size(audio, self.current_duration)] if audio else None, merge=True)
+
+    def on_batch_audio(self):
+        """Queue many URLs as audio-only jobs with the current preset; they download in parallel
+        and convert in the post-processing pool."""
+        outdir = self._outdir_or_warn()
+        if not outdir:
+            return
+        text, ok = QInputDialog.getMultiLineText(self, "Batch audio",
+                                                 "Video URLs, one per line ('#' lines are ignored):")
+        if not ok:
+            return
+        urls = [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith('#')]
+        codec, quality = self.audio_preset_combo.currentData()
+        for url in urls:
+            self.download_queue.enqueue(DownloadJob(url, audio_format_spec(codec), outdir, self._out_template(),
+                                                    extra_opts=audio_opts(codec, quality),
+                                                    options=self._job_options()))
+        self.status_label.setText(f"Queued {len(urls)} audio job(s) ({self.audio_preset_combo.currentText()}).")
+
+    # ---------- playlists ----------
+    def on_load_playlist(self):
+        url = self.url_edit.text().strip()
+        if not url:
+            QMessageBox.warning(self, "No URL", "Please paste a playlist or channel URL first.")
+            return
+        if self.playlist_auto_check.isChecked() and not self._outdir_or_warn():
+            return
+        if self.current_playlist_worker and self.current_playlist_worker.isRunning():
+            QMessageBox.information(self, "Busy", "A playlist is still being loaded.")
+            return
+
+        self.playlist_list.clear()
+        self._icon_items.clear()
+        if self.icon_worker is not None:
+            self.icon_worker.clear()
+        self.playlist_count_label.setText("Loading…")
+        self.left_tabs.setCurrentIndex(1)
+        self.playlist_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.status_label.setText("Loading playlist entries...")
+
+        self.current_playlist_worker = PlaylistWorker(url, self.bandwidth)
+        self.current_playlist_worker.entry_found.connect(self.on_playlist_entry)
+        self.current_playlist_worker.done.connect(self.on_playlist_done)
+        self.current_playlist_worker.error.connect(self.on_playlist_error)
+        self.current_playlist_worker.start()
+
+    def _playlist_preset(self):
+        _, format_spec, opts_factory = DOWNLOAD_PRESETS[self.playlist_preset_combo.currentIndex()]
+        if callable(format_spec):
+            format_spec = format_spec(self._ranking_rules())
+        return format_spec, (opts_factory() if opts_factory else None)
+
+    def _queue_entry(self, entry: dict, outdir: str):
+        format_spec, extra_opts = self._playlist_preset()
+        job = DownloadJob(entry['url'], format_spec, outdir, self._out_template(), extra_opts,
+                          title=entry.get('title'), options=self._job_options())
+        self.download_queue.enqueue(job)
+
+    def on_playlist_entry(self, entry: dict):
+        item = QListWidgetItem(entry.get('title') or entry['url'])
+        item.setToolTip(entry['url'])
+        item.setData(Qt.UserRole, entry)
+        self.playlist_list.addItem(item)
+        self._request_icon(entry.get('id'), item)
+        self.playlist_count_label.setText(f"{self.playlist_list.count()} entries…")
+        if self.playlist_auto_check.isChecked():
+            outdir = self.outdir_edit.text().strip() or os.getcwd()
+            if os.path.isdir(outdir):
+                self._queue_entry(entry, outdir)
+
+    def _request_icon(self, video_id: Optional[str], item: QListWidgetItem):
+        if not video_id or self.thumb_store is None:
+            return
+        if self.icon_worker is None:
+            self.icon_worker = IconWorker(self.thumb_store)
+            self.icon_worker.icon_ready.connect(self.on_icon_ready)
+            self.icon_worker.start()
+        waiting = self._icon_items.setdefault(video_id, [])
+        if not waiting:
+            self.icon_worker.add(video_id)
+        waiting.append(item)
+
+    def on_icon_ready(self, video_id: str, img: QImage):
+        items = self._icon_items.pop(video_id, ())
+        if items:
+            icon = QIcon(QPixmap.fromImage(img))
+            for item in items:
+                item.setIcon(icon)
+
+    def on_playlist_done(self, count: int):
+        self.playlist_btn.setEnabled(True)
+        self._update_cancel_btn()
+        self.playlist_count_label.setText(f"{count} entries")
+        self.status_label.setText(f"Playlist loaded: {count} entries.")
+
+    def on_playlist_error(self, msg: str):
+        self.playlist_btn.setEnabled(True)
+        self._update_cancel_btn()
+        self.playlist_count_label.setText(f"{self.playlist_list.count()} entries (incomplete)")
+        self.status_label.setText("Failed to load playlist.")
+        QMessageBox.critical(self, "Error loading playlist", msg)
+
+    def on_queue_playlist(self):
+        outdir = self._outdir_or_warn()
+        if not outdir:
+            return
+        for i in range(self.playlist_list.count()):
+            self._queue_entry(self.playlist_list.item(i).data(Qt.UserRole), outdir)
+        self.status_label.setText(f"Queued {self.playlist_list.count()} entries.")
+
+    def on_playlist_item_double(self, item):
+        self.url_edit.setText(item.data(Qt.UserRole)['url'])
+        self.left_tabs.setCurrentIndex(0)
+        self.on_list_formats()
+
+    def _playlist_loading(self) -> bool:
+        return bool(self.current_playlist_worker and self.current_playlist_worker.isRunning())
+
+    def _update_cancel_btn(self):
+        busy = any(w and w.isRunning() for w in (self.current_list_worker, self.current_playlist_worker))
+        self.cancel_btn.setEnabled(busy)
+
+    # ---------- queue ----------
+    def on_job_added(self, job: DownloadJob):
+        row = QueueRow(job)
+        row.cancel_btn.clicked.connect(lambda _=False, j=job: self.download_queue.cancel(j))
+        item = QListWidgetItem()
+        item.setSizeHint(row.sizeHint())
+        self.queue_list.addItem(item)
+        self.queue_list.setItemWidget(item, row)
+        self.queue_rows[job.job_id] = (item, row)
+
+    def on_job_started(self, job: DownloadJob):
+        _, row = self.queue_rows[job.job_id]
+        row.status_label.setText("Resuming download..." if job.resumed else "Starting download...")
+
+    def on_job_progress(self, job: DownloadJob, percent: int):
+        _, row = self.queue_rows[job.job_id]
+        row.progress.setValue(percent)
+
+    def on_job_status(self, job: DownloadJob, text: str):
+        _, row = self.queue_rows[job.job_id]
+        row.status_label.setText(text)
+
+    def on_job_finished(self, job: DownloadJob, success: bool, message: str):
+        _, row = self.queue_rows[job.job_id]
+        row.set_finished(success, message)
         if success:
-            self.progress.setValue(100)
-            self.status_label.setText("Ready")
-            QMessageBox.information(self, "Download finished", message)
+            self.status_label.setText(f"Finished: {job.title}")
+        elif job.state == 'cancelled':
+            self.status_label.setText(f"Cancelled: {job.title}")
         else:
-            self.status_label.setText("Error")
-            QMessageBox.critical(self, "Download failed", message)
+            self.status_label.setText(f"Failed: {job.title}")
+        self.update_throughput()
+
+    def on_clear_finished(self):
+        for job in self.download_queue.clear_finished():
+            item, _ = self.queue_rows.pop(job.job_id)
+            self.queue_list.takeItem(self.queue_list.row(item))
+
+    def update_throughput(self):
+        running = self.download_queue.running_count()
+        pending = self.download_queue.pending_count()
+        processing = self.download_queue.processing_count()
+        if not running and not pending and not processing:
+            self.throughput_label.setText("Total: idle")
+            return
+        speed = self.download_queue.total_speed()
+        speed_str = human_readable_size(speed) + "/s" if speed else "-"
+        limit = self.bandwidth.current_global_rate()
+        if limit:
+            speed_str += f" (limit {human_readable_size(limit)}/s)"
+        text = f"Total: {speed_str} — {running} running, {pending} queued"
+        if processing:
+            text += f", {processing} merging/converting"
+        self.throughput_label.setText(text)
 
     def on_cancel(self):
-        # Cancel download worker
-        if self.current_download_worker and self.current_download_worker.isRunning():
-            self.current_download_worker.requestInterruption()
-            self.status_label.setText("Cancelling download…")
-
         # Cancel format listing worker
         if self.current_list_worker and self.current_list_worker.isRunning():
             self.current_list_worker.requestInterruption()
             self.status_label.setText("Cancelling format fetch…")
 
+        # Stop enumerating a playlist (already queued entries keep going)
+        if self.current_playlist_worker and self.current_playlist_worker.isRunning():
+            self.current_playlist_worker.requestInterruption()
+            self.status_label.setText("Stopping playlist loading…")
+
         self.cancel_btn.setEnabled(False)
 
+    def closeEvent(self, event):
+        workers = [self.current_list_worker, self.current_playlist_worker]
+        for worker in workers + self._retired_list_workers:
+            if worker and worker.isRunning():
+                worker.requestInterruption()
+                worker.wait(2000)
+        if self.icon_worker is not None:
+            # it stops between fetches, but one fetch can take THUMB_TIMEOUT per URL: wait it out
+            self.icon_worker.requestInterruption()
+            self.icon_worker.wait()
+        if self.warmup_worker is not None:
+            self.warmup_worker.wait()  # an import can't be interrupted, and a running QThread must not be destroyed
+        if self.format_cache is not None:
+            self.format_cache.close()
+        if self.thumb_store is not None:
+            self.thumb_store.close()
+        if self.control_api is not None:
+            self.control_api.stop()
+        # leave running jobs unfinished in the journal so they resume next start
+        self.download_queue.shutdown()
+        if self.job_journal is not None:
+            self.job_journal.close()
+        if self.download_archive is not None:
+            self.download_archive.close()
+        if self.metrics is not None:
+            self.metrics.close()
+        default_ydl_pool.close()
+        super().closeEvent(event)
+
 # ---------- main ----------
+def _measure_startup(win: MainWindow, marks: dict):
+    """--startup-time: print the startup milestones as JSON once yt-dlp is warm, then quit."""
+    def since_start():
+        return round(time.perf_counter() - _STARTED, 4)
+
+    def warm():
+        marks['warm_s'] = since_start()
+        print(json.dumps(marks), flush=True)
+        win.close()
+        QApplication.quit()
+
+    def interactive():
+        # first event-loop pass after show(): the window is painted and takes input
+        marks['interactive_s'] = since_start()
+        if win.warmup_worker is None or win.warmup_worker.isFinished():
+            warm()
+        else:
+            win.warmup_worker.finished.connect(warm)
+
+    QTimer.singleShot(0, interactive)
+
+
 def main():
-    app = QApplication(sys.argv)
+    multiprocessing.freeze_support()  # the post-processing pool in frozen builds
+    startup_time = '--startup-time' in sys.argv
+    marks = {'imports_s': round(time.perf_counter() - _STARTED, 4)}
+    app = QApplication([a for a in sys.argv if a != '--startup-time'])
     win = MainWindow()
+    marks['window_s'] = round(time.perf_counter() - _STARTED, 4)
     win.show()
+    if startup_time:
+        # should stay false: an eager import would put yt-dlp back on the startup path
+        marks['yt_dlp_before_show'] = 'yt_dlp' in sys.modules
+        _measure_startup(win, marks)
     sys.exit(app.exec_())
 
 
@@ -0,0 +1,331 @@
+"""
+metrics.py
+Per-job timings and counters, exported as JSON lines and Prometheus text.
+
+A JobTrace follows one listing or download: the seconds spent per phase
+(extract, thumbnail, download, merge, postprocess), the time to the first
+byte, bytes transferred, retries, the achieved throughput, and how it ended
+(ok / skipped / cancelled / failed, with the exception type rather than
+only its message). list_formats() and download() fill in what they see when
+given a trace; the caller adds post-processing times and finishes it.
+
+MetricsRecorder collects finished traces: each is appended as one JSON line
+to `jsonl_path`, and aggregated into counters and phase-time histograms that
+are written to `prom_path` (for node_exporter's textfile collector) and/or
+served at http://host:port/metrics. profile() wraps a block in cProfile and
+dumps the stats to `profile_dir` when that is set.
+"""
+
+import cProfile
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+JSONL_MAX_BYTES = 10 * 1024 * 1024
+
+# ytdl_core / postprocess timing stages -> trace phases
+STAGE_PHASES = {
+    'resolve': 'extract',
+    'download': 'download',
+    'download + merge': 'download',
+    'merge': 'merge',
+    'audio copy': 'postprocess',
+    'transcode': 'postprocess',
+    'postprocess wait': 'postprocess_wait',
+}
+
+_trace_ids = itertools.count(1)
+
+
+def describe_error(exc: BaseException) -> dict:
+    """{'type': 'HTTPStatusError', 'message': ...}; for yt-dlp's wrapped errors also the original 'cause'."""
+    error = {'type': type(exc).__name__, 'message': str(exc)}
+    exc_info = getattr(exc, 'exc_info', None)  # yt_dlp.utils.DownloadError
+    cause = exc_info[1] if exc_info and exc_info[1] is not None else exc.__cause__
+    if cause is not None and type(cause).__name__ != error['type']:
+        error['cause'] = type(cause).__name__
+    return error
+
+
+class JobTrace:
+    """Timings and counters of one job; fill in from the job's thread, then MetricsRecorder.finish() it."""
+
+    def __init__(self, kind: str, url: str):
+        self.trace_id = next(_trace_ids)
+        self.kind = kind  # 'list' or 'download'
+        self.url = url
+        self.started = time.time()
+        self.phases = {}
+        self.first_byte = None  # seconds from the start of the job
+        self.bytes = 0
+        self.retries = 0
+        self.retry_reasons = []
+        self.attrs = {}  # video_id, format_id, cached, ...
+        self.outcome = None
+        self.error = None
+        self.duration = None
+        self._t0 = time.monotonic()
+        self._trackers = []
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - t0)
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_timings(self, timings: dict):
+        """Fold a DownloadResult / PostTask {stage: seconds} dict into the phases."""
+        for stage, seconds in timings.items():
+            self.add_phase(STAGE_PHASES.get(stage, stage), seconds)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._t0
+
+    def track(self, tracker):
+        """Take the first byte time and bytes transferred from a progress.ProgressTracker on finish()."""
+        self._trackers.append(tracker)
+
+    def _collect(self):
+        for tracker in self._trackers:
+            self.bytes += tracker.transferred
+            if tracker.first_byte_at is not None:
+                first_byte = tracker.first_byte_at - self._t0
+                self.first_byte = first_byte if self.first_byte is None else min(self.first_byte, first_byte)
+        self._trackers = []
+
+    def retry(self, reason: str = ''):
+        self.retries += 1
+        if reason and len(self.retry_reasons) < 20:
+            self.retry_reasons.append(reason)
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """Bytes per second over the download phase."""
+        seconds = self.phases.get('download')
+        return self.bytes / seconds if self.bytes and seconds else None
+
+    def finish(self, outcome: str, error: Optional[BaseException] = None):
+        self._collect()
+        self.outcome = outcome
+        if error is not None:
+            self.error = describe_error(error)
+        self.duration = self.elapsed()
+
+    def as_dict(self) -> dict:
+        record = {'trace_id': self.trace_id, 'kind': self.kind, 'url': self.url, 'started': round(self.started, 3),
+                  'duration': round(self.duration if self.duration is not None else self.elapsed(), 3),
+                  'outcome': self.outcome, 'phases': {k: round(v, 3) for k, v in self.phases.items()},
+                  'first_byte': round(self.first_byte, 3) if self.first_byte is not None else None,
+                  'bytes': self.bytes, 'retries': self.retries}
+        throughput = self.throughput
+        record['throughput'] = round(throughput) if throughput else None
+        if self.retry_reasons:
+            record['retry_reasons'] = self.retry_reasons
+        if self.error is not None:
+            record['error'] = self.error
+        record.update(self.attrs)
+        return record
+
+    def __repr__(self):
+        return f"JobTrace({self.kind!r}, {self.url!r}, outcome={self.outcome!r})"
+
+
+class RetryLogger:
+    """yt-dlp `logger` that counts its "Retrying (n/m)" warnings into a trace and prints nothing."""
+
+    def __init__(self, trace: JobTrace):
+        self.trace = trace
+
+    def debug(self, msg):
+        pass
+
+    info = debug
+
+    def warning(self, msg):
+        if 'Retrying' in msg:
+            self.trace.retry(msg.split('] ', 1)[-1][:200])
+
+    def error(self, msg):
+        pass
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRecorder:
+    def __init__(self, jsonl_path: Optional[str] = None, prom_path: Optional[str] = None,
+                 profile_dir: Optional[str] = None, jsonl_max_bytes: int = JSONL_MAX_BYTES):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.profile_dir = profile_dir
+        self.jsonl_max_bytes = jsonl_max_bytes
+        self._lock = threading.Lock()
+        self._jobs = {}  # (kind, outcome) -> count
+        self._errors = {}  # exception type -> count
+        self._phases = {}  # (kind, phase) -> _Histogram
+        self._first_byte = _Histogram()
+        self._bytes = 0
+        self._retries = 0
+        self._active = 0
+        self._server = None
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def start(self, kind: str, url: str) -> JobTrace:
+        with self._lock:
+            self._active += 1
+        return JobTrace(kind, url)
+
+    def finish(self, trace: JobTrace, outcome: str, error: Optional[BaseException] = None):
+        """Finish `trace`, aggregate it and write it out (export errors are swallowed)."""
+        trace.finish(outcome, error)
+        with self._lock:
+            self._active -= 1
+            key = (trace.kind, outcome)
+            self._jobs[key] = self._jobs.get(key, 0) + 1
+            if trace.error is not None:
+                self._errors[trace.error['type']] = self._errors.get(trace.error['type'], 0) + 1
+            for phase, seconds in trace.phases.items():
+                self._phases.setdefault((trace.kind, phase), _Histogram()).observe(seconds)
+            if trace.first_byte is not None:
+                self._first_byte.observe(trace.first_byte)
+            self._bytes += trace.bytes
+            self._retries += trace.retries
+        try:
+            if self.jsonl_path:
+                self._append_jsonl(trace.as_dict())
+            if self.prom_path:
+                self.write_prometheus(self.prom_path)
+        except OSError:
+            pass  # metrics must never fail a download
+
+    def _append_jsonl(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                if os.path.getsize(self.jsonl_path) > self.jsonl_max_bytes:
+                    os.replace(self.jsonl_path, self.jsonl_path + '.1')
+            except OSError:
+                pass
+            with open(self.jsonl_path, 'a', encoding='utf-8') as fh:
+                fh.write(line)
+
+    def prometheus_text(self) -> str:
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, hist):
+            prefix = ','.join(f'{k}="{v}"' for k, v in labels)
+            sep = ',' if prefix else ''
+            for bound, count in zip(BUCKETS, hist.counts):
+                lines.append(f'{name}_bucket{{{prefix}{sep}le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{{prefix}{sep}le="+Inf"}} {hist.count}')
+            suffix = f"{{{prefix}}}" if prefix else ''
+            lines.append(f'{name}_sum{suffix} {hist.sum:.6f}')
+            lines.append(f'{name}_count{suffix} {hist.count}')
+
+        with self._lock:
+            header('ytdl_jobs_total', 'counter', "Finished jobs by kind and outcome.")
+            for (kind, outcome), count in sorted(self._jobs.items()):
+                lines.append(f'ytdl_jobs_total{{kind="{kind}",outcome="{outcome}"}} {count}')
+            header('ytdl_jobs_active', 'gauge', "Jobs started and not yet finished.")
+            lines.append(f'ytdl_jobs_active {self._active}')
+            header('ytdl_errors_total', 'counter', "Failed jobs by exception type.")
+            for error_type, count in sorted(self._errors.items()):
+                lines.append(f'ytdl_errors_total{{type="{error_type}"}} {count}')
+            header('ytdl_downloaded_bytes_total', 'counter', "Bytes transferred by finished jobs.")
+            lines.append(f'ytdl_downloaded_bytes_total {self._bytes}')
+            header('ytdl_retries_total', 'counter', "Retries (yt-dlp retries and fallbacks) of finished jobs.")
+            lines.append(f'ytdl_retries_total {self._retries}')
+            header('ytdl_phase_seconds', 'histogram', "Time spent per job phase.")
+            for (kind, phase), hist in sorted(self._phases.items()):
+                histogram('ytdl_phase_seconds', (('kind', kind), ('phase', phase)), hist)
+            header('ytdl_first_byte_seconds', 'histogram', "Time from job start to the first media byte.")
+            histogram('ytdl_first_byte_seconds', (), self._first_byte)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            fh.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """Serve prometheus_text() at http://host:port/metrics from a daemon thread; returns the bound port."""
+        recorder = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = recorder.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics-http").start()
+        return self._server.server_address[1]
+
+    @contextmanager
+    def profile(self, name: str):
+        """cProfile the block (the calling thread only) into profile_dir/<name>-<time>-<thread>.prof."""
+        if not self.profile_dir:
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active (Python 3.12+ allows only one at a time)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(self.profile_dir, f"{name}-{int(time.time() * 1000)}-{threading.get_ident()}.prof")
+            try:
+                profiler.dump_stats(path)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,205 @@
+"""
+output_layout.py
+Where downloads go in the output folder, and a record of where each one went.
+
+One folder with a hundred thousand files is slow to list, sync and back
+up. LAYOUTS are output templates that spread an archive out instead:
+'sharded' puts each video two levels deep under the leading hex digits of
+the SHA-256 of its ID (65536 evenly filled folders whatever the titles),
+'channel' and 'date' group by uploader and upload month. Every layout keeps
+"[ID]" in the file name, so DownloadArchive.rebuild() still finds them.
+
+When cataloguing, every finished file gets a JSON sidecar next to it
+(format, codecs, resolution, and the size and SHA-256 of the file and of
+the streams it was made from) and a row in <outdir>/.ytdl-index.sqlite, so
+"where did video X go" is one primary-key lookup instead of a walk of the
+tree. OutputIndex.rebuild() recovers the index from the sidecars.
+
+Does not import PyQt5 or yt-dlp; the post-processing processes load it.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+# 'flat' is ytdl_core.DEFAULT_TEMPLATE
+LAYOUTS = {
+    'flat': "%(title)s [%(id)s].%(ext)s",
+    'sharded': "%(id_hash.0:2)s/%(id_hash.2:4)s/%(title)s [%(id)s].%(ext)s",
+    'channel': "%(channel,uploader|Unknown channel)s/%(title)s [%(id)s].%(ext)s",
+    'date': "%(upload_date>%Y|undated)s/%(upload_date>%m|00)s/%(title)s [%(id)s].%(ext)s",
+    'channel-date': "%(channel,uploader|Unknown channel)s/%(upload_date>%Y|undated)s/%(title)s [%(id)s].%(ext)s",
+}
+
+# (label, layout) offered in the GUI
+LAYOUT_CHOICES = [
+    ("Flat (one folder)", 'flat'),
+    ("Sharded by video ID", 'sharded'),
+    ("By channel", 'channel'),
+    ("By upload month", 'date'),
+    ("By channel and year", 'channel-date'),
+]
+
+CHECKSUM = 'sha256'
+SIDECAR_SUFFIX = '.meta.json'
+INDEX_NAME = '.ytdl-index.sqlite'
+READ_SIZE = 1024 * 1024
+
+# what a sidecar keeps of yt-dlp's info dict, for the file and for each stream
+_VIDEO_FIELDS = ('id', 'title', 'channel', 'channel_id', 'uploader', 'upload_date', 'duration', 'webpage_url',
+                 'format_id', 'format_note', 'ext', 'vcodec', 'acodec', 'width', 'height', 'fps',
+                 'dynamic_range', 'tbr', 'abr', 'asr')
+_STREAM_FIELDS = ('format_id', 'ext', 'vcodec', 'acodec', 'width', 'height', 'fps', 'tbr', 'abr',
+                  'filesize', CHECKSUM)
+
+
+def template_for(layout: str) -> str:
+    try:
+        return LAYOUTS[layout]
+    except KeyError:
+        raise ValueError(f"unknown layout {layout!r} (choose from {', '.join(LAYOUTS)})")
+
+
+def id_hash(video_id: str) -> str:
+    return hashlib.sha256(str(video_id).encode('utf-8')).hexdigest()
+
+
+def add_layout_fields(info: dict) -> dict:
+    """Add the computed template fields (id_hash) to a yt-dlp info dict."""
+    if info.get('id') and 'id_hash' not in info:
+        info['id_hash'] = id_hash(info['id'])
+    return info
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.new(CHECKSUM)
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sidecar_path(path: str) -> str:
+    return os.path.splitext(path)[0] + SIDECAR_SUFFIX
+
+
+def describe(info: dict, streams=()) -> dict:
+    """The sidecar record for a download, from yt-dlp's info dict and its component streams
+    (ytdl_core's component dicts, carrying the checksum SegmentedDownloader computed, if any)."""
+    record = {k: info[k] for k in _VIDEO_FIELDS if info.get(k) is not None}
+    record['streams'] = [{k: s[k] for k in _STREAM_FIELDS if s.get(k) is not None} for s in streams]
+    return record
+
+
+def record_output(path: str, record: dict, root: str) -> dict:
+    """Write `path`'s sidecar and index it under `root` (the output folder); returns the full record.
+    A record[CHECKSUM] taken while the file was written is kept, else the file is read back once."""
+    record = dict(record, ext=os.path.splitext(path)[1].lstrip('.') or record.get('ext'))
+    record['path'] = os.path.relpath(path, root)
+    record['size'] = os.path.getsize(path)
+    record[CHECKSUM] = record.get(CHECKSUM) or file_checksum(path)
+    record['cataloged'] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    sidecar = sidecar_path(path)
+    tmp = sidecar + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(record, fh, indent=2, ensure_ascii=False)
+    os.replace(tmp, sidecar)
+    if record.get('id'):
+        open_index(root).add(record['id'], path, record.get('format_id'), record['size'], record[CHECKSUM])
+    return record
+
+
+class OutputIndex:
+    """video ID -> where it was saved, for one output folder (paths are stored relative to it)."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(self.root, INDEX_NAME)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        # the post-processing processes write to the same file
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id  TEXT PRIMARY KEY,
+                path      TEXT NOT NULL,
+                format_id TEXT,
+                size      INTEGER,
+                sha256    TEXT
+            ) WITHOUT ROWID""")
+        self._db.commit()
+
+    def add(self, video_id: str, path: str, format_id: Optional[str] = None, size: Optional[int] = None,
+            sha256: Optional[str] = None):
+        self.add_many([(video_id, path, format_id, size, sha256)])
+
+    def add_many(self, entries):
+        """Add (video_id, path, format_id, size, sha256) tuples in one transaction."""
+        rows = [(video_id, os.path.relpath(os.path.abspath(path), self.root), format_id, size, sha256)
+                for video_id, path, format_id, size, sha256 in entries]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO videos (video_id, path, format_id, size, sha256)"
+                                 " VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def lookup(self, video_id: str) -> Optional[dict]:
+        """{'path', 'sidecar', 'format_id', 'size', 'sha256'} for `video_id`, or None; paths are absolute."""
+        with self._lock:
+            row = self._db.execute("SELECT path, format_id, size, sha256 FROM videos WHERE video_id = ?",
+                                   (video_id,)).fetchone()
+        if row is None:
+            return None
+        path = os.path.join(self.root, row[0])
+        return {'path': path, 'sidecar': sidecar_path(path), 'format_id': row[1], 'size': row[2], 'sha256': row[3]}
+
+    def remove(self, video_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def rebuild(self) -> int:
+        """Index every sidecar under the folder whose file still exists; returns how many were added."""
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(SIDECAR_SUFFIX):
+                    continue
+                try:
+                    with open(os.path.join(dirpath, name), encoding='utf-8') as fh:
+                        record = json.load(fh)
+                except (OSError, ValueError):
+                    continue
+                # next to its sidecar, even if the tree was moved since
+                path = os.path.join(dirpath, os.path.basename(record.get('path') or ''))
+                if record.get('id') and record.get('path') and os.path.isfile(path):
+                    entries.append((record['id'], path, record.get('format_id'), record.get('size'),
+                                    record.get(CHECKSUM)))
+        self.add_many(entries)
+        return len(entries)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def open_index(root: str) -> OutputIndex:
+    """The OutputIndex of `root`, opened once per process."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = OutputIndex(root)
+        return index
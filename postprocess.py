@@ -0,0 +1,220 @@
+"""
+postprocess.py
+Merge / transcode stage, run in a process pool outside the download slots.
+
+Once a job's streams are on disk, ytdl_core.download(defer_postprocess=True)
+hands back a PostTask instead of running ffmpeg itself. The download queue
+submits it to a PostProcessPool (one worker process per CPU core, so merges
+and MP3 conversions of different jobs run in parallel) and frees the
+download slot for the next job straight away.
+
+Audio extraction stream-copies instead of re-encoding when the downloaded
+stream already has the target codec (see can_copy_audio), which turns the
+CPU-bound part of a batch audio rip into a plain remux for most files.
+
+A task with `catalog` set also writes its output's sidecar and index entry
+(output_layout.record_output) once ffmpeg is done, hashing the file while
+it is still in the page cache.
+
+This module imports nothing heavy; it is what the pool processes load.
+"""
+
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from output_layout import record_output
+
+POST_WORKERS = os.cpu_count() or 2
+
+# yt-dlp's FFmpegExtractAudio codec names -> (ffmpeg encoder, file extension)
+AUDIO_CODECS = {
+    'mp3': ('libmp3lame', 'mp3'),
+    'aac': ('aac', 'm4a'),
+    'm4a': ('aac', 'm4a'),
+    'opus': ('libopus', 'opus'),
+    'vorbis': ('libvorbis', 'ogg'),
+    'flac': ('flac', 'flac'),
+    'wav': ('pcm_s16le', 'wav'),
+}
+
+# yt-dlp acodec prefixes ('mp4a.40.2', 'opus', ...) that each target codec can copy
+_COPYABLE = {
+    'mp3': ('mp3',),
+    'aac': ('mp4a', 'aac'),
+    'm4a': ('mp4a', 'aac'),
+    'opus': ('opus',),
+    'vorbis': ('vorbis',),
+    'flac': ('flac',),
+}
+COPY_BITRATE_SLACK = 1.1  # copy a source up to 10% above the preset's bitrate
+
+# (label, codec, quality in kbps) offered for audio-only jobs
+AUDIO_PRESETS = [
+    ("MP3 320 kbps", 'mp3', '320'),
+    ("MP3 192 kbps", 'mp3', '192'),
+    ("MP3 128 kbps", 'mp3', '128'),
+    ("Opus 160 kbps", 'opus', '160'),
+    ("Opus 96 kbps", 'opus', '96'),
+    ("M4A (AAC) 256 kbps", 'm4a', '256'),
+    ("M4A (AAC) 128 kbps", 'm4a', '128'),
+]
+
+
+def parse_audio(text: str) -> tuple:
+    """'opus', 'mp3:320', 'm4a:128' -> (codec, kbps); the default bitrate is 192."""
+    codec, _, quality = text.lower().partition(':')
+    if codec not in AUDIO_CODECS:
+        raise ValueError(f"unknown audio format {codec!r} (choose from {', '.join(sorted(AUDIO_CODECS))})")
+    if quality and not quality.isdigit():
+        raise ValueError(f"bad audio bitrate {quality!r} (expected kbps, e.g. mp3:192)")
+    return codec, quality or '192'
+
+
+def _run_ffmpeg(args, what):
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + args
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg {what} failed: {result.stderr.decode(errors='replace').strip()}")
+
+
+def _remove_all(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def ffmpeg_merge(paths, final_path, remove_inputs=True):
+    """Stream-copy the given inputs into one container with ffmpeg."""
+    base, ext = os.path.splitext(final_path)
+    tmp_path = f"{base}.temp{ext}"
+    args = []
+    for path in paths:
+        args += ['-i', path]
+    for i in range(len(paths)):
+        args += ['-map', str(i)]
+    _run_ffmpeg(args + ['-c', 'copy', tmp_path], "merge")
+    os.replace(tmp_path, final_path)
+    if remove_inputs:
+        _remove_all(paths)
+
+
+def audio_output_path(src: str, codec: str) -> str:
+    return os.path.splitext(src)[0] + '.' + AUDIO_CODECS.get(codec, (None, codec))[1]
+
+
+def can_copy_audio(acodec: Optional[str], abr, codec: str, quality=None) -> bool:
+    """True if a stream with yt-dlp's `acodec`/`abr` can go into `codec` output without re-encoding.
+
+    A bitrate preset only forces a re-encode when the source is clearly above it.
+    """
+    if not acodec or not any(acodec.lower().startswith(p) for p in _COPYABLE.get(codec, ())):
+        return False
+    try:
+        target = float(quality) if quality else 0
+    except ValueError:
+        return False
+    if 0 < target < 10:  # VBR quality level: no bitrate to compare with
+        return False
+    return not (target and abr and float(abr) > target * COPY_BITRATE_SLACK)
+
+
+def extract_audio(src, dest, codec='mp3', quality='192', remove_input=True, copy=False):
+    """Transcode the audio of `src` into `dest` (yt-dlp's preferredquality: kbps, or 0-9 for VBR).
+
+    With `copy`, the audio stream is remuxed as-is instead.
+    """
+    base, ext = os.path.splitext(dest)
+    tmp_path = f"{base}.temp{ext}"
+    if copy:
+        args = ['-i', src, '-vn', '-c:a', 'copy']
+    else:
+        args = ['-i', src, '-vn', '-c:a', AUDIO_CODECS.get(codec, (codec, codec))[0]]
+        if quality:
+            q = float(quality)
+            args += ['-q:a', str(int(q))] if q < 10 else ['-b:a', f"{int(q)}k"]
+    _run_ffmpeg(args + [tmp_path], "audio copy" if copy else "audio conversion")
+    os.replace(tmp_path, dest)
+    if remove_input and os.path.abspath(src) != os.path.abspath(dest):
+        _remove_all([src])
+
+
+class PostTask:
+    """A merge or audio extraction still to run; plain attributes so it pickles into the pool."""
+
+    def __init__(self, kind: str, inputs: list, output: str, codec: Optional[str] = None,
+                 quality: Optional[str] = None, copy: bool = False):
+        self.kind = kind  # 'merge' or 'audio'
+        self.inputs = list(inputs)
+        self.output = output
+        self.codec = codec
+        self.quality = quality
+        self.copy = copy  # audio: stream-copy, the source already has the target codec
+        self.catalog = None  # (sidecar record, output folder) to catalogue the output under
+        self.metadata = None  # the record written, once run() has
+
+    @property
+    def phase(self) -> str:
+        """The ProgressStats / journal phase this task runs in."""
+        return 'merging' if self.kind == 'merge' else 'postprocessing'
+
+    @property
+    def label(self) -> str:
+        if self.kind == 'merge':
+            return "Merging streams..."
+        if self.copy:
+            return f"Extracting {(self.codec or 'audio').upper()} (no re-encoding)..."
+        return f"Converting to {(self.codec or 'audio').upper()}..."
+
+    def run(self) -> dict:
+        """Run the task here; returns {stage: seconds}."""
+        t0 = time.perf_counter()
+        if self.kind == 'merge':
+            ffmpeg_merge(self.inputs, self.output)
+        elif self.kind == 'audio':
+            extract_audio(self.inputs[0], self.output, self.codec or 'mp3', self.quality, copy=self.copy)
+        else:
+            raise ValueError(f"unknown post-processing task {self.kind!r}")
+        stage = 'merge' if self.kind == 'merge' else ('audio copy' if self.copy else 'transcode')
+        timings = {stage: time.perf_counter() - t0}
+        if self.catalog is not None:
+            t0 = time.perf_counter()
+            self.metadata = record_output(self.output, *self.catalog)
+            timings['checksum'] = time.perf_counter() - t0
+        return timings
+
+    def __repr__(self):
+        return f"PostTask({self.kind!r}, {self.inputs!r}, {self.output!r})"
+
+
+def run_task(task: PostTask) -> dict:
+    return task.run()
+
+
+class PostProcessPool:
+    """Process pool for PostTasks, started on first use."""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or POST_WORKERS
+        self._executor = None
+        self._lock = threading.Lock()  # download threads submit concurrently
+
+    def submit(self, task: PostTask) -> Future:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the parent runs Qt and download threads
+                self._executor = ProcessPoolExecutor(self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor.submit(run_task, task)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
@@ -0,0 +1,153 @@
+"""
+progress.py
+Coalesced, smoothed download progress.
+
+Downloaders call ProgressTracker.update() with raw byte counts as often as
+they like; that only stores numbers. At most once per `interval` the tracker
+takes a sample, folds the byte rate into an exponentially weighted moving
+average (so speed/ETA don't jump around with every chunk), and hands a
+ProgressStats snapshot to `on_progress` (plus its status line to
+`on_status`). Phase changes (merging, done, ...) are always delivered
+immediately. For metrics it also notes when the first byte arrived and
+how many bytes were transferred (downloaders report those with count(),
+as resumed bytes can't be told apart in the cumulative update() counts).
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+UPDATE_INTERVAL = 0.25
+EWMA_ALPHA = 0.3
+
+
+def human_readable_size(num):
+    if not num:
+        return "Unknown"
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if num < 1024.0:
+            return f"{num:.2f} {unit}"
+        num /= 1024.0
+    return f"{num:.2f} PB"
+
+
+class ProgressStats:
+    """One coalesced progress sample of a job."""
+    __slots__ = ('phase', 'percent', 'downloaded', 'total', 'speed', 'eta', 'elapsed', 'message', '_text')
+
+    def __init__(self, phase='downloading', percent=None, downloaded=0, total=None,
+                 speed=0.0, eta=None, elapsed=0.0, message=None):
+        self.phase = phase
+        self.percent = percent
+        self.downloaded = downloaded
+        self.total = total
+        self.speed = speed
+        self.eta = eta
+        self.elapsed = elapsed
+        self.message = message
+        self._text = None
+
+    def as_dict(self) -> dict:
+        return {'phase': self.phase, 'percent': self.percent, 'downloaded': self.downloaded,
+                'total': self.total, 'speed': self.speed, 'eta': self.eta,
+                'elapsed': round(self.elapsed, 3)}
+
+    def status_text(self) -> str:
+        """Human-readable status line, formatted on first use."""
+        if self._text is None:
+            self._text = self.message or self._format()
+        return self._text
+
+    def _format(self) -> str:
+        speed_str = human_readable_size(self.speed) + "/s" if self.speed else ""
+        if self.total:
+            eta_str = f"ETA: {self.eta}s" if self.eta else ""
+            return (f"Downloading: {self.percent}% — {human_readable_size(self.downloaded)} / "
+                    f"{human_readable_size(self.total)} {speed_str} {eta_str}").rstrip()
+        return f"Downloading: {human_readable_size(self.downloaded)} {speed_str}".rstrip()
+
+    def __repr__(self):
+        return f"ProgressStats({self.as_dict()!r})"
+
+
+class ProgressTracker:
+    def __init__(self, on_progress: Optional[Callable[[ProgressStats], None]] = None,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 interval: float = UPDATE_INTERVAL, alpha: float = EWMA_ALPHA):
+        self.on_progress = on_progress or (lambda stats: None)
+        self.on_status = on_status or (lambda s: None)
+        self.interval = interval
+        self.alpha = alpha
+        self.stats = ProgressStats()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._downloaded = 0
+        self._total = None
+        self._skipped = 0
+        self._sample_time = self._started
+        self._sample_bytes = None
+        self._speed = None
+        self.first_byte_at: Optional[float] = None  # time.monotonic() of the first byte
+        self.transferred = 0
+
+    def count(self, n: int):
+        """Count `n` bytes received over the network."""
+        with self._lock:
+            self.transferred += n
+            if self.first_byte_at is None:
+                self.first_byte_at = time.monotonic()
+
+    def skip(self, n: int):
+        """Count bytes that were already on disk (resumed); they don't add to the speed."""
+        with self._lock:
+            self._downloaded += n
+            self._skipped += n
+
+    def update(self, downloaded: int, total: Optional[int] = None):
+        """Record the current byte count; emits only if the last sample is `interval` old."""
+        with self._lock:
+            self._downloaded = downloaded
+            if total:
+                self._total = total
+            now = time.monotonic()
+            if self.first_byte_at is None:
+                self.first_byte_at = now
+            if self._sample_bytes is None:
+                # the first count may include bytes resumed from disk; measure from here
+                self._sample_time, self._sample_bytes, self._skipped = now, downloaded, 0
+                return
+            if now - self._sample_time < self.interval:
+                return
+            stats = self._sample(now, measure=True)
+        self._emit(stats)
+
+    def report(self, phase: str, message: Optional[str] = None, percent: Optional[int] = None):
+        """Emit a phase change (or a final download sample) right away."""
+        with self._lock:
+            stats = self._sample(time.monotonic(), phase, message, percent)
+        self._emit(stats)
+
+    def _sample(self, now, phase='downloading', message=None, percent=None, measure=False):
+        if measure:
+            # only fixed-interval samples feed the average; forced reports would spike it
+            delta = self._downloaded - (self._sample_bytes or 0) - self._skipped
+            if delta < 0:
+                # yt-dlp restarts its byte count for each file of a multi-file download
+                delta = self._downloaded
+            rate = delta / (now - self._sample_time)
+            self._speed = rate if self._speed is None else self.alpha * rate + (1 - self.alpha) * self._speed
+            self._sample_time, self._sample_bytes, self._skipped = now, self._downloaded, 0
+
+        total = self._total
+        downloaded = min(self._downloaded, total) if total else self._downloaded
+        speed = (self._speed or 0.0) if phase == 'downloading' else 0.0
+        if percent is None and total:
+            percent = max(0, min(100, int(downloaded * 100 / total)))
+        eta = int((total - downloaded) / speed) if total and speed else None
+        self.stats = ProgressStats(phase, percent, downloaded, total, speed, eta,
+                                   now - self._started, message)
+        return self.stats
+
+    def _emit(self, stats: ProgressStats):
+        self.on_progress(stats)
+        self.on_status(stats.status_text())
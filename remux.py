@@ -0,0 +1,204 @@
+"""
+remux.py
+Merge video+audio while they download, without intermediate files.
+
+The usual path writes every component stream to disk, has ffmpeg read them
+back and write the merged file, then deletes the components: for an 8K
+video that is two to three times its size in disk I/O, and the merge only
+starts once the last byte has arrived. StreamingRemuxer instead opens one
+pipe per component, starts ffmpeg with `-c copy` reading from those pipes,
+and writes each stream's bytes into its pipe as they come off the network.
+The merged file is written once, in a single pass, and is complete a moment
+after the download is. ffmpeg picks its container from the output name's
+extension (yt-dlp's prepare_filename: .mkv with the default
+merge_output_format).
+
+Each stream is fetched in order as consecutive byte ranges (chunk_size, on
+one connection per stream), since a pipe can only be filled front to back.
+A dropped connection is retried (retry.RetryPolicy) from the byte the pipe
+got to; once the retries are used up there is nothing to resume from, and
+callers fall back to the file-based path. POSIX only (pass_fds).
+"""
+
+import os
+import subprocess
+import threading
+from typing import Callable, Optional
+
+from http_pool import HTTPStatusError
+from retry import CircuitBreaker, RetryPolicy, call_with_retries, default_breaker, default_policy, host_of
+from segmented import DEFAULT_CHUNK_SIZE, READ_SIZE, SegmentedDownloader, _connect, _drop
+
+SUPPORTED = os.name == 'posix'
+
+
+class RemuxFailed(Exception):
+    """ffmpeg could not merge the piped streams (e.g. an input that isn't streamable)."""
+
+
+class _PipeClosed(Exception):
+    """ffmpeg stopped reading a pipe (it failed or finished early); its stderr says why.
+    Not a BrokenPipeError, which would count as a retryable connection error."""
+
+
+class StreamingRemuxer:
+    def __init__(self, streams: list, output: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 on_bytes: Optional[Callable[[object, int], None]] = None,
+                 is_cancelled: Optional[Callable[[], bool]] = None,
+                 throttle: Optional[Callable[[int], None]] = None, timeout: float = 20,
+                 retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 on_retry: Optional[Callable[[str], None]] = None):
+        """`streams` is a list of (key, url, headers); on_bytes(key, n) is called per read."""
+        self.streams = streams
+        self.output = output
+        self.chunk_size = max(READ_SIZE, int(chunk_size))
+        self.on_bytes = on_bytes or (lambda key, n: None)
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.throttle = throttle
+        self.timeout = timeout
+        self.retry = retry or default_policy
+        self.breaker = breaker or default_breaker
+        self.on_retry = on_retry
+        self.sizes = {}
+        self._error = None
+        self._lock = threading.Lock()
+
+    def probe(self) -> dict:
+        """Resolve redirects and sizes; raises segmented.SegmentedUnsupported without range support."""
+        resolved = []
+        for key, url, headers in self.streams:
+            probe = SegmentedDownloader(url, os.devnull, headers=headers, timeout=self.timeout, retry=self.retry,
+                                        breaker=self.breaker, on_retry=self.on_retry, is_cancelled=self.is_cancelled)
+            self.sizes[key] = probe.probe()
+            resolved.append((key, probe.url, probe.headers))
+        self.streams = resolved
+        return dict(self.sizes)
+
+    def run(self) -> int:
+        """Download and merge into `output`; returns the size written. Raises on error or cancellation."""
+        if not self.sizes:
+            self.probe()
+        base, ext = os.path.splitext(self.output)
+        tmp_path = f"{base}.temp{ext}"
+        pipes = [os.pipe() for _ in self.streams]
+        read_fds = [r for r, _ in pipes]
+        # -xerror: a demuxing error (e.g. an MP4 with its index at the end) must not yield an empty file
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-xerror', '-y']
+        for fd in read_fds:
+            cmd += ['-i', f'pipe:{fd}']
+        for i in range(len(read_fds)):
+            cmd += ['-map', str(i)]
+        cmd += ['-c', 'copy', tmp_path]
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, pass_fds=read_fds)
+        except Exception:
+            for r, w in pipes:
+                os.close(r)
+                os.close(w)
+            raise
+        for fd in read_fds:
+            os.close(fd)  # ffmpeg holds its own copies
+        # read as it comes: ffmpeg blocked on a full stderr pipe would stop reading its inputs, and the feeders with it
+        errors = []
+        drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True, name="remux-stderr")
+        drain.start()
+
+        threads = [threading.Thread(target=self._feed, args=(key, url, headers, w), daemon=True,
+                                    name=f"remux-{key}")
+                   for (key, url, headers), (_, w) in zip(self.streams, pipes)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self._error is not None or self.is_cancelled():
+            proc.kill()
+        proc.wait()
+        drain.join()
+        proc.stderr.close()
+        stderr = b''.join(errors)
+
+        if self.is_cancelled():
+            _remove(tmp_path)
+            raise InterruptedError("Cancelled by user")
+        if self._error is not None and not isinstance(self._error, _PipeClosed):
+            _remove(tmp_path)
+            raise self._error
+        if proc.returncode != 0 or self._error is not None:
+            _remove(tmp_path)
+            lines = stderr.decode(errors='replace').strip().splitlines()
+            raise RemuxFailed(lines[-1] if lines else f"ffmpeg exited with {proc.returncode}")
+        os.replace(tmp_path, self.output)
+        return os.path.getsize(self.output)
+
+    def _stopping(self) -> bool:
+        return self._error is not None or self.is_cancelled()
+
+    def _feed(self, key, url, headers, fd):
+        """Fetch one stream as consecutive ranges and write it into ffmpeg's pipe."""
+        total = self.sizes[key]
+        link = {}
+        try:
+            span = [0, -1]  # the range being fetched; _fetch_range moves span[0] on as the pipe is fed
+            while span[0] < total:
+                if self._stopping():
+                    return
+                span[1] = min(span[0] + self.chunk_size, total) - 1
+                start = span[0]
+                resp = call_with_retries(lambda: self._fetch_range(link, key, url, headers, span, fd), self.retry,
+                                         host_of(url), self.breaker, self.on_retry, self._stopping,
+                                         f"{key} range {start}-{span[1]}")
+                if resp is None:
+                    return
+                if resp.will_close:
+                    _drop(link)
+        except Exception as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+        finally:
+            _drop(link)
+            os.close(fd)  # EOF for ffmpeg
+
+    def _fetch_range(self, link, key, url, headers, span, fd):
+        if not link:
+            link['conn'], link['path'] = _connect(url, self.timeout)
+        end = span[1]
+        try:
+            link['conn'].request('GET', link['path'], headers=dict(headers, Range=f'bytes={span[0]}-{end}'))
+            resp = link['conn'].getresponse()
+            if resp.status != 206:
+                resp.read()
+                raise HTTPStatusError(resp.status, url)
+            while span[0] <= end:
+                if self._stopping():
+                    return None
+                data = resp.read(min(READ_SIZE, end - span[0] + 1))
+                if not data:
+                    raise ConnectionError(f"connection closed at byte {span[0]} of {key}")
+                if self.throttle is not None:
+                    self.throttle(len(data))
+                try:
+                    _write_all(fd, data)
+                except BrokenPipeError as e:
+                    raise _PipeClosed(str(e)) from e
+                span[0] += len(data)
+                self.on_bytes(key, len(data))
+        except Exception:
+            _drop(link)
+            raise
+        return resp
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
@@ -0,0 +1,193 @@
+"""
+retry.py
+Retries with exponential backoff and jitter, and per-host circuit breaking.
+
+Downloads fail transiently all the time: a CDN node resets a connection, a
+read stalls past the timeout, a server answers 503 for a few seconds.
+call_with_retries() runs a step (one byte range, one probe) again when it
+fails like that, sleeping a random 0..min(max_delay, base_delay * 2**n)
+before the n-th retry ("full jitter", so parallel connections that failed
+together don't come back together). Anything else (404, 403, a full disk,
+a cancel) is raised at once; so is the last error once `attempts` are used.
+
+A CircuitBreaker counts consecutive failures per host. Once a host reaches
+`threshold` it is "open": no more requests pile onto it. A caller that can
+move to another format / host (fail_fast) gets CircuitOpen straight away;
+one that can't waits out the cooldown instead of failing, so a burst of
+errors slows a download down but doesn't end it. After `cooldown` seconds
+one trial request is let through; success closes the circuit, failure
+opens it again.
+"""
+
+import http.client
+import random
+import socket
+import threading
+import time
+import urllib.parse
+from typing import Callable, Optional
+
+from http_pool import HTTPStatusError
+
+# worth asking again: timeouts, rate limiting, server-side trouble
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class CircuitOpen(Exception):
+    """The host has failed too often lately; not tried until its cooldown ends."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host} is failing; not retrying it for {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether `exc` looks transient (dropped / stalled connection, 5xx, 429)."""
+    if isinstance(exc, HTTPStatusError):
+        return exc.status in RETRYABLE_STATUS
+    return isinstance(exc, (ConnectionError, TimeoutError, socket.timeout, http.client.HTTPException))
+
+
+def host_of(url: str) -> str:
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+
+def describe(exc: BaseException) -> str:
+    return f"{type(exc).__name__}: {exc}"[:200]
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 6, base_delay: float = 0.5, max_delay: float = 30.0,
+                 seed: Optional[int] = None):
+        """`attempts` tries in all (1 = no retries)."""
+        self.attempts = max(1, int(attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def delay(self, n: int) -> float:
+        """Seconds to wait before retry number `n` (0-based); also a yt-dlp retry_sleep_functions entry."""
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** min(n, 30)))
+
+    def sleep(self, retry: int, is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
+        """Wait out delay(retry); False if `is_cancelled()` turned true meanwhile."""
+        return _sleep(self.delay(retry), is_cancelled)
+
+    def __repr__(self):
+        return f"RetryPolicy(attempts={self.attempts}, base_delay={self.base_delay}, max_delay={self.max_delay})"
+
+
+def _sleep(seconds: float, is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
+    deadline = time.monotonic() + seconds
+    while True:
+        if is_cancelled is not None and is_cancelled():
+            return False
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return True
+        time.sleep(min(left, 0.1))
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.clock = clock
+        self._hosts = {}  # host -> [consecutive failures, opened at (or None), trial in flight]
+        self._lock = threading.Lock()
+
+    def check(self, host: str):
+        """Raise CircuitOpen unless a request to `host` may go ahead now."""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[1] is None:
+                return
+            waited = self.clock() - state[1]
+            if waited < self.cooldown or state[2]:
+                raise CircuitOpen(host, max(0.0, self.cooldown - waited))
+            state[2] = True  # half-open: this caller is the trial
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            state = self._hosts.get(host)
+            return state is not None and state[1] is not None and self.clock() - state[1] < self.cooldown
+
+    def success(self, host: str):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def failure(self, host: str):
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, None, False])
+            state[0] += 1
+            if state[2] or state[0] >= self.threshold:
+                state[1], state[2] = self.clock(), False
+
+    def release(self, host: str):
+        """The trial request ended without telling anything about the host (e.g. cancelled)."""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state[2] = False
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+def call_with_retries(fn: Callable, policy: RetryPolicy, host: Optional[str] = None,
+                      breaker: Optional[CircuitBreaker] = None,
+                      on_retry: Optional[Callable[[str], None]] = None,
+                      is_cancelled: Optional[Callable[[], bool]] = None, what: str = '',
+                      fail_fast: bool = False):
+    """fn() until it succeeds, raises something that isn't retryable, or the attempts run out.
+
+    Failures and successes are reported to `breaker` for `host`, and
+    on_retry(reason) is called before every retry. While `host`'s circuit
+    is open, the call waits for it to let a trial through (only failed
+    calls use up attempts), or with `fail_fast` raises CircuitOpen.
+    Raises InterruptedError if `is_cancelled()` turns true while waiting.
+    """
+    attempt = 0
+    while True:
+        if breaker is not None and host:
+            try:
+                breaker.check(host)
+            except CircuitOpen as e:
+                if fail_fast:
+                    raise
+                if on_retry is not None and e.retry_in >= policy.base_delay:
+                    on_retry(f"{what}: {e}" if what else str(e))
+                # retry_in is 0 while another caller's trial request is in flight
+                if not _sleep(max(e.retry_in, policy.base_delay), is_cancelled):
+                    raise InterruptedError("Cancelled by user")
+                continue
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_retryable(e):
+                if breaker is not None and host:
+                    if isinstance(e, HTTPStatusError):
+                        breaker.success(host)  # an error answer still means the host is up
+                    else:
+                        breaker.release(host)
+                raise
+            if breaker is not None and host:
+                breaker.failure(host)
+            if attempt + 1 >= policy.attempts:
+                raise
+            if on_retry is not None:
+                on_retry(f"{what}: {describe(e)}" if what else describe(e))
+            if not policy.sleep(attempt, is_cancelled):
+                raise InterruptedError("Cancelled by user")
+            attempt += 1
+            continue
+        if breaker is not None and host:
+            breaker.success(host)
+        return result
+
+
+# shared by all downloads, so one job's failures protect the others
+default_policy = RetryPolicy()
+default_breaker = CircuitBreaker()
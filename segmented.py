@@ -0,0 +1,318 @@
+"""
+segmented.py
+Multi-connection byte-range downloader for large single-format streams.
+
+YouTube (and most CDNs) cap throughput per connection well below what a
+fast link can carry. SegmentedDownloader splits the file into chunk_size
+byte ranges and fetches them over `segments` parallel connections, writing
+each piece straight to its offset in a preallocated .part file. Finished
+pieces are recorded in a small .part.json sidecar so an interrupted
+download continues where it stopped. A range that fails transiently is
+retried (retry.RetryPolicy) from the last byte written, and hosts that
+keep failing are cut off by a retry.CircuitBreaker.
+
+With `checksum`, the file is hashed while it downloads: whenever the
+finished chunks reach further from the start, the newly contiguous bytes
+are read back (still in the page cache) and fed to the hash, so the digest
+is ready when the last chunk lands, without a second pass over the file.
+"""
+
+import errno
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+from typing import Callable, Optional
+
+from http_pool import USER_AGENT, HTTPStatusError
+from retry import CircuitBreaker, RetryPolicy, call_with_retries, default_breaker, default_policy, host_of
+
+DEFAULT_SEGMENTS = 4
+DEFAULT_CHUNK_SIZE = 10 * 1024 * 1024
+READ_SIZE = 256 * 1024
+STATE_SAVE_INTERVAL = 2.0
+
+
+class SegmentedUnsupported(Exception):
+    """The server doesn't report a size or doesn't honour range requests."""
+
+
+def _connect(url: str, timeout: float):
+    parts = urllib.parse.urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    return cls(parts.hostname, parts.port, timeout=timeout), path
+
+
+def preallocate(fd: int, size: int):
+    """Reserve `size` bytes for fd; real allocation where the OS supports it, else a sparse extend.
+    A full disk raises OSError (ENOSPC) here, before any byte is downloaded."""
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno in (errno.ENOSPC, errno.EDQUOT):
+                raise
+            # e.g. filesystems without fallocate support
+    os.ftruncate(fd, size)
+
+
+_seek_lock = threading.Lock()
+
+if hasattr(os, 'pwrite'):
+    def _pwrite(fd: int, data: bytes, offset: int):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+
+    def _pread(fd: int, size: int, offset: int) -> bytes:
+        return os.pread(fd, size, offset)
+else:
+    def _pwrite(fd: int, data: bytes, offset: int):
+        with _seek_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+    def _pread(fd: int, size: int, offset: int) -> bytes:
+        with _seek_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, size)
+
+
+def _drop(link: dict):
+    if link:
+        link.pop('conn').close()
+        link.pop('path')
+
+
+class SegmentedDownloader:
+    def __init__(self, url: str, dest: str, segments: int = DEFAULT_SEGMENTS,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, headers: Optional[dict] = None,
+                 on_bytes: Optional[Callable[[int], None]] = None,
+                 on_resumed: Optional[Callable[[int], None]] = None,
+                 is_cancelled: Optional[Callable[[], bool]] = None,
+                 timeout: float = 20, max_redirects: int = 5, retry: Optional[RetryPolicy] = None,
+                 breaker: Optional[CircuitBreaker] = None, on_retry: Optional[Callable[[str], None]] = None,
+                 checksum: Optional[str] = None, fail_fast: bool = False):
+        """`checksum`: a hashlib algorithm ('sha256') to hash the file with as it downloads;
+        its hex digest is `digest` after run(). `fail_fast`: raise CircuitOpen while the host's
+        circuit is open (the caller has another format to try) instead of waiting for it."""
+        self.url = url
+        self.dest = dest
+        self.segments = max(1, int(segments))
+        self.chunk_size = max(READ_SIZE, int(chunk_size))
+        self.headers = {'User-Agent': USER_AGENT}
+        self.headers.update(headers or {})
+        self.on_bytes = on_bytes or (lambda n: None)
+        self.on_resumed = on_resumed or (lambda n: None)
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.retry = retry or default_policy
+        self.breaker = breaker or default_breaker
+        self.on_retry = on_retry
+        self.fail_fast = fail_fast
+        self.total = None
+        self.downloaded = 0
+        self._lock = threading.Lock()
+        self._done = set()
+        self._error = None
+        self._hash = hashlib.new(checksum) if checksum else None
+        self._hashed = 0  # chunks fed to the hash, in order from the start
+        self._hash_lock = threading.Lock()
+        self._chunks = []
+        self.digest = None
+
+    @property
+    def part_path(self):
+        return self.dest + '.part'
+
+    @property
+    def state_path(self):
+        return self.dest + '.part.json'
+
+    def _stopping(self) -> bool:
+        return self._error is not None or self.is_cancelled()
+
+    def _with_retries(self, fn, what: str):
+        return call_with_retries(fn, self.retry, host_of(self.url), self.breaker, self.on_retry,
+                                 self._stopping, what, self.fail_fast)
+
+    def probe(self) -> int:
+        """Resolve redirects and return the total size; raises SegmentedUnsupported without range support."""
+        return self._with_retries(self._probe, "probe")
+
+    def _probe(self) -> int:
+        url = self.url
+        for _ in range(self.max_redirects + 1):
+            conn, path = _connect(url, self.timeout)
+            try:
+                conn.request('GET', path, headers=dict(self.headers, Range='bytes=0-0'))
+                resp = conn.getresponse()
+                resp.read()
+            finally:
+                conn.close()
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader('Location'):
+                url = urllib.parse.urljoin(url, resp.getheader('Location'))
+                continue
+            break
+        if resp.status >= 400:
+            raise HTTPStatusError(resp.status, url)  # retried (5xx) or for the caller to handle, not a fallback
+        if resp.status != 206:
+            raise SegmentedUnsupported(f"server answered {resp.status} to a range request")
+        content_range = resp.getheader('Content-Range') or ''
+        try:
+            total = int(content_range.rsplit('/', 1)[1])
+        except (IndexError, ValueError):
+            raise SegmentedUnsupported(f"no usable Content-Range: {content_range!r}")
+        self.url = url
+        self.total = total
+        return total
+
+    def run(self) -> int:
+        """Download to `dest`; returns the size. Raises on error or cancellation."""
+        total = self.total if self.total is not None else self.probe()
+        chunks = [(i, start, min(start + self.chunk_size, total) - 1)
+                  for i, start in enumerate(range(0, total, self.chunk_size))]
+        self._chunks = chunks
+        self._load_state(total)
+        for i in self._done:
+            _, start, end = chunks[i]
+            self.downloaded += end - start + 1
+        if self.downloaded:
+            self.on_resumed(self.downloaded)
+
+        todo = [c for c in chunks if c[0] not in self._done]
+        fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            if os.fstat(fd).st_size != total:
+                preallocate(fd, total)
+            queue_lock = threading.Lock()
+
+            def next_chunk():
+                with queue_lock:
+                    return todo.pop(0) if todo else None
+
+            threads = [threading.Thread(target=self._worker, args=(fd, next_chunk), daemon=True)
+                       for _ in range(min(self.segments, max(1, len(todo))))]
+            for t in threads:
+                t.start()
+            last_save = time.monotonic()
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=0.2)
+                if time.monotonic() - last_save > STATE_SAVE_INTERVAL:
+                    self._save_state(total)
+                    last_save = time.monotonic()
+            if self._error is None and len(self._done) == len(chunks):
+                self._advance_hash(fd, wait=True)  # whatever a busy worker skipped at the end
+        finally:
+            os.close(fd)
+
+        if self._error is not None:
+            self._save_state(total)
+            raise self._error
+        if len(self._done) < len(chunks):
+            # only a cancel makes workers stop early without an error
+            self._save_state(total)
+            raise InterruptedError("Cancelled by user")
+        if self._hash is not None:
+            self.digest = self._hash.hexdigest()
+        os.replace(self.part_path, self.dest)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+        return total
+
+    def _worker(self, fd: int, next_chunk):
+        link = {}  # this worker's keep-alive connection
+        try:
+            while not self._stopping():
+                chunk = next_chunk()
+                if chunk is None:
+                    break
+                index, start, end = chunk
+                span = [start, end]  # _fetch_range moves span[0] on, so a retry asks only for the rest
+                resp = self._with_retries(lambda: self._fetch_range(link, fd, span), f"range {start}-{end}")
+                if resp is None:
+                    break  # cancelled mid-range; the chunk stays undone
+                with self._lock:
+                    self._done.add(index)
+                self._advance_hash(fd)
+                if resp.will_close:
+                    _drop(link)
+        except Exception as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+        finally:
+            _drop(link)
+
+    def _fetch_range(self, link: dict, fd, span: list):
+        if not link:
+            link['conn'], link['path'] = _connect(self.url, self.timeout)
+        start, end = span
+        try:
+            link['conn'].request('GET', link['path'], headers=dict(self.headers, Range=f'bytes={start}-{end}'))
+            resp = link['conn'].getresponse()
+            if resp.status != 206:
+                resp.read()
+                raise HTTPStatusError(resp.status, self.url)
+            while span[0] <= end:
+                if self.is_cancelled():
+                    return None
+                data = resp.read(min(READ_SIZE, end - span[0] + 1))
+                if not data:
+                    raise ConnectionError(f"connection closed at byte {span[0]} of range {start}-{end}")
+                _pwrite(fd, data, span[0])
+                span[0] += len(data)
+                with self._lock:
+                    self.downloaded += len(data)
+                self.on_bytes(len(data))
+        except Exception:
+            _drop(link)  # a failed connection is never reused
+            raise
+        return resp
+
+    def _advance_hash(self, fd: int, wait: bool = False):
+        """Hash the chunks that now follow on from the hashed prefix. One worker at a time; the
+        others go back to downloading (the next one to finish a chunk picks up where this stops)."""
+        if self._hash is None or not self._hash_lock.acquire(blocking=wait):
+            return
+        try:
+            while self._hashed < len(self._chunks):
+                with self._lock:
+                    if self._hashed not in self._done:
+                        break
+                _, start, end = self._chunks[self._hashed]
+                for offset in range(start, end + 1, READ_SIZE):
+                    self._hash.update(_pread(fd, min(READ_SIZE, end - offset + 1), offset))
+                self._hashed += 1
+        finally:
+            self._hash_lock.release()
+
+    def _load_state(self, total: int):
+        try:
+            with open(self.state_path, encoding='utf-8') as fh:
+                state = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if state.get('total') == total and state.get('chunk_size') == self.chunk_size and os.path.exists(self.part_path):
+            self._done = set(state.get('done', []))
+
+    def _save_state(self, total: int):
+        with self._lock:
+            state = {'total': total, 'chunk_size': self.chunk_size, 'done': sorted(self._done)}
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(state, fh)
+        os.replace(tmp, self.state_path)
@@ -0,0 +1,207 @@
+"""
+thumb_store.py
+Content-addressed thumbnail store with pre-scaled variants, on disk and in memory.
+
+Thumbnails are kept under the SHA-256 of their bytes, so the same image
+fetched from two URLs (or listed twice) is stored once, plus an index of
+which URL gave which image so a known URL is never downloaded again.
+Every image also gets pre-scaled variants (VARIANTS: the playlist icon and
+the 500x300 panel), made on first use by the `scale` callable and written
+next to the original. get() answers from an in-memory LRU of decoded
+variants first, then from the variant file, and only scales the original
+when neither exists; call it from a worker thread, so the GUI thread gets
+an image that is ready to show.
+
+Files live under app_data_dir('cache')/thumbnails/<2 hex digits>/; a small
+SQLite index tracks sizes and access times, and the least recently used
+files are deleted once they add up to more than `max_bytes`.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from ytdl_core import app_data_dir
+
+# variant name -> the (width, height) box it is scaled into, keeping the aspect ratio
+VARIANTS = {'icon': (96, 54), 'panel': (500, 300)}
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_MEMORY_BYTES = 32 * 1024 * 1024
+
+
+def digest_of(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ThumbnailStore:
+    def __init__(self, path: Optional[str] = None,
+                 scale: Optional[Callable[[bytes, tuple], Optional[bytes]]] = None,
+                 decode: Optional[Callable[[bytes], object]] = None, weigh: Callable[[object], int] = len,
+                 variants: Optional[dict] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 memory_bytes: int = DEFAULT_MEMORY_BYTES):
+        """scale(image bytes, (w, h)) returns the encoded, scaled image (None if it can't be decoded);
+        decode(variant bytes) makes what get() returns (the bytes themselves by default), and
+        weigh() tells how much memory that takes, for the `memory_bytes` budget."""
+        self.path = path or os.path.join(app_data_dir('cache'), 'thumbnails')
+        os.makedirs(self.path, exist_ok=True)
+        self.scale = scale
+        self.decode = decode or (lambda data: data)
+        self.weigh = weigh
+        self.variants = dict(VARIANTS if variants is None else variants)
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.scaled = 0
+        self._memory = OrderedDict()  # (digest, variant) -> (decoded variant, weight), least recently used first
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.path, 'index.sqlite'), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                name      TEXT PRIMARY KEY,
+                size      INTEGER NOT NULL,
+                accessed  REAL NOT NULL
+            )""")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                url     TEXT PRIMARY KEY,
+                digest  TEXT NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_accessed ON files (accessed)")
+        self._db.commit()
+
+    def put(self, data: bytes, url: Optional[str] = None) -> str:
+        """Store an original thumbnail (fetched from `url`, if given); returns its digest."""
+        digest = digest_of(data)
+        if not os.path.exists(self._file(digest)):
+            self._write(digest, data)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files (name, size, accessed) VALUES (?, ?, ?)",
+                             (digest, len(data), now))
+            if url:
+                self._db.execute("INSERT OR REPLACE INTO sources (url, digest) VALUES (?, ?)", (url, digest))
+            self._evict()
+            self._db.commit()
+        return digest
+
+    def lookup(self, url: str) -> Optional[bytes]:
+        """The original thumbnail stored for `url`, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM sources WHERE url = ?", (url,)).fetchone()
+        return self._read(row[0]) if row else None
+
+    def get(self, digest: str, variant: str):
+        """The decoded `variant` of thumbnail `digest`, or None if the original is gone or undecodable."""
+        key = (digest, variant)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key][0]
+        width, height = self.variants[variant]
+        name = f"{digest}.{variant}-{width}x{height}"  # a resized variant gets a new file
+        data = self._read(name)
+        if data is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            original = self._read(digest)
+            if original is None or self.scale is None:
+                return None
+            data = self.scale(original, (width, height))
+            if data is None:
+                return None
+            self._write(name, data)
+            with self._lock:
+                self.scaled += 1
+                self._db.execute("INSERT OR REPLACE INTO files (name, size, accessed) VALUES (?, ?, ?)",
+                                 (name, len(data), time.time()))
+                self._evict()
+                self._db.commit()
+        value = self.decode(data)
+        weight = self.weigh(value)
+        with self._lock:
+            if key not in self._memory:
+                self._memory[key] = (value, weight)
+                self._memory_used += weight
+            while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+                self._memory_used -= self._memory.popitem(last=False)[1][1]
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+            return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'scaled': self.scaled,
+                    'in_memory': len(self._memory), 'memory_bytes': self._memory_used, 'files': count, 'bytes': size}
+
+    def clear(self):
+        with self._lock:
+            names = [row[0] for row in self._db.execute("SELECT name FROM files")]
+            self._db.execute("DELETE FROM files")
+            self._db.execute("DELETE FROM sources")
+            self._db.commit()
+            self._memory.clear()
+            self._memory_used = 0
+            self.memory_hits = self.disk_hits = self.scaled = 0
+        for name in names:
+            _remove(self._file(name))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name[:2], name)
+
+    def _read(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._file(name), 'rb') as fh:
+                data = fh.read()
+        except OSError:
+            with self._lock:
+                # deleted behind our back (or never written): forget it
+                self._db.execute("DELETE FROM files WHERE name = ?", (name,))
+                self._db.execute("DELETE FROM sources WHERE digest = ?", (name,))
+                self._db.commit()
+            return None
+        with self._lock:
+            self._db.execute("UPDATE files SET accessed = ? WHERE name = ?", (time.time(), name))
+            self._db.commit()
+        return data
+
+    def _write(self, name: str, data: bytes):
+        path = self._file(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def _evict(self):
+        # least recently used files until the total fits; variants stay usable without their original
+        size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        doomed = []
+        for name, file_size in self._db.execute("SELECT name, size FROM files ORDER BY accessed ASC").fetchall():
+            if size <= self.max_bytes:
+                break
+            doomed.append(name)
+            size -= file_size
+        self._db.executemany("DELETE FROM files WHERE name = ?", [(name,) for name in doomed])
+        self._db.executemany("DELETE FROM sources WHERE digest = ?", [(name,) for name in doomed])
+        for name in doomed:
+            _remove(self._file(name))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
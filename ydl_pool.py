@@ -0,0 +1,186 @@
+"""
+ydl_pool.py
+Long-lived yt_dlp.YoutubeDL instances, borrowed per call instead of built per call.
+
+Building a YoutubeDL registers every extractor class (tens of ms), and
+closing one throws away its HTTP handlers (keep-alive connections with the
+requests backend), its cookies and the extractor instances that cache
+decoded YouTube player JS. YDLPool keeps idle instances per option profile
+and lends each to one caller at a time. The profile is every option except
+the per-call ones (PER_CALL_OPTS: format, output template, logger, hooks),
+which are swapped in on each borrow, so downloads into different folders
+with different formats still share instances.
+
+    with default_ydl_pool.session(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+An instance whose call raised is closed rather than returned, in case it
+was left half-way through something.
+
+Swapping the per-call options means setting YoutubeDL internals (INTERNALS);
+they are checked on the first instance, and with a yt-dlp that lacks any of
+them every call gets a fresh, unpooled instance instead.
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# options yt-dlp reads per call (or that are cheap to rebuild), set on every borrow
+PER_CALL_OPTS = ('format', 'outtmpl', 'logger', 'progress_hooks', 'postprocessor_hooks', 'post_hooks')
+
+# what _apply / _reset touch beyond YoutubeDL's public methods
+INTERNALS = ('format_selector', '_parse_outtmpl', '_pps', '_progress_hooks', '_postprocessor_hooks', '_post_hooks',
+             '_download_retcode', '_num_downloads', '_num_videos', '_playlist_level', '_playlist_urls')
+
+
+def _youtube_dl_class():
+    # imported here: yt_dlp is loaded lazily (see ytdl_core.yt_dlp_module)
+    import yt_dlp
+    return yt_dlp.YoutubeDL
+
+
+def _freeze(value):
+    """Hashable stand-in for an option value; other objects count by identity
+    (a pooled instance keeps them alive, so their id can't be reused)."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(v) for v in value))
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return ('id', id(value))
+
+
+def _apply(ydl, call: dict):
+    """Install the per-call options on a borrowed instance."""
+    params = ydl.params
+    fmt = call.get('format')
+    params['format'] = fmt
+    ydl.format_selector = fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt)
+    outtmpl = call.get('outtmpl')
+    params['outtmpl'] = dict(outtmpl) if isinstance(outtmpl, dict) else {'default': outtmpl} if outtmpl else {}
+    ydl._parse_outtmpl()
+    if call.get('logger') is not None:
+        params['logger'] = call['logger']
+    else:
+        params.pop('logger', None)
+    ydl._progress_hooks, ydl._postprocessor_hooks, ydl._post_hooks = [], [], []
+    for hook in call.get('progress_hooks') or ():
+        ydl.add_progress_hook(hook)
+    for hook in call.get('post_hooks') or ():
+        ydl.add_post_hook(hook)
+    # a postprocessor copies the hooks only when it is built; add_postprocessor_hook gives them to the pooled ones
+    for pps in ydl._pps.values():
+        for pp in pps:
+            pp._progress_hooks = [pp.report_progress]
+    for hook in call.get('postprocessor_hooks') or ():
+        ydl.add_postprocessor_hook(hook)
+
+
+def remove_post_processor(ydl, pp, when: str = 'post_process'):
+    """Undo ydl.add_post_processor(pp, when) (yt-dlp has no public way), so a pooled instance doesn't keep it."""
+    pps = getattr(ydl, '_pps', {}).get(when)
+    if pps is not None and pp in pps:
+        pps.remove(pp)
+
+
+def _reset(ydl):
+    """Drop the caller's hooks and yt-dlp's per-run counters before the instance goes idle."""
+    _apply(ydl, {})
+    ydl._download_retcode = 0
+    ydl._num_downloads = 0
+    ydl._num_videos = 0
+    ydl._playlist_level = 0
+    ydl._playlist_urls.clear()
+
+
+class YDLPool:
+    def __init__(self, max_idle_per_profile: int = 4, max_profiles: int = 8):
+        self.max_idle_per_profile = max_idle_per_profile
+        self.max_profiles = max_profiles
+        self.created = 0
+        self.reused = 0
+        self.poolable = None  # whether this yt-dlp has INTERNALS; None until the first instance is built
+        self._idle = OrderedDict()  # profile key -> [YoutubeDL], least recently used first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _split(opts: dict):
+        call = {k: opts[k] for k in PER_CALL_OPTS if k in opts}
+        profile = {k: v for k, v in opts.items() if k not in PER_CALL_OPTS}
+        cls = _youtube_dl_class()
+        return (cls, _freeze(profile)), cls, profile
+
+    def _acquire(self, key, cls, profile):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle.move_to_end(key)
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        return cls(dict(profile))
+
+    def _release(self, key, ydl):
+        _reset(ydl)
+        evicted = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.max_idle_per_profile:
+                idle.append(ydl)
+            else:
+                evicted.append(ydl)
+            while len(self._idle) > self.max_profiles:
+                evicted.extend(self._idle.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+
+    def _check(self, ydl) -> bool:
+        if self.poolable is None:
+            self.poolable = all(hasattr(ydl, name) for name in INTERNALS)
+        return self.poolable
+
+    @contextmanager
+    def session(self, opts: dict):
+        """Borrow a YoutubeDL set up with `opts` for the duration of the block."""
+        key, cls, profile = self._split(opts)
+        ydl = None if self.poolable is False else self._acquire(key, cls, profile)
+        if ydl is not None and not self._check(ydl):
+            ydl.close()
+            ydl = None
+        if ydl is None:
+            # a yt-dlp whose internals changed: one instance per call, built with every option
+            with self._lock:
+                self.created += 1
+            ydl = cls(dict(opts))
+            try:
+                yield ydl
+            finally:
+                ydl.close()
+            return
+        try:
+            _apply(ydl, opts)
+            yield ydl
+        except BaseException:
+            ydl.close()
+            raise
+        self._release(key, ydl)
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, OrderedDict()
+        for instances in idle.values():
+            for ydl in instances:
+                ydl.close()
+
+
+# shared by listing, playlist enumeration and downloads
+default_ydl_pool = YDLPool()
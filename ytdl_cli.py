@@ -0,0 +1,431 @@
+"""
+ytdl_cli.py
+Headless command-line / batch front end. Does not import PyQt5.
+
+Reads URLs from the command line, a list file, or stdin (one per line,
+blank lines and '#' comments ignored) and prints one JSON object per line
+on stdout for every event, e.g.
+
+    {"event": "progress", "url": "...", "percent": 42, "downloaded": ..., ...}
+    {"event": "finished", "url": "...", "ok": true, "message": "Download completed."}
+
+Usage:
+    python ytdl_cli.py -o ~/Videos -j 4 -i urls.txt
+    python ytdl_cli.py --playlist -j 4 "https://www.youtube.com/@somechannel"
+    python ytdl_cli.py -j 3 --limit-rate 4M --schedule "09:00-18:00=1M" -i urls.txt
+    python ytdl_cli.py -j 8 --audio opus:128 -i lectures.txt
+    python ytdl_cli.py -f "auto[height=2160,codecs=vp9/h264,size=4G]" -i urls.txt
+    python ytdl_cli.py --rebuild-archive ~/Videos --playlist "https://www.youtube.com/@somechannel"
+    python ytdl_cli.py --metrics jobs.jsonl --prometheus ytdl.prom -i urls.txt
+    python ytdl_cli.py -j 4 --min-free 20G -i urls.txt
+    python ytdl_cli.py --layout sharded --catalog -o /archive --playlist "https://www.youtube.com/@somechannel"
+    python ytdl_cli.py -o /archive --where dQw4w9WgXcQ
+    python ytdl_cli.py --serve 8765 -j 4 -o ~/Videos      (control API; see control_api.py)
+    cat urls.txt | ytdl-cli --list-formats
+"""
+
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ytdl_core import (list_formats, download, iter_playlist, format_sort_key, audio_opts, audio_format_spec,
+                       DEFAULT_TEMPLATE)
+from postprocess import PostProcessPool, parse_audio
+from format_cache import FormatCache
+from format_ranking import RankingRules, select_formats
+from download_archive import DownloadArchive
+from metrics import MetricsRecorder, describe_error
+from bandwidth import BandwidthScheduler, parse_rate, parse_schedule
+from disk_space import DiskBudget
+from job_manager import DownloadJob, JobManager
+from control_api import ControlAPI, DEFAULT_PORT, default_token_file
+from output_layout import LAYOUTS, OutputIndex, template_for
+from ydl_pool import default_ydl_pool
+
+DEFAULT_FORMAT = "bestvideo+bestaudio/best"
+
+_print_lock = threading.Lock()
+
+
+def emit(event: str, **fields):
+    """Write one JSON line to stdout; safe to call from any worker thread."""
+    record = {'event': event, 'time': round(time.time(), 3)}
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False)
+    with _print_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def read_urls(args) -> list:
+    lines = list(args.urls)
+    if args.input:
+        if args.input == '-':
+            lines.extend(sys.stdin)
+        else:
+            with open(args.input, encoding='utf-8') as fh:
+                lines.extend(fh)
+    elif not lines and not sys.stdin.isatty():
+        lines.extend(sys.stdin)
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.append(line)
+    return urls
+
+
+def run_list(url: str, args, cache) -> bool:
+    trace = args.metrics.start('list', url)
+    try:
+        with args.metrics.profile('list'):
+            payload = list_formats(url, cache=cache, refresh=args.refresh, trace=trace)
+    except Exception as e:
+        args.metrics.finish(trace, 'failed', e)
+        emit('error', url=url, message=str(e), error=trace.error)
+        return False
+    args.metrics.finish(trace, 'ok')
+    payload.pop('thumbnail_bytes', None)
+    payload['formats'] = sorted(payload['formats'], key=format_sort_key)
+    if args.rules is not None:
+        choice = select_formats(payload['formats'], args.rules, payload.get('duration'))
+        if choice is not None:
+            payload['selected'] = {'spec': choice.spec, 'description': choice.describe(), 'size': choice.size}
+    emit('formats', url=url, **payload)
+    return True
+
+
+def run_download(url: str, args) -> bool:
+    last = {'percent': None, 'phase': None}
+
+    disk_key = object()  # this job's reservation in args.disk
+
+    def on_progress(stats):
+        args.disk.update(disk_key, stats.downloaded)
+        # one line per whole-percent step keeps the stream readable on fast links
+        if stats.percent is not None and stats.percent == last['percent'] and stats.phase == last['phase']:
+            return
+        last['percent'], last['phase'] = stats.percent, stats.phase
+        emit('progress', url=url, **stats.as_dict())
+
+    extra_opts = audio_opts(*args.audio) if args.audio else None
+    format_spec = audio_format_spec(args.audio[0]) if args.audio else args.format
+    emit('started', url=url, format=format_spec, outdir=args.outdir)
+    throttle = args.bandwidth.register(cap=args.job_rate)
+    trace = args.metrics.start('download', url)
+
+    def admit(peak):
+        # a job that doesn't fit waits for running ones to finish and free their space
+        args.disk.admit(disk_key, args.outdir, peak, is_cancelled=args.stop.is_set,
+                        on_wait=lambda e: emit('waiting', url=url, message=str(e)))
+
+    try:
+        with args.metrics.profile('download'):
+            result = download(url, format_spec, args.outdir, args.template, extra_opts,
+                              segments=args.segments, chunk_size=args.chunk_size * 1024 * 1024,
+                              on_progress=on_progress,
+                              on_status=lambda s: emit('status', url=url, message=s) if args.verbose else None,
+                              throttle=throttle, defer_postprocess=args.post_pool is not None,
+                              stream_merge=args.stream_merge, archive=args.archive_db, trace=trace, admit=admit,
+                              catalog=args.catalog)
+    except Exception as e:
+        args.disk.release(disk_key)
+        args.metrics.finish(trace, 'failed', e)
+        emit('finished', url=url, ok=False, message=str(e), error=trace.error)
+        return False
+    finally:
+        throttle.close()
+    if result.postprocess is not None:
+        # the merge still needs its reservation
+        outcome = finish_in_pool(url, result, args.post_pool, args.archive_db, args.metrics, trace)
+        outcome.add_done_callback(lambda _: args.disk.release(disk_key))
+        return outcome
+    args.disk.release(disk_key)
+    if result.skipped:
+        args.metrics.finish(trace, 'skipped')
+        emit('finished', url=url, ok=True, skipped=True, message="Already downloaded (in the download archive).",
+             path=result.path)
+        return True
+    args.metrics.finish(trace, 'ok')
+    emit('finished', url=url, ok=True, message="Download completed.", path=result.path,
+         timings=_rounded(result.timings))
+    return True
+
+
+def finish_in_pool(url: str, result, post_pool, archive=None, metrics=None, trace=None) -> Future:
+    """Hand the merge/conversion to the process pool; the download slot is free on return."""
+    outcome = Future()
+    task = result.postprocess
+    emit('postprocessing', url=url, task=task.kind, output=task.output)
+    submitted = time.perf_counter()
+
+    def done(future):
+        try:
+            stage_times = future.result()
+            result.timings.update(stage_times)
+            if archive is not None:
+                archive.record(result)
+        except Exception as e:
+            if trace is not None:
+                metrics.finish(trace, 'failed', e)
+            emit('finished', url=url, ok=False, message=f"Post-processing failed: {e}", error=describe_error(e))
+            outcome.set_result(False)
+            return
+        if trace is not None:
+            waited = time.perf_counter() - submitted - sum(stage_times.values())
+            trace.add_timings(dict(stage_times, **{'postprocess wait': max(0.0, waited)}))
+            trace.attrs['path'] = task.output
+            metrics.finish(trace, 'ok')
+        emit('finished', url=url, ok=True, message="Download completed.", path=task.output,
+             timings=_rounded(result.timings))
+        outcome.set_result(True)
+
+    post_pool.submit(task).add_done_callback(done)
+    return outcome
+
+
+def _rounded(timings: dict) -> dict:
+    return {stage: round(seconds, 3) for stage, seconds in timings.items()}
+
+
+def run_playlists(urls: list, args, pool) -> list:
+    """Enumerate playlists/channels lazily, submitting each entry as it arrives."""
+    futures = []
+    enumeration_ok = True
+    for url in urls:
+        count = 0
+        try:
+            for entry in iter_playlist(url):
+                count += 1
+                emit('entry', playlist=url, index=count, **entry)
+                if not args.list_formats:
+                    futures.append(pool.submit(run_download, entry['url'], args))
+        except Exception as e:
+            enumeration_ok = False
+            emit('error', url=url, message=str(e))
+        emit('playlist', url=url, entries=count)
+    results = [f.result() for f in futures]
+    if not enumeration_ok:
+        results.append(False)
+    return results
+
+
+def run_server(urls: list, args) -> int:
+    """--serve: run the control API over a job queue (starting with any URLs given) until interrupted."""
+    manager = JobManager(max(1, args.jobs), bandwidth=args.bandwidth, post_pool=args.post_pool,
+                         archive=args.archive_db, metrics=args.metrics, disk=args.disk)
+
+    def on_event(event, job, *details):
+        if event == 'started':
+            emit('started', id=job.job_id, url=job.url, format=job.format_spec, outdir=job.outdir)
+        elif event == 'status' and args.verbose:
+            emit('status', id=job.job_id, url=job.url, message=details[0])
+        elif event == 'finished':
+            emit('finished', id=job.job_id, url=job.url, ok=details[0], message=details[1],
+                 **({'path': job.result.path} if details[0] and job.result is not None else {}))
+
+    manager.listen(on_event)
+    host, _, port = args.serve.rpartition(':')
+    api = ControlAPI(manager, args.outdir, host or '127.0.0.1', int(port or DEFAULT_PORT), token=args.api_token,
+                     format_cache=None if args.no_cache else FormatCache(), token_file=default_token_file())
+    try:
+        api.start()
+    except OSError as e:
+        emit('error', message=f"Can't serve on {args.serve}: {e}")
+        return 2
+    emit('serving', url=api.url, token=api.token, **({'token_file': api.token_file} if api.token_file else {}))
+    extra_opts = audio_opts(*args.audio) if args.audio else None
+    format_spec = audio_format_spec(args.audio[0]) if args.audio else args.format
+    options = {'rate_limit': args.job_rate} if args.job_rate else {}
+    if args.segments > 1:
+        options.update(segments=args.segments, chunk_size=args.chunk_size * 1024 * 1024)
+    if args.stream_merge:
+        options['stream_merge'] = True
+    if args.catalog:
+        options['catalog'] = True
+    for url in urls:
+        manager.enqueue(DownloadJob(url, format_spec, args.outdir, args.template, extra_opts, options=dict(options)))
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    api.stop()
+    manager.shutdown()
+    emit('summary', **manager.counts())
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="ytdl-cli", description="Headless YouTube downloader (JSON-lines output).")
+    p.add_argument('urls', nargs='*', help="video URLs (in addition to --input)")
+    p.add_argument('-i', '--input', help="file with one URL per line, or '-' for stdin")
+    p.add_argument('-o', '--outdir', default=os.getcwd(), help="output folder (default: current directory)")
+    p.add_argument('-f', '--format', default=DEFAULT_FORMAT,
+                   help=f"yt-dlp format spec, or 'auto' / 'auto[height=2160,fps=60,codecs=av1/vp9/h264,"
+                        f"hdr=avoid|allow|prefer,size=4G]' to rank the formats (default: {DEFAULT_FORMAT})")
+    p.add_argument('-t', '--template',
+                   help=f"output filename template, relative to --outdir (default: {DEFAULT_TEMPLATE})")
+    p.add_argument('--layout', choices=list(LAYOUTS), default='flat',
+                   help="folder layout when no --template is given: sharded (by a hash of the video ID), "
+                        "channel, date (year/month), channel-date (default: flat)")
+    p.add_argument('--catalog', action='store_true',
+                   help="write a .meta.json sidecar (format, codecs, SHA-256) next to every finished file and "
+                        "record it in --outdir's index")
+    p.add_argument('--where', metavar='VIDEO_ID', action='append',
+                   help="print where VIDEO_ID was saved under --outdir (from its index; repeatable) and exit")
+    p.add_argument('--rebuild-index', action='store_true',
+                   help="first rebuild --outdir's index from the sidecars found under it")
+    p.add_argument('-j', '--jobs', type=int, default=2, help="max parallel jobs (default: 2)")
+    p.add_argument('--segments', type=int, default=1,
+                   help="connections per stream for plain HTTP formats (default: 1 = normal yt-dlp download)")
+    p.add_argument('--chunk-size', type=int, default=10, help="byte-range size in MiB for --segments (default: 10)")
+    p.add_argument('--stream-merge', action='store_true',
+                   help="merge split formats while downloading, without temporary stream files (not resumable)")
+    p.add_argument('--limit-rate', default='0', help="total bandwidth for all jobs, e.g. 5M (default: unlimited)")
+    p.add_argument('--job-limit-rate', default='0', help="bandwidth cap per job, e.g. 1M (default: unlimited)")
+    p.add_argument('--schedule', default='',
+                   help="time-of-day total limits overriding --limit-rate, e.g. '09:00-18:00=1M,18:00-23:00=4M'")
+    p.add_argument('--min-free', default='512M',
+                   help="disk space to leave free; jobs whose download + merge wouldn't fit wait for running ones "
+                        "(default: 512M)")
+    p.add_argument('--post-workers', type=int, default=None,
+                   help="processes for merging/converting (default: one per CPU core; 0 = in the download job)")
+    p.add_argument('--list-formats', action='store_true', help="only list formats, don't download")
+    p.add_argument('--playlist', action='store_true',
+                   help="treat URLs as playlists/channels; entries start downloading as they are found "
+                        "(with --list-formats, only print the entries)")
+    p.add_argument('--archive', help="download archive database (default: in the user data folder)")
+    p.add_argument('--no-archive', action='store_true',
+                   help="don't skip or record downloads in the archive")
+    p.add_argument('--rebuild-archive', metavar='DIR',
+                   help="first add the finished downloads found under DIR to the archive")
+    p.add_argument('--refresh', action='store_true', help="ignore cached format lists (still updates the cache)")
+    p.add_argument('--no-cache', action='store_true', help="don't read or write the format cache")
+    p.add_argument('--audio', metavar='CODEC[:KBPS]',
+                   help="download audio only and convert, e.g. mp3:320, opus:128, m4a (default 192 kbps); "
+                        "streams already in that codec are copied without re-encoding")
+    p.add_argument('--mp3', action='store_true', help="same as --audio mp3:<--mp3-quality>")
+    p.add_argument('--mp3-quality', default='192', help="MP3 bitrate in kbps (default: 192)")
+    p.add_argument('--metrics', metavar='FILE', dest='metrics_file',
+                   help="append one JSON line per finished job (phase timings, first byte, bytes, retries, errors)")
+    p.add_argument('--prometheus', metavar='FILE', help="keep Prometheus text-format metrics in FILE")
+    p.add_argument('--metrics-port', type=int, default=0, help="serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    p.add_argument('--profile', metavar='DIR', help="write a cProfile .prof file per job to DIR")
+    p.add_argument('--serve', metavar='[HOST:]PORT',
+                   help="run the HTTP/JSON control API (default host 127.0.0.1) and download what it is sent, "
+                        "until interrupted")
+    p.add_argument('--api-token', default=os.environ.get('YTDL_API_TOKEN'),
+                   help="the token API requests must send as 'Authorization: Bearer TOKEN' (default: "
+                        "$YTDL_API_TOKEN, else a random one, written to the user data folder)")
+    p.add_argument('-v', '--verbose', action='store_true', help="also emit human-readable status lines")
+    return p
+
+
+def open_archive(args) -> bool:
+    """Open the download archive into args.archive_db (once); False, after an error event, if it can't be."""
+    if args.archive_db is None:
+        try:
+            args.archive_db = DownloadArchive(args.archive)
+        except (OSError, sqlite3.Error) as e:
+            emit('error', message=f"Can't open the download archive: {e}")
+            return False
+    return True
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    args.metrics = MetricsRecorder(args.metrics_file, args.prometheus, args.profile)
+    if args.metrics_port:
+        emit('metrics', url=f"http://127.0.0.1:{args.metrics.serve(args.metrics_port)}/metrics")
+    args.archive_db = None
+    if args.rebuild_archive:
+        if args.no_archive:
+            emit('error', message="--rebuild-archive can't be combined with --no-archive.")
+            return 2
+        if not open_archive(args):
+            return 2
+        added = args.archive_db.rebuild(args.rebuild_archive)
+        emit('archive', rebuilt=args.rebuild_archive, added=added, **args.archive_db.stats())
+        if not args.urls and not args.input:
+            return 0  # only rebuilding; don't wait for URLs on stdin
+    args.template = args.template or template_for(args.layout)
+    if args.where or args.rebuild_index:
+        if not os.path.isdir(args.outdir):
+            emit('error', message=f"Output folder doesn't exist: {args.outdir}")
+            return 2
+        index = OutputIndex(args.outdir)
+        if args.rebuild_index:
+            emit('index', rebuilt=args.outdir, added=index.rebuild(), entries=len(index))
+        found = True
+        for video_id in args.where or ():
+            entry = index.lookup(video_id)
+            found = found and entry is not None
+            emit('located', id=video_id, found=entry is not None, **(entry or {}))
+        index.close()
+        if args.where or (not args.urls and not args.input and not args.serve):
+            return 0 if found else 1
+    urls = [] if args.serve and not args.urls and not args.input else read_urls(args)
+    if not urls and not args.serve:
+        emit('error', message="No URLs given.")
+        return 2
+    if not args.list_formats and not os.path.isdir(args.outdir):
+        emit('error', message=f"Output folder doesn't exist: {args.outdir}")
+        return 2
+    try:
+        args.bandwidth = BandwidthScheduler(parse_rate(args.limit_rate), parse_schedule(args.schedule))
+        args.job_rate = parse_rate(args.job_limit_rate)
+        args.disk = DiskBudget(int(parse_rate(args.min_free)))
+        args.rules = RankingRules.from_spec(args.format)
+        args.audio = parse_audio(args.audio) if args.audio else ('mp3', args.mp3_quality) if args.mp3 else None
+    except ValueError as e:
+        emit('error', message=str(e))
+        return 2
+    if not args.no_archive and not args.list_formats and not open_archive(args):
+        return 2
+
+    jobs = max(1, args.jobs)
+    args.stop = threading.Event()
+    args.post_pool = PostProcessPool(args.post_workers) if args.post_workers != 0 else None
+    if args.serve:
+        code = run_server(urls, args)
+        args.metrics.close()
+        default_ydl_pool.close()
+        return code
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        try:
+            if args.playlist:
+                results = run_playlists(urls, args, pool)
+            elif args.list_formats:
+                cache = None if args.no_cache else FormatCache()
+                results = list(pool.map(lambda u: run_list(u, args, cache), urls))
+                if cache is not None:
+                    emit('cache', **cache.stats())
+            else:
+                results = list(pool.map(lambda u: run_download(u, args), urls))
+        except KeyboardInterrupt:
+            args.stop.set()  # jobs waiting for disk space give up, so the pool can wind down
+            raise
+    # downloads handed to the post-processing pool report their outcome later
+    results = [r.result() if isinstance(r, Future) else r for r in results]
+    if args.post_pool is not None:
+        args.post_pool.shutdown()
+
+    failed = results.count(False)
+    emit('summary', total=len(results), ok=len(results) - failed, failed=failed)
+    args.metrics.close()
+    default_ydl_pool.close()  # saves cookies, closes kept-alive connections
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1089 @@
+"""
+ytdl_core.py
+Qt-free listing & download logic shared by the GUI workers and the CLI.
+
+Requires: Python 3.8+, yt-dlp, ffmpeg on PATH
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Optional
+
+from format_ranking import RankingRules, fallback_format, select_formats
+from disk_space import estimate_peak
+from http_pool import HTTPStatusError, default_pool
+from metrics import RetryLogger
+from output_layout import CHECKSUM, add_layout_fields, describe, record_output
+from postprocess import AUDIO_PRESETS, PostTask, audio_output_path, can_copy_audio, ffmpeg_merge  # noqa: F401
+from progress import UPDATE_INTERVAL, ProgressStats, ProgressTracker, human_readable_size  # noqa: F401
+from remux import SUPPORTED as STREAM_MERGE_SUPPORTED, RemuxFailed, StreamingRemuxer
+from retry import CircuitOpen, default_breaker, default_policy, host_of, is_retryable
+from segmented import SegmentedDownloader, SegmentedUnsupported, DEFAULT_CHUNK_SIZE
+from ydl_pool import default_ydl_pool, remove_post_processor
+
+# YouTube serves thumbnails at predictable URLs, so we can start fetching one
+# before extraction tells us the real URL.
+YOUTUBE_THUMB_URL = "https://i.ytimg.com/vi/{video_id}/{name}.jpg"
+YOUTUBE_THUMB_NAMES = ('maxresdefault', 'hqdefault')
+THUMB_TIMEOUT = 10
+
+# the video ID in the name keeps titles from colliding and lets
+# DownloadArchive.rebuild() recognise finished downloads
+DEFAULT_TEMPLATE = "%(title)s [%(id)s].%(ext)s"
+
+# component formats tried after the chosen one fails for good (see _fetch_with_fallback)
+MAX_FORMAT_FALLBACKS = 2
+# yt-dlp's own downloader backs off like ours; one dict, so pooled instances keep matching
+_RETRY_SLEEP = {'http': default_policy.delay, 'fragment': default_policy.delay}
+
+LIST_OPTS = {'quiet': True, 'no_warnings': True}
+
+_thumb_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="thumb")
+
+
+class Cancelled(Exception):
+    """Raised when a caller's cancel check fires mid-operation."""
+
+
+# ---------- Helpers ----------
+def format_entry_display(fmt_meta: dict) -> str:
+    """Compact, friendly format string (no format_id prefix)."""
+    parts = []
+    height = fmt_meta.get('height')
+    fps = fmt_meta.get('fps')
+    ext = fmt_meta.get('ext') or ''
+    filesize = fmt_meta.get('filesize') or fmt_meta.get('filesize_approx')
+    tbr = fmt_meta.get('tbr')
+    abr = fmt_meta.get('abr')
+
+    if height:
+        parts.append(f"{height}p")
+        if fps:
+            parts.append(f"{fps}fps")
+        if fmt_meta.get('dynamic_range') and fmt_meta['dynamic_range'] != 'SDR':
+            parts.append(fmt_meta['dynamic_range'])
+    else:
+        if fmt_meta.get('acodec') and (not fmt_meta.get('vcodec') or fmt_meta.get('vcodec') in (None, 'none')):
+            parts.append("Audio")
+        else:
+            parts.append("Unknown")
+
+    if filesize:
+        parts.append(f"~{human_readable_size(filesize)}")
+
+    if ext:
+        parts.append(ext)
+
+    if tbr:
+        try:
+            parts.append(f"{int(tbr)}kbps")
+        except Exception:
+            parts.append(f"{tbr}kbps")
+    elif abr:
+        try:
+            parts.append(f"{int(abr)}kbps")
+        except Exception:
+            parts.append(f"{abr}kbps")
+
+    vcodec = fmt_meta.get('vcodec')
+    acodec = fmt_meta.get('acodec')
+    if vcodec and vcodec != 'none' and (not acodec or acodec in (None, 'none')):
+        parts.append("(video-only)")
+    elif acodec and (not vcodec or vcodec in (None, 'none')):
+        parts.append("(audio-only)")
+    else:
+        parts.append("(video+audio)")
+
+    return " • ".join(parts)
+
+
+def format_sort_key(fmt_meta: dict):
+    """Highest resolution first, audio-only formats last (the order listings are shown in)."""
+    h = fmt_meta.get('height') or 0
+    vcodec = fmt_meta.get('vcodec')
+    is_audio_only = 1 if (fmt_meta.get('acodec') and (not vcodec or vcodec == 'none')) else 0
+    return (-h, is_audio_only)
+
+
+_YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube(?:-nocookie)?\.com/(?:watch\?(?:.*&)?v=|embed/|shorts/|live/|v/)|youtu\.be/)'
+    r'([A-Za-z0-9_-]{11})')
+
+
+def video_id_from_url(url: str) -> Optional[str]:
+    """YouTube video ID from a watch/shorts/embed/youtu.be URL, without a network call."""
+    m = _YOUTUBE_ID_RE.search(url or '')
+    return m.group(1) if m else None
+
+
+def app_data_dir(kind: str = 'data') -> str:
+    """Per-user folder for caches ('cache') and state ('data'); created on demand."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif kind == 'cache':
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    path = os.path.join(base, 'yt-8k-downloader')
+    if sys.platform == 'win32':
+        path = os.path.join(path, kind)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# ---------- yt-dlp ----------
+# Importing yt_dlp and building its extractor list is most of our startup time,
+# so it happens on first use (or in warmup(), off the GUI thread). Instances
+# come from ydl_pool.default_ydl_pool and are reused across calls.
+def yt_dlp_module():
+    """The yt_dlp module, imported on first call."""
+    import yt_dlp
+    return yt_dlp
+
+
+def __getattr__(name):
+    # keeps `ytdl_core.yt_dlp` working without importing it at module load
+    if name == 'yt_dlp':
+        return yt_dlp_module()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warmup():
+    """Import yt-dlp and leave a pooled listing instance with its YouTube extractor ready."""
+    with default_ydl_pool.session(dict(LIST_OPTS)) as ydl:
+        ydl.get_info_extractor('Youtube')
+
+
+def _never_cancelled():
+    return False
+
+
+# ---------- listing ----------
+def fetch_thumbnail(urls, pool=None, timeout=THUMB_TIMEOUT, store=None) -> Optional[bytes]:
+    """First thumbnail that downloads from `urls`, over pooled keep-alive connections.
+    With a thumb_store.ThumbnailStore, URLs it knows aren't downloaded again and new ones are added."""
+    pool = pool or default_pool
+    for thumb_url in urls:
+        if not thumb_url:
+            continue
+        if store is not None:
+            data = store.lookup(thumb_url)
+            if data is not None:
+                return data
+        try:
+            data = pool.get(thumb_url, timeout=timeout)
+        except Exception:
+            continue
+        if store is not None:
+            try:
+                store.put(data, thumb_url)
+            except Exception:
+                pass  # a broken store must never break listing
+        return data
+    return None
+
+
+def video_thumbnail(video_id: str, store=None) -> Optional[bytes]:
+    """The thumbnail of `video_id`, from YouTube's predictable URLs (see fetch_thumbnail for `store`)."""
+    return fetch_thumbnail(_guess_thumbnail_urls(video_id), store=store)
+
+
+def _guess_thumbnail_urls(video_id: Optional[str]):
+    if not video_id:
+        return []
+    return [YOUTUBE_THUMB_URL.format(video_id=video_id, name=name) for name in YOUTUBE_THUMB_NAMES]
+
+
+def _submit_thumbnail(urls, trace=None, store=None):
+    future = _thumb_executor.submit(fetch_thumbnail, urls, store=store)
+    if trace is not None:
+        t0 = time.perf_counter()
+        future.add_done_callback(lambda f: trace.add_phase('thumbnail', time.perf_counter() - t0))
+    return future
+
+
+def _wait_future(future, check):
+    while True:
+        check()
+        try:
+            return future.result(timeout=0.1)
+        except FutureTimeout:
+            continue
+
+
+def list_formats(url: str, is_cancelled: Optional[Callable[[], bool]] = None,
+                 cache=None, refresh: bool = False,
+                 on_formats: Optional[Callable[[dict], None]] = None, trace=None, thumbnails=None) -> dict:
+    """Extract a video's formats and metadata into the payload the GUI shows.
+
+    The thumbnail is fetched in parallel with extraction (speculatively from
+    the video ID when the URL has one). If `on_formats` is given it is called
+    with the payload as soon as extraction finishes, before the thumbnail
+    has arrived; the returned payload then carries the thumbnail bytes too.
+
+    With a FormatCache, a known video ID is answered from the cache unless
+    `refresh` is set; fresh results are always written back. The payload's
+    'cached' key says which path was taken. Formats keep yt-dlp's order;
+    sort with format_sort_key() (the GUI's format model does its own).
+    A metrics.JobTrace gets the extract and thumbnail times. Thumbnails go
+    through `thumbnails` (a thumb_store.ThumbnailStore) if given.
+    Raises Cancelled if `is_cancelled()` turns true along the way.
+    """
+    is_cancelled = is_cancelled or _never_cancelled
+
+    def check():
+        if is_cancelled():
+            raise Cancelled("Cancelled by user")
+
+    check()
+    video_id = video_id_from_url(url)
+    if cache is not None and video_id and not refresh:
+        payload = cache.get(video_id)
+        if payload is not None:
+            payload['cached'] = True
+            if trace is not None:
+                trace.attrs.update(video_id=video_id, cached=True)
+            if on_formats:
+                on_formats(dict(payload))
+            return payload
+
+    guessed = _guess_thumbnail_urls(video_id)
+    thumb_future = _submit_thumbnail(guessed, trace, thumbnails) if guessed else None
+
+    ydl_opts = dict(LIST_OPTS)
+    if trace is not None:
+        ydl_opts['logger'] = RetryLogger(trace)
+    t0 = time.perf_counter()
+    with default_ydl_pool.session(ydl_opts) as ydl:
+        info = ydl.extract_info(url.strip(), download=False)
+    if trace is not None:
+        trace.add_phase('extract', time.perf_counter() - t0)
+        trace.attrs.update(video_id=info.get('id'), cached=False, formats=len(info.get('formats') or ()))
+    check()
+
+    formats = info.get('formats', [info])
+    simple = []
+    for f in formats:
+        check()
+        meta = {
+            'format_id': f.get('format_id'),
+            'ext': f.get('ext', ''),
+            'height': f.get('height'),
+            'fps': f.get('fps'),
+            'vcodec': f.get('vcodec'),
+            'acodec': f.get('acodec'),
+            'dynamic_range': f.get('dynamic_range'),
+            'filesize': f.get('filesize') or f.get('filesize_approx'),
+            'tbr': f.get('tbr'),
+            'abr': f.get('abr'),
+        }
+        simple.append(meta)
+
+    title = info.get('title') or ""
+    thumb_url = info.get('thumbnail')
+    duration = info.get('duration')
+    channel = info.get('channel') or info.get('uploader')
+
+    payload = {
+        'id': info.get('id'),
+        'formats': simple,
+        'title': title,
+        'thumbnail_url': thumb_url,
+        'thumbnail_bytes': None,
+        'duration': duration,
+        'channel': channel,
+        'cached': False,
+    }
+    check()
+    if on_formats:
+        on_formats(dict(payload))
+
+    thumb_bytes = _wait_future(thumb_future, check) if thumb_future else None
+    if thumb_bytes is None and thumb_url and thumb_url not in guessed:
+        thumb_bytes = _wait_future(_submit_thumbnail([thumb_url], trace, thumbnails), check)
+    payload['thumbnail_bytes'] = thumb_bytes
+
+    check()
+    if cache is not None and (info.get('id') or video_id):
+        try:
+            cache.put(info.get('id') or video_id, payload)
+        except Exception:
+            pass  # a broken cache must never break listing
+    return payload
+
+
+# ---------- playlists / channels ----------
+def iter_playlist(url: str, is_cancelled: Optional[Callable[[], bool]] = None, max_depth: int = 3):
+    """Yield the videos of a playlist or channel one at a time, as pages arrive.
+
+    Uses flat extraction without processing, so yt-dlp's paged entry
+    generator is consumed lazily and the first entries are available long
+    before a large playlist has been fully enumerated. Each yielded dict
+    has id, url, title, duration and channel. A plain video URL yields itself.
+    """
+    is_cancelled = is_cancelled or _never_cancelled
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+    }
+    with default_ydl_pool.session(ydl_opts) as ydl:
+        yield from _iter_entries(ydl, url.strip(), is_cancelled, max_depth)
+
+
+def _iter_entries(ydl, url, is_cancelled, depth):
+    if is_cancelled():
+        raise Cancelled("Cancelled by user")
+    info = ydl.extract_info(url, download=False, process=False)
+    # channel URLs usually resolve to a redirect to their /videos tab first
+    while info and info.get('_type') in ('url', 'url_transparent') and depth > 0:
+        if _looks_like_video(info):
+            break
+        depth -= 1
+        info = ydl.extract_info(info['url'], download=False, process=False)
+    if not info:
+        return
+    if info.get('_type') != 'playlist':
+        yield _entry_meta(info)
+        return
+    for entry in info.get('entries') or []:
+        if is_cancelled():
+            raise Cancelled("Cancelled by user")
+        if not entry:
+            continue
+        if not _looks_like_video(entry) and depth > 0 and entry.get('url'):
+            # nested playlist (e.g. a channel's tab list): walk into it
+            yield from _iter_entries(ydl, entry['url'], is_cancelled, depth - 1)
+            continue
+        yield _entry_meta(entry)
+
+
+def _looks_like_video(entry: dict) -> bool:
+    if entry.get('_type') == 'playlist':
+        return False
+    ie_key = entry.get('ie_key') or entry.get('extractor_key')
+    if ie_key:
+        return ie_key == 'Youtube' or not ie_key.startswith('Youtube')
+    return bool(video_id_from_url(entry.get('url') or ''))
+
+
+def _entry_meta(entry: dict) -> dict:
+    url = entry.get('webpage_url') or entry.get('url') or ''
+    video_id = entry.get('id') or video_id_from_url(url)
+    if video_id and not url.startswith('http'):
+        url = f"https://www.youtube.com/watch?v={video_id}"
+    return {
+        'id': video_id,
+        'url': url,
+        'title': entry.get('title') or url,
+        'duration': entry.get('duration'),
+        'channel': entry.get('channel') or entry.get('uploader'),
+    }
+
+
+# ---------- downloading ----------
+class DownloadResult:
+    """What download() produced: the output path, per-stage timings and any deferred PostTask,
+    plus the archive key (video ID, resolved format ID, requested format spec)."""
+    __slots__ = ('path', 'timings', 'postprocess', 'video_id', 'format_id', 'format_spec', 'skipped', 'metadata')
+
+    def __init__(self, path: Optional[str] = None, timings: Optional[dict] = None,
+                 postprocess: Optional[PostTask] = None, skipped: bool = False):
+        self.path = path
+        self.timings = timings or {}
+        self.postprocess = postprocess
+        self.video_id = None
+        self.format_id = None
+        self.format_spec = None
+        self.skipped = skipped  # found in the download archive, nothing was fetched
+        self.metadata = None  # with catalog=True: the sidecar record written for `path`
+
+
+def format_timings(timings: dict) -> str:
+    """{'resolve': 0.8, 'download': 12.31, 'merge': 1.2} -> 'resolve 0.8s, download 12.3s, merge 1.2s'."""
+    return ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in timings.items())
+
+
+def _audio_postprocessor(extra_opts):
+    """(codec, quality) if the only yt-dlp postprocessor is FFmpegExtractAudio, else None."""
+    postprocessors = (extra_opts or {}).get('postprocessors') or []
+    if len(postprocessors) == 1 and postprocessors[0].get('key') == 'FFmpegExtractAudio':
+        pp = postprocessors[0]
+        return pp.get('preferredcodec') or 'mp3', pp.get('preferredquality')
+    return None
+
+
+def audio_opts(codec: str = 'mp3', quality: str = '192') -> dict:
+    """extra_opts for an audio-only job converted to `codec` at `quality` kbps."""
+    return {'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': codec,
+        'preferredquality': quality,
+    }]}
+
+
+def audio_format_spec(codec: str = 'mp3') -> str:
+    """Format spec preferring a bestaudio stream that can be stream-copied into `codec`."""
+    preferred = {'opus': "bestaudio[acodec=opus]", 'm4a': "bestaudio[ext=m4a]", 'aac': "bestaudio[ext=m4a]",
+                 'vorbis': "bestaudio[acodec=vorbis]"}.get(codec)
+    return f"{preferred}/bestaudio/best" if preferred else "bestaudio/best"
+
+
+def _archive_key(format_id, audio):
+    """Format ID / spec as stored in the download archive; audio jobs are told apart by target codec."""
+    return f"{format_id}>{audio[0]}" if audio and format_id else format_id
+
+
+def download(url, format_spec, outdir, out_template=DEFAULT_TEMPLATE, extra_opts=None,
+             on_progress: Optional[Callable[[ProgressStats], None]] = None,
+             on_status: Optional[Callable[[str], None]] = None,
+             is_cancelled: Optional[Callable[[], bool]] = None,
+             segments: int = 1, chunk_size: int = DEFAULT_CHUNK_SIZE,
+             progress_interval: float = UPDATE_INTERVAL,
+             throttle: Optional[Callable[[int], None]] = None,
+             defer_postprocess: bool = False, stream_merge: bool = False,
+             archive=None, trace=None, admit: Optional[Callable[[int], None]] = None,
+             catalog: bool = False) -> DownloadResult:
+    """Download `url` with yt-dlp, reporting through the optional callbacks.
+
+    `on_progress` receives ProgressStats snapshots (phase, percent, bytes,
+    smoothed speed and ETA), at most one per `progress_interval` seconds plus
+    one per phase change; `on_status` receives the matching human-readable
+    status line and occasional step messages. Partial downloads are resumed
+    from their .part files, so re-running an interrupted job continues it.
+
+    Split formats ("video+audio") are fetched concurrently, one thread per
+    component stream, and merged with ffmpeg as soon as the last one lands;
+    the reported percentage is byte-weighted across the streams. With
+    `segments` > 1, plain HTTP(S) streams are additionally fetched by
+    SegmentedDownloader over that many connections in `chunk_size` ranges.
+    Streams that can't be fetched that way (DASH/HLS fragments, servers
+    without range support) use yt-dlp's own downloader. Audio extraction
+    (FFmpegExtractAudio as the only postprocessor) is done by our own ffmpeg
+    step, which stream-copies when the source already has the target codec
+    (see audio_opts / audio_format_spec for presets); jobs with other yt-dlp postprocessors go through a normal yt-dlp
+    download.
+
+    With `defer_postprocess`, the merge / audio conversion is not run but
+    returned as result.postprocess (a PostTask) for a PostProcessPool; the
+    result's timings then only cover resolving and downloading.
+    `throttle`, if given, is called with the size of every block read and
+    may block to slow the download down (see bandwidth.JobThrottle).
+
+    With `stream_merge`, split DASH selections are merged while they download
+    (remux.StreamingRemuxer: the streams are piped into ffmpeg, nothing but
+    the final file is written). Such a download can't be resumed, so it is
+    only used when no partial component files exist; anything it can't
+    handle falls back to the normal path.
+
+    Dropped, stalled or 5xx-answered ranges are retried with backoff
+    (retry.default_policy; hosts that keep failing trip retry.default_breaker),
+    and when one stream of a split selection fails for good, up to
+    MAX_FORMAT_FALLBACKS next-best formats of the same kind are tried in its
+    place (result.format_id names what was actually downloaded).
+
+    With a download_archive.DownloadArchive as `archive`, a URL whose video
+    ID is archived with this format spec, and whose file is still in
+    `outdir`, returns at once (result.skipped) without contacting YouTube, and finished downloads are added to it;
+    for deferred ones the caller records the result after post-processing.
+    `format_spec` may be an "auto[...]" spec (format_ranking.RankingRules),
+    which ranks the real format list at download time.
+    A metrics.JobTrace as `trace` gets the stage timings, first byte, bytes
+    and retries (yt-dlp's, and fallbacks); the caller finishes it.
+    `admit`, if given, is called with the most disk space the job will need
+    at once (disk_space.estimate_peak, less what partial files already
+    hold) once the formats are chosen and before anything is written; it
+    may raise (disk_space.DiskBudget.admit raises NoSpace) to stop the job.
+
+    `out_template` may place files in subfolders (output_layout.LAYOUTS; the
+    computed `id_hash` field is available for sharding). With `catalog`, the
+    finished file gets a JSON sidecar and an entry in `outdir`'s index
+    (output_layout.record_output); segmented streams are hashed while they
+    download, other files once they are written. A deferred PostTask
+    catalogues its output itself.
+    Raises Cancelled if `is_cancelled()` turns true, or whatever yt-dlp raised.
+    """
+    is_cancelled = is_cancelled or _never_cancelled
+    on_status = on_status or (lambda s: None)
+    tracker = ProgressTracker(on_progress, on_status, interval=progress_interval)
+    outdir = outdir or os.getcwd()
+    if trace is not None:
+        trace.track(tracker)
+        extra_opts = dict(extra_opts or {}, logger=RetryLogger(trace))
+
+    if is_cancelled():
+        raise Cancelled("Download cancelled.")
+
+    segments = max(1, int(segments or 1))
+    audio = _audio_postprocessor(extra_opts)
+    spec_key = _archive_key(format_spec, audio)
+    if archive is not None:
+        video_id = video_id_from_url(url)
+        path = archive.find(video_id, spec_key, outdir)
+        if path is not None:
+            tracker.report('done', "Already downloaded (in the download archive).", percent=100)
+            result = DownloadResult(path, skipped=True)
+            result.video_id, result.format_spec = video_id, spec_key
+            return _traced(result, trace)
+
+    direct = segments > 1 or '+' in format_spec or RankingRules.from_spec(format_spec) is not None
+    if audio or (not (extra_opts or {}).get('postprocessors') and direct):
+        result = _download_direct(url, format_spec, outdir, out_template, extra_opts,
+                                  tracker, on_status, is_cancelled, segments, chunk_size, throttle, audio,
+                                  stream_merge, trace, admit, catalog)
+        result.format_spec = spec_key
+        task = result.postprocess
+        if task is not None and not defer_postprocess:
+            tracker.report(task.phase, task.label, percent=99)
+            result.timings.update(task.run())
+            result.postprocess = None
+            result.metadata = task.metadata
+        elif task is None and catalog:
+            result.metadata = record_output(result.path, result.metadata, outdir)
+        if result.postprocess is None:
+            if archive is not None:
+                archive.record(result)
+            tracker.report('done', "Completed.", percent=100)
+        else:
+            tracker.report('downloading', "Download finished — waiting for a post-processing slot...", percent=99)
+        return _traced(result, trace)
+
+    limit = _HookThrottle(throttle, tracker)
+
+    def progress_hook(d):
+        if is_cancelled():
+            # raising will cause yt-dlp to abort
+            raise Cancelled("Cancelled by user")
+        limit(d)
+        status = d.get('status')
+        if status == 'downloading':
+            tracker.update(d.get('downloaded_bytes') or 0, d.get('total_bytes') or d.get('total_bytes_estimate'))
+        elif status == 'finished':
+            tracker.report('downloading', "Download finished — merging/processing (if necessary)...", percent=99)
+        elif status == 'error':
+            on_status("Error during download.")
+
+    def postprocessor_hook(d):
+        if d.get('status') != 'started':
+            return
+        phase = 'merging' if d.get('postprocessor') == 'Merger' else 'postprocessing'
+        tracker.report(phase, "Merging streams..." if phase == 'merging'
+                       else f"Post-processing ({d.get('postprocessor')})...", percent=99)
+
+    final_paths = []
+    ydl_opts = _base_ydl_opts(format_spec, outdir, out_template, extra_opts)
+    ydl_opts['progress_hooks'] = [progress_hook]
+    ydl_opts['postprocessor_hooks'] = [postprocessor_hook]
+    ydl_opts['post_hooks'] = [final_paths.append]
+
+    on_status("Starting download...")
+    t0 = time.perf_counter()
+    with default_ydl_pool.session(ydl_opts) as ydl:
+        _bind_selector(ydl)
+        if is_cancelled():
+            raise Cancelled("Download cancelled.")
+        check = _admission_check(ydl, admit, bool(ydl_opts.get('postprocessors'))) if admit else None
+        fields = _layout_fields(ydl)
+        try:
+            info = ydl.extract_info(url.strip()) or {}
+        finally:
+            # the instance goes back to the pool
+            remove_post_processor(ydl, fields, 'pre_process')
+            if check is not None:
+                remove_post_processor(ydl, check, 'before_dl')
+
+    result = DownloadResult(final_paths[-1] if final_paths else None, {'download': time.perf_counter() - t0})
+    result.video_id, result.format_id, result.format_spec = info.get('id'), info.get('format_id'), spec_key
+    if catalog and result.path and os.path.exists(result.path):
+        result.metadata = record_output(result.path, describe(info, info.get('requested_formats') or ()), outdir)
+    if archive is not None:
+        archive.record(result)
+    tracker.report('done', "Completed.", percent=100)
+    return _traced(result, trace)
+
+
+def _admit_components(admit, components, paths, merge: bool, stream_merge: bool = False):
+    """Call admit() with the job's peak disk use, minus what its partial / finished stream files hold."""
+    peak = estimate_peak((_expected_size(c) for c in components), merge, stream_merge)
+    if peak is None:
+        return  # sizes unknown (e.g. live or fragmented streams without a bitrate); nothing to go by
+    if not stream_merge:
+        for path in paths:
+            for existing in (path, path + '.part'):
+                if os.path.exists(existing):
+                    peak -= os.path.getsize(existing)
+    admit(max(0, peak))
+
+
+def _admission_check(ydl, admit, postprocessors: bool):
+    """A 'before_dl' yt-dlp postprocessor that runs admit() for the formats yt-dlp chose."""
+    PostProcessor = yt_dlp_module().postprocessor.PostProcessor
+
+    class AdmissionCheck(PostProcessor):
+        def run(self, info):
+            components = info.get('requested_formats') or [info]
+            merge = len(components) > 1 or postprocessors
+            path = info.get('filepath') or self._downloader.prepare_filename(info)
+            base = os.path.splitext(path)[0]
+            paths = [path] if len(components) == 1 else [f"{base}.f{c.get('format_id')}.{c.get('ext')}"
+                                                         for c in components]
+            _admit_components(admit, components, paths, merge)
+            return [], info
+
+    check = AdmissionCheck(ydl)
+    ydl.add_post_processor(check, when='before_dl')
+    return check
+
+
+def _layout_fields(ydl):
+    """A 'pre_process' yt-dlp postprocessor adding output_layout's computed template fields; it runs
+    before the format is chosen, so it also gives an auto[...] selector the video's duration."""
+    PostProcessor = yt_dlp_module().postprocessor.PostProcessor
+    selector = ydl.params.get('format')
+
+    class LayoutFields(PostProcessor):
+        def run(self, info):
+            if isinstance(selector, _RankedSelector):
+                selector.duration = info.get('duration')
+            return [], add_layout_fields(info)
+
+    fields = LayoutFields(ydl)
+    ydl.add_post_processor(fields, when='pre_process')
+    return fields
+
+
+def _traced(result: DownloadResult, trace) -> DownloadResult:
+    if trace is not None:
+        trace.add_timings(result.timings)
+        trace.attrs.update(video_id=result.video_id, format_id=result.format_id, path=result.path)
+    return result
+
+
+# ---------- direct (parallel / segmented) download + merge ----------
+class _RankedSelector:
+    """yt-dlp `format` callable for "auto[...]" specs: format_ranking picks the format IDs,
+    yt-dlp's own selector then builds the (merged) format dict for them."""
+
+    FALLBACK = "bestvideo*+bestaudio/best"
+
+    def __init__(self, rules: RankingRules):
+        self.rules = rules
+        self.ydl = None
+        self.duration = None  # set by _layout_fields; yt-dlp's ctx has only the formats
+        self.choice = None
+
+    def __call__(self, ctx):
+        self.choice = select_formats(ctx['formats'], self.rules, self.duration)
+        spec = self.choice.spec if self.choice is not None else self.FALLBACK
+        yield from self.ydl.build_format_selector(spec)(ctx)
+
+
+def _format_option(format_spec):
+    rules = RankingRules.from_spec(format_spec)
+    return format_spec if rules is None else _RankedSelector(rules)
+
+
+def _bind_selector(ydl):
+    if isinstance(ydl.params.get('format'), _RankedSelector):
+        ydl.params['format'].ydl = ydl
+
+
+def _base_ydl_opts(format_spec, outdir, out_template, extra_opts):
+    ydl_opts = {
+        'format': _format_option(format_spec),
+        'outtmpl': os.path.join(outdir, out_template),
+        'merge_output_format': 'mkv',
+        'noplaylist': True,
+        'continuedl': True,
+        'quiet': True,
+        'noprogress': True,
+        'no_warnings': True,
+        'retry_sleep_functions': _RETRY_SLEEP,
+    }
+    ydl_opts.update(extra_opts or {})
+    return ydl_opts
+
+
+def _download_direct(url, format_spec, outdir, out_template, extra_opts,
+                     tracker, on_status, is_cancelled, segments, chunk_size, throttle=None, audio=None,
+                     stream_merge=False, trace=None, admit=None, catalog=False):
+    """Resolve once, fetch the component streams concurrently; returns a DownloadResult
+    whose postprocess is the merge / audio conversion still to do (or None). With `catalog`,
+    result.metadata (or the PostTask's) is the sidecar record still to write."""
+    ydl_opts = _base_ydl_opts(format_spec, outdir, out_template, extra_opts)
+    ydl_opts.pop('postprocessors', None)
+    on_status("Resolving streams...")
+    t0 = time.perf_counter()
+    with default_ydl_pool.session(ydl_opts) as ydl:
+        _bind_selector(ydl)
+        fields = _layout_fields(ydl)
+        try:
+            info = ydl.extract_info(url.strip(), download=False)
+        finally:
+            remove_post_processor(ydl, fields, 'pre_process')
+        final_path = ydl.prepare_filename(add_layout_fields(info))
+    timings = {'resolve': time.perf_counter() - t0}
+    if is_cancelled():
+        raise Cancelled("Download cancelled.")
+    output = audio_output_path(final_path, audio[0]) if audio else final_path
+    if os.path.exists(output):
+        on_status("Already downloaded.")
+        return _tagged(_with_metadata(DownloadResult(output, timings), info, (), audio, catalog), info, audio)
+    os.makedirs(os.path.dirname(final_path) or '.', exist_ok=True)  # layouts with subfolders
+
+    def component(fmt):
+        # same per-component info dicts yt-dlp builds for its own (sequential) merge
+        comp = dict(info)
+        comp.pop('requested_formats', None)
+        comp.update(fmt)
+        return comp
+
+    components = [component(f) for f in info.get('requested_formats') or [info]]
+
+    base = os.path.splitext(final_path)[0]
+    if len(components) == 1:
+        paths = [final_path]
+    else:
+        paths = [f"{base}.f{c.get('format_id')}.{c.get('ext')}" for c in components]
+
+    on_retry = trace.retry if trace is not None else None
+    stream_merge = stream_merge and not audio and _can_stream_merge(components, paths)
+    if admit is not None:
+        _admit_components(admit, components, paths, len(components) > 1 or bool(audio), stream_merge)
+    if stream_merge:
+        try:
+            result = _download_stream_merged(components, final_path, tracker, on_status, is_cancelled,
+                                             chunk_size, throttle, timings, on_retry)
+            return _tagged(_with_metadata(result, info, components, audio, catalog), info, audio)
+        except Exception as e:
+            if is_cancelled():
+                raise Cancelled("Download cancelled.")
+            if not isinstance(e, (SegmentedUnsupported, RemuxFailed)) and not _worth_falling_back(e):
+                raise
+            on_status(f"Merging while downloading isn't possible here ({e}); downloading the streams first...")
+            if trace is not None:
+                trace.retry(f"stream merge: {e}")
+            if admit is not None:
+                _admit_components(admit, components, paths, True)  # stream files + merged file after all
+
+    progress = _StreamProgress(tracker)
+    for c in components:
+        progress.set_total(c.get('format_id'), _expected_size(c))
+
+    failed = threading.Event()
+
+    def stop_requested():
+        return failed.is_set() or is_cancelled()
+
+    # a split selection can swap a failing stream for the next-best one; a single file's name depends on it
+    fallback = None
+    if len(components) > 1:
+        fallback = _Fallback(info.get('formats') or [], RankingRules.from_spec(format_spec), component,
+                             lambda c: f"{base}.f{c.get('format_id')}.{c.get('ext')}", on_status, on_retry)
+
+    on_status(f"Downloading {len(components)} stream(s)...")
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(components), thread_name_prefix="stream") as pool:
+        futures = [pool.submit(_fetch_with_fallback, c, path, progress, segments, chunk_size, stop_requested,
+                               ydl_opts, throttle, on_retry, fallback, catalog)
+                   for c, path in zip(components, paths)]
+        errors = []
+        for i, future in enumerate(futures):
+            try:
+                components[i], paths[i] = future.result()
+            except Exception as e:
+                failed.set()  # stop the sibling stream(s) early
+                errors.append(e)
+    if is_cancelled():
+        raise Cancelled("Download cancelled.")
+    if errors:
+        raise next((e for e in errors if not isinstance(e, (Cancelled, InterruptedError))), errors[0])
+    if fallback is not None and fallback.used:
+        info['format_id'] = '+'.join(str(c.get('format_id')) for c in components)
+
+    timings['download'] = time.perf_counter() - t0
+
+    merge = PostTask('merge', paths, final_path) if len(paths) > 1 else None
+    if not audio:
+        result = DownloadResult(final_path, timings, merge)
+        return _tagged(_with_metadata(result, info, components, audio, catalog, outdir), info, audio)
+    if merge is not None:
+        # audio extraction from a split selection is rare; merge first, here
+        timings.update(merge.run())
+        copy = False
+    else:
+        copy = can_copy_audio(components[0].get('acodec'), components[0].get('abr'), *audio)
+    result = DownloadResult(output, timings, PostTask('audio', [final_path], output, audio[0], audio[1], copy))
+    return _tagged(_with_metadata(result, info, components, audio, catalog, outdir), info, audio)
+
+
+def _with_metadata(result: DownloadResult, info: dict, components, audio, catalog: bool,
+                   outdir: Optional[str] = None) -> DownloadResult:
+    """Attach the sidecar record to the result, or to its PostTask (which then catalogues under `outdir`).
+    A single segmented stream's checksum, taken while it downloaded, is the file's."""
+    if not catalog:
+        return result
+    record = describe(info, components)
+    if audio:
+        record.update(vcodec='none', acodec=audio[0])
+    if result.postprocess is not None:
+        result.postprocess.catalog = (record, outdir)
+    else:
+        if len(components) == 1 and components[0].get(CHECKSUM):
+            record[CHECKSUM] = components[0][CHECKSUM]
+        result.metadata = record
+    return result
+
+
+def _tagged(result: DownloadResult, info: dict, audio) -> DownloadResult:
+    result.video_id = info.get('id')
+    result.format_id = _archive_key(info.get('format_id'), audio)
+    return result
+
+
+def _can_stream_merge(components, paths) -> bool:
+    """Split plain-HTTP DASH/WebM streams with nothing partially downloaded yet."""
+    if not STREAM_MERGE_SUPPORTED or len(components) < 2:
+        return False
+    for comp, path in zip(components, paths):
+        if comp.get('protocol') not in ('http', 'https') or not comp.get('url'):
+            return False
+        # ffmpeg can only demux from a pipe if the index comes first (fragmented MP4, WebM)
+        if not (str(comp.get('container') or '').endswith('_dash') or comp.get('ext') == 'webm'):
+            return False
+        if os.path.exists(path) or os.path.exists(path + '.part'):
+            return False
+    return True
+
+
+def _download_stream_merged(components, final_path, tracker, on_status, is_cancelled, chunk_size, throttle,
+                            timings, on_retry=None) -> DownloadResult:
+    progress = _StreamProgress(tracker)
+    remuxer = StreamingRemuxer([(c.get('format_id'), c['url'], c.get('http_headers')) for c in components],
+                               final_path, chunk_size=chunk_size, on_bytes=progress.add,
+                               is_cancelled=is_cancelled, throttle=throttle, on_retry=on_retry)
+    for key, size in remuxer.probe().items():
+        progress.set_total(key, size)
+    on_status(f"Downloading and merging {len(components)} streams...")
+    t0 = time.perf_counter()
+    try:
+        remuxer.run()
+    except InterruptedError:
+        raise Cancelled("Download cancelled.")
+    timings['download + merge'] = time.perf_counter() - t0
+    return DownloadResult(final_path, timings)
+
+
+def _expected_size(fmt: dict):
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and fmt.get('tbr') and fmt.get('duration'):
+        size = int(fmt['tbr'] * 125 * fmt['duration'])  # kbit/s -> bytes
+    return size or None
+
+
+def _worth_falling_back(e: Exception) -> bool:
+    """Errors tied to one format's URL or host, as opposed to a cancel or local (disk) trouble."""
+    if isinstance(e, (HTTPStatusError, CircuitOpen)) or is_retryable(e):
+        return True
+    return not isinstance(e, (Cancelled, InterruptedError, OSError))
+
+
+class _Fallback:
+    """Picks replacement formats for the streams of one split download."""
+
+    def __init__(self, formats, rules, component, path_for, on_status, on_retry):
+        self.formats = formats
+        self.rules = rules
+        self.component = component  # format dict -> component info dict
+        self.path_for = path_for
+        self.on_status = on_status
+        self.on_retry = on_retry
+        self.used = False
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def next(self, comp: dict, error: Exception) -> Optional[dict]:
+        """The component to try instead of `comp`, or None."""
+        with self._lock:
+            self._failed.add(comp.get('format_id'))
+            # formats on hosts that keep failing would only fail the same way
+            usable = [f for f in self.formats if not default_breaker.is_open(host_of(f.get('url') or ''))]
+            fmt = fallback_format(usable, comp, self.rules, exclude=self._failed)
+            if fmt is None:
+                return None
+            self.used = True
+        reason = f"format {comp.get('format_id')} failed ({error}); trying {fmt.get('format_id')}"
+        self.on_status(f"Format {comp.get('format_id')} failed; falling back to {fmt.get('format_id')}...")
+        if self.on_retry is not None:
+            self.on_retry(reason[:200])
+        return self.component(fmt)
+
+
+def _fetch_with_fallback(comp, path, progress, segments, chunk_size, is_cancelled, ydl_opts, throttle=None,
+                         on_retry=None, fallback: Optional[_Fallback] = None, checksum: bool = False):
+    """_fetch_component, moving on to the next-best format of the same kind (up to
+    MAX_FORMAT_FALLBACKS times) when one fails for good; returns the (component, path) downloaded.
+    An open circuit is only a reason to move on while there is somewhere to move to; otherwise
+    the download waits for the host's cooldown."""
+    for attempt in range(MAX_FORMAT_FALLBACKS + 1):
+        fail_fast = fallback is not None and attempt < MAX_FORMAT_FALLBACKS
+        try:
+            _fetch_component(comp, path, progress, segments, chunk_size, is_cancelled, ydl_opts, throttle, on_retry,
+                             checksum, fail_fast)
+            return comp, path
+        except Exception as e:
+            if fallback is None or attempt == MAX_FORMAT_FALLBACKS or is_cancelled() or not _worth_falling_back(e):
+                raise
+            replacement = fallback.next(comp, e)
+            if replacement is None:
+                if not isinstance(e, CircuitOpen):
+                    raise
+                _fetch_component(comp, path, progress, segments, chunk_size, is_cancelled, ydl_opts, throttle,
+                                 on_retry, checksum)
+                return comp, path
+        progress.drop(comp.get('format_id'))
+        _remove_partial(path)
+        comp, path = replacement, fallback.path_for(replacement)
+        progress.set_total(comp.get('format_id'), _expected_size(comp))
+
+
+def _remove_partial(path: str):
+    for leftover in (path + '.part', path + '.part.json', path + '.ytdl'):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+
+
+def _fetch_component(comp, path, progress, segments, chunk_size, is_cancelled, ydl_opts, throttle=None,
+                     on_retry=None, checksum: bool = False, fail_fast: bool = False):
+    """Download one component stream to `path` (segmented if possible, else via yt-dlp).
+    With `checksum`, a segmented download leaves the stream's SHA-256 in comp[CHECKSUM];
+    `fail_fast` makes it raise CircuitOpen rather than wait for an open circuit."""
+    key = comp.get('format_id')
+    if os.path.exists(path):
+        progress.skip(key, os.path.getsize(path), final=True)
+        return
+
+    if segments > 1 and comp.get('protocol') in ('http', 'https') and comp.get('url'):
+        d = SegmentedDownloader(comp['url'], path, segments=segments, chunk_size=chunk_size,
+                                headers=comp.get('http_headers'), is_cancelled=is_cancelled,
+                                on_bytes=_counting(progress, key, throttle),
+                                on_resumed=lambda n: progress.skip(key, n), on_retry=on_retry,
+                                checksum=CHECKSUM if checksum else None, fail_fast=fail_fast)
+        try:
+            progress.set_total(key, d.probe())
+        except SegmentedUnsupported:
+            pass
+        else:
+            d.run()
+            if d.digest:
+                comp[CHECKSUM] = d.digest
+            return
+
+    limit = _HookThrottle(throttle, progress.tracker)
+
+    def hook(d):
+        if is_cancelled():
+            # raising will cause yt-dlp to abort
+            raise Cancelled("Cancelled by user")
+        limit(d)
+        if d.get('status') in ('downloading', 'finished'):
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            progress.update(key, d.get('downloaded_bytes') or 0, total)
+
+    opts = dict(ydl_opts, progress_hooks=[hook])
+    with default_ydl_pool.session(opts) as ydl:
+        if not ydl.dl(path, comp):
+            raise RuntimeError(f"Download of format {key} failed.")
+
+
+def _counting(progress, key, throttle):
+    if throttle is None:
+        return lambda n: progress.add(key, n)
+
+    def on_bytes(n):
+        throttle(n)
+        progress.add(key, n)
+    return on_bytes
+
+
+class _HookThrottle:
+    """Feeds the byte deltas reported to a yt-dlp progress hook to a bandwidth throttle
+    and to the tracker's transferred-bytes count."""
+
+    def __init__(self, throttle, tracker: Optional[ProgressTracker] = None):
+        self.throttle = throttle
+        self.tracker = tracker
+        self._seen = {}
+
+    def __call__(self, d):
+        if d.get('status') != 'downloading' or (self.throttle is None and self.tracker is None):
+            return
+        key = d.get('tmpfilename') or d.get('filename')
+        done = d.get('downloaded_bytes') or 0
+        last = self._seen.get(key)
+        self._seen[key] = done
+        # the first report of a file may include resumed bytes; only count from there
+        if last is not None and done > last:
+            if self.tracker is not None:
+                self.tracker.count(done - last)
+            if self.throttle is not None:
+                self.throttle(done - last)
+
+
+class _StreamProgress:
+    """Combines the byte counts of concurrently downloading streams for a ProgressTracker.
+
+    The percentage is byte-weighted (all bytes done / all bytes expected), so
+    a small audio stream finishing early doesn't make a big video look half done.
+    """
+
+    def __init__(self, tracker: ProgressTracker):
+        self.tracker = tracker
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def set_total(self, key, total):
+        with self._lock:
+            self._streams.setdefault(key, [0, None])[1] = total
+
+    def skip(self, key, n, final=False):
+        """Count bytes already on disk (resumed) without letting them inflate the speed."""
+        with self._lock:
+            stream = self._streams.setdefault(key, [0, None])
+            stream[0] += n
+            if final:
+                stream[1] = stream[0]
+        self.tracker.skip(n)
+
+    def drop(self, key):
+        """Forget a stream that was abandoned (replaced by another format)."""
+        with self._lock:
+            self._streams.pop(key, None)
+        self._push()
+
+    def add(self, key, n):
+        with self._lock:
+            self._streams.setdefault(key, [0, None])[0] += n
+        self.tracker.count(n)
+        self._push()
+
+    def update(self, key, downloaded, total=None):
+        with self._lock:
+            stream = self._streams.setdefault(key, [0, None])
+            stream[0] = downloaded
+            if total:
+                stream[1] = total
+        self._push()
+
+    def _push(self):
+        with self._lock:
+            downloaded = sum(s[0] for s in self._streams.values())
+            totals = [s[1] for s in self._streams.values()]
+        self.tracker.update(downloaded, sum(totals) if all(totals) else None)